@@ -8,6 +8,23 @@
 #define CE_PIN 7
 #define CSN_PIN 8
 
+// 작은 패킷 모으기: 0 보다 크면 패킷을 이어 붙여 32바이트 프레임을 꽉 채워 보내고,
+// 다 차지 않은 프레임은 이 시간(ms)까지 다음 패킷을 기다린 뒤 보냄 (0 이면 패킷마다 새 프레임)
+#define AGGREGATION_DELAY_MS 0
+
+// 시리얼 프레이밍: 1 이면 호스트가 패킷마다 COBS 로 인코딩하고 0x00 구분자를 붙여 보냄 (framing.py)
+// 구분자 단위로 복원하므로 깨진 바이트가 있어도 다음 패킷부터 다시 맞춰짐 (0 이면 Packet Length 로 구분)
+#define SERIAL_FRAMING_COBS 0
+
+// 흐름 제어: 1 이면 호스트에 [0xFE] [받은 바이트 누적 수] [보내도 되는 누적 한도] (u16 big endian) 를 알려주고
+// 호스트는 한도까지만 보냄 (serial_io.py 의 CreditTracker)
+// 한도는 buffer 의 빈 공간과 수신 링버퍼 크기를 넘지 않으므로 라디오 송신 중에도 바이트를 잃지 않음
+#define FLOW_CONTROL 0
+#define CREDIT_MARKER 0xFE
+#define SERIAL_RX_RING 64       // HardwareSerial 수신 링버퍼 크기 (SERIAL_RX_BUFFER_SIZE)
+#define CREDIT_STEP 16          // 한도가 이만큼 늘면 바로 알림
+#define CREDIT_INTERVAL_MS 100  // 바뀌지 않아도 이 주기로 다시 알림 (호스트 재시작, 메시지 손실 대비)
+
 RF24 radio(CE_PIN, CSN_PIN);
 
 uint8_t address[][6] = { "1Node", "2Node" };
@@ -33,6 +50,7 @@ void setup() {
   }
   radio.setPALevel(RF24_PA_LOW);
   radio.setPayloadSize(PAYLOAD_SIZE);
+  radio.enableDynamicPayloads();  // sendFrame 의 frameIndex 바이트만 보냄 (부분 프레임을 0x00 으로 채우지 않음)
   radio.openWritingPipe(address[1]);
   radio.setChannel(0);
   radio.stopListening();
@@ -42,11 +60,108 @@ void setup() {
 byte buffer[1024];  // 최대 데이터 길이 설정, 필요에 따라 조정 가능
 int bufferIndex = 0;
 
+uint16_t receivedTotal = 0;  // 시리얼로 받은 바이트 누적 수
+uint16_t creditLimit = 0;    // 호스트가 보내도 되는 바이트 누적 한도
+unsigned long lastCredit = 0;
+
+void sendCredits() {
+  byte message[5] = { CREDIT_MARKER, (byte)(receivedTotal >> 8), (byte)receivedTotal, (byte)(creditLimit >> 8), (byte)creditLimit };
+  Serial.write(message, sizeof(message));
+  lastCredit = millis();
+}
+
+// 받은 수 + min(빈 공간, 수신 링버퍼) 까지 한도를 늘림 (한도는 줄이지 않음)
+void updateCredits() {
+  int space = sizeof(buffer) - bufferIndex;
+  uint16_t limit = receivedTotal + min(space, SERIAL_RX_RING);
+  uint16_t increase = limit - creditLimit;
+  if (increase < 0x8000 && increase >= CREDIT_STEP) {
+    creditLimit = limit;
+    sendCredits();
+  } else if (millis() - lastCredit >= CREDIT_INTERVAL_MS) {
+    sendCredits();
+  }
+}
+
+byte frame[PAYLOAD_SIZE];  // 보낼 프레임 (AGGREGATION_DELAY_MS > 0 이면 여러 패킷을 이어 붙임)
+int frameIndex = 0;
+unsigned long frameStarted = 0;
+
+void sendFrame() {
+  radio.write(frame, frameIndex);
+  if (!FLOW_CONTROL) {
+    Serial.println("라디오로 데이터 전송 완료");  // 흐름 제어 중에는 한도 메시지보다 시리얼 시간을 많이 차지하므로 생략
+  }
+  frameIndex = 0;
+}
+
+// COBS 프레임(구분자 제외)을 같은 버퍼에 복원하고 길이를 돌려줌, 잘못된 프레임이면 -1
+int cobsDecode(byte* data, int length) {
+  int read = 0;
+  int write = 0;
+  while (read < length) {
+    byte code = data[read];
+    if (code == 0 || read + code > length) {
+      return -1;
+    }
+    for (int i = 1; i < code; i++) {
+      data[write++] = data[read + i];
+    }
+    read += code;
+    if (code < 0xFF && read < length) {
+      data[write++] = 0x00;
+    }
+  }
+  return write;
+}
+
+bool frameOverflow = false;  // 구분자 없이 buffer 를 넘은 프레임은 다음 구분자까지 버림
+
+// 패킷을 프레임에 이어 붙이고 꽉 찬 프레임은 바로 송신
+void queuePacket(byte* packet, int length) {
+  for (int i = 0; i < length; i++) {
+    if (frameIndex == 0) {
+      frameStarted = millis();
+    }
+    frame[frameIndex++] = packet[i];
+    if (frameIndex == PAYLOAD_SIZE) {
+      sendFrame();
+    }
+  }
+  if (AGGREGATION_DELAY_MS == 0 && frameIndex > 0) {
+    sendFrame();
+  }
+}
+
 void loop() {
+#if SERIAL_FRAMING_COBS
+  // 구분자(0x00)까지 받으면 복원해서 송신
+  while (Serial.available() > 0) {
+    byte value = Serial.read();
+    receivedTotal++;
+    if (value != 0x00) {
+      if (bufferIndex < sizeof(buffer)) {
+        buffer[bufferIndex++] = value;
+      } else {
+        frameOverflow = true;
+      }
+      continue;
+    }
+    int packetLength = frameOverflow ? -1 : cobsDecode(buffer, bufferIndex);
+    if (packetLength > 0) {
+      queuePacket(buffer, packetLength);
+    }
+    bufferIndex = 0;
+    frameOverflow = false;
+  }
+#else
   // 시리얼 데이터 수신
   while (Serial.available() > 0) {
+    receivedTotal++;
     if (bufferIndex < sizeof(buffer)) {
       buffer[bufferIndex++] = Serial.read();
+    } else {
+      Serial.read();  // 흐름 제어를 쓰지 않으면 가득 찬 버퍼 뒤의 바이트는 버려짐
     }
   }
 
@@ -62,21 +177,7 @@ void loop() {
       }
 
       // 패킷 전송
-      int remainingLength = packetLength;
-      int offset = 0;
-      while (remainingLength > 0) {
-        byte payload[PAYLOAD_SIZE];
-        int chunkSize = min(PAYLOAD_SIZE, remainingLength);
-        for (int i = 0; i < chunkSize; i++) {
-          payload[i] = packet[offset + i];
-        }
-
-        radio.write(payload, chunkSize);
-        Serial.println("라디오로 데이터 전송 완료");
-
-        remainingLength -= chunkSize;
-        offset += chunkSize;
-      }
+      queuePacket(packet, packetLength);
 
       // 남은 데이터를 버퍼 앞으로 이동
       int remainingDataLength = bufferIndex - packetLength;
@@ -89,4 +190,14 @@ void loop() {
       break; // 패킷이 완전히 수신될 때까지 대기
     }
   }
+#endif
+
+  // 다 차지 않은 프레임이 기다린 시간을 넘으면 송신
+  if (frameIndex > 0 && millis() - frameStarted >= AGGREGATION_DELAY_MS) {
+    sendFrame();
+  }
+
+  if (FLOW_CONTROL) {
+    updateCredits();
+  }
 }
@@ -1,10 +1,16 @@
+import os
+import sys
 import time
 import socket
 import threading
-import struct
 from queue import Queue
 from pyrf24 import RF24, RF24_PA_HIGH, RF24_PA_LOW, RF24_DRIVER, RF24_1MBPS, RF24_2MBPS
 
+# 공용 모듈(ccsds.py, routing.py)은 저장소 최상위에 있음
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ccsds import PacketReassembler, split_data
+from routing import RoutingTable
+
 ###############################################################
 # Satellite to Ground Communication Support Program
 # 위성 통신 보조 프로그램
@@ -57,6 +63,7 @@ radio_rx.setPALevel(RF24_PA_LOW)
 radio_rx.openReadingPipe(1, address[1])
 radio_rx.setChannel(0)
 radio_rx.payloadSize = 32  # Set the payload size to the maximum for simplicity
+radio_rx.enableDynamicPayloads()  # Command_Send.ino 도 dynamic payload, 보낸 길이 그대로 받음 (0x00 패딩 없음)
 radio_rx.setDataRate(RF24_1MBPS)
 radio_rx.startListening()
 
@@ -66,6 +73,13 @@ radio_tx.openWritingPipe(address[0])
 radio_tx.setChannel(100)
 radio_tx.setDataRate(RF24_1MBPS)
 radio_tx.payloadSize = 32
+radio_tx.enableDynamicPayloads()  # data_receive.ino 도 dynamic payload
+
+# 하향으로 보내지 않을 APID (TBL: 0x001, EVS: 0x004)
+routes = RoutingTable({0x001: "drop", 0x004: "drop"})
+# 기존과 같이 2차 헤더가 있는 텔레메트리(첫 바이트 0x08)만 버림
+# 같은 APID 라도 텔레커맨드(0x18..)나 2차 헤더가 없는 패킷은 그대로 전달
+DROP_FIRST_BYTE = 0x08
 
 #########################################################################################
 ## 사용할 함수 정의
@@ -81,33 +95,24 @@ def udp_to_nrf24():
     sock.bind((udp_ip, udp_port))
 
     print(f"Listening on {udp_ip}:{udp_port}")
-    buffer = b''
+    reassembler = PacketReassembler()
     
     while True:
         data, addr = sock.recvfrom(1024)
-        buffer += data
-        print(f"Received UDP message from {addr}, buffer size: {len(buffer)}")
+        print(f"Received UDP message from {addr}, buffer size: {reassembler.pending + len(data)}")
         
-        while len(buffer) >= 6:
-            header = buffer[:6]
-            header_info = parse_primary_header(header)
-            packet_length = header_info["Packet Length"] + 1 + 6
-            
-            if len(buffer) >= packet_length:
-                packet = buffer[:packet_length]
-                buffer = buffer[packet_length:]
-                print(f"Processing CCSDS packet: {packet.hex()}")
-                chunks = split_data(packet)
-                for chunk in chunks:
-                    if not (packet.startswith(b'\x08\x01') or packet.startswith(b'\x08\x04')):
-                        if radio_tx.write(chunk):
-                            print(f"Sent chunk: {chunk.hex()}")
-                        else:
-                            print(f"Sending Failed")
-                    else:
-                        print(f"Skip data : TBL, EVS")
-            else:
-                break
+        for packet in reassembler.feed(data):
+            # 패킷마다 한 번만 확인하고, 버릴 패킷은 분할하지 않음
+            if packet[0] == DROP_FIRST_BYTE and routes.is_dropped(packet):
+                print(f"Skip data : TBL, EVS")
+                continue
+            print(f"Processing CCSDS packet: {packet.hex()}")
+            chunks = split_data(packet)
+            for chunk in chunks:
+                if radio_tx.write(bytes(chunk)):
+                    print(f"Sent chunk: {chunk.hex()}")
+                else:
+                    print(f"Sending Failed")
             
 # NRF24L01 수신 및 UDP/IP 송신
 def nrf24_to_udp():
@@ -115,75 +120,19 @@ def nrf24_to_udp():
     udp_port = 1234
 
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    received_data = b''
-    expected_length = None
+    reassembler = PacketReassembler()
 
     while True:
         if radio_rx.available():
             length = radio_rx.getDynamicPayloadSize()
             incoming_message = radio_rx.read(length)
             print(f"Received chunk: {incoming_message.hex()}")
-            received_data += incoming_message
-
-            while len(received_data) >= 6:
-                if expected_length is None:
-                    header = received_data[:6]
-                    header_info = parse_primary_header(header)
-                    expected_length = header_info["Packet Length"] + 1 + 6
-                    print(f"Expected length: {expected_length}")
-
-                if expected_length is not None and len(received_data) >= expected_length:
-                    packet = received_data[:expected_length]
-                    if packet[0] == 0x00:
-                        if len(received_data) < expected_length:
-                            continue
-                        received_data = b''
-                        expected_length = None
-                        break
-                    print(f"Reassembled Data: {packet.hex()}")
-                    sock.sendto(packet, (udp_ip, udp_port))
-         
-                    print(f"Sent UDP message to {udp_ip}:{udp_port}\n {packet}")
-                    received_data = received_data[expected_length:]
-                    expected_length = None
-                else:
-                    break
-
-            if expected_length is None and len(received_data) < 6:
-                received_data = b''
-                expected_length = None
-
-# CCSDS 패킷 분해
-def split_data(data, chunk_size=32):
-    chunks = []
-    for i in range(0, len(data), chunk_size):
-        chunk = data[i:i + chunk_size]
-        chunks.append(chunk)
-    return chunks
-
-# CCSDS 패킷 헤더 분석
-def parse_primary_header(header):
-    version_type_secflag_apid = struct.unpack(">H", header[:2])[0]
-    seq_flags_seq_count = struct.unpack(">H", header[2:4])[0]
-    packet_length = struct.unpack(">H", header[4:6])[0]
-
-    version_number = (version_type_secflag_apid >> 13) & 0x07
-    packet_type = (version_type_secflag_apid >> 12) & 0x01
-    secondary_header_flag = (version_type_secflag_apid >> 11) & 0x01
-    apid = version_type_secflag_apid & 0x07FF
-
-    sequence_flags = (seq_flags_seq_count >> 14) & 0x03
-    packet_sequence_count = seq_flags_seq_count & 0x3FFF
-
-    return {
-        "Version Number": version_number,
-        "Packet Type": packet_type,
-        "Secondary Header Flag": secondary_header_flag,
-        "APID": apid,
-        "Sequence Flags": sequence_flags,
-        "Packet Sequence Count": packet_sequence_count,
-        "Packet Length": packet_length
-    }
+
+            # 패딩이 없으므로 프레임 끝에 걸친 다음 패킷의 앞부분은 그대로 이어서 재조립
+            for packet in reassembler.feed(incoming_message):
+                print(f"Reassembled Data: {packet.hex()}")
+                sock.sendto(packet, (udp_ip, udp_port))
+                print(f"Sent UDP message to {udp_ip}:{udp_port}\n {packet.tobytes()}")
 
 def main():
     # Threads for UDP to NRF24 and NRF24 to UDP
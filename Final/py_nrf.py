@@ -1,7 +1,12 @@
+import os
+import sys
 import time
 import threading
 from queue import Queue
-from pyrf24 import RF24, RF24_PA_LOW, RF24_DRIVER, RF24_2MBPS
+
+# 공용 모듈(hal.py)은 저장소 최상위에 있음
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hal import create_radio, RF24_PA_LOW, RF24_DRIVER, RF24_2MBPS
 
 # Set radio_1 CE, CSN PIN
 CSN_PIN_1 = 0 #SPI0 CE0 -> spidev 0.0
@@ -12,8 +17,6 @@ elif RF24_DRIVER == 'wiringPi':
 else:
     CE_PIN_1 = 22
 
-radio_1 = RF24(CE_PIN_1, CSN_PIN_1)
-
 # Set radio_2 CE, CSN PIN
 CSN_PIN_2 = 12 #SPI1 CE0 -> spidev1.0
 if RF24_DRIVER == 'MRAA':
@@ -23,35 +26,35 @@ elif RF24_DRIVER == 'wiringPi':
 else:
     CE_PIN_2 = 12
 
-radio_2 = RF24(CE_PIN_2, CSN_PIN_2)
-
-if not radio_1.begin():
-    raise RuntimeError("radio_1 hardware is not responding")
-
-if not radio_2.begin():
-    raise RuntimeError("radio_2 hardware is not responding")
-
 address = [b"1Node", b"2Node"]
 
 receive_queue = Queue()
 send_queue = Queue()
 
-# radio_1 Hardware Setting
-radio_1.setPALevel(RF24_PA_LOW)
-radio_1.openReadingPipe(1, address[0])
-radio_1.setChannel(0)  
-radio_1.payloadSize = 32  # Set the payload size to the maximum for simplicity
-radio_1.startListening()
+# 라디오 초기화 및 설정 (import 시점에는 하드웨어에 접근하지 않음)
+def setup_radios(radio_1, radio_2):
+    if not radio_1.begin():
+        raise RuntimeError("radio_1 hardware is not responding")
+
+    if not radio_2.begin():
+        raise RuntimeError("radio_2 hardware is not responding")
 
-# radio_2 Hardware Setting
-radio_2.setPALevel(RF24_PA_LOW)
-radio_2.openWritingPipe(address[1])
-radio_2.setChannel(100)  
-radio_2.payloadSize = 32
-#radio_2.setDataRate(RF24_2MBPS)
-#radio_2.setAutoAck(True)
+    # radio_1 Hardware Setting
+    radio_1.setPALevel(RF24_PA_LOW)
+    radio_1.openReadingPipe(1, address[0])
+    radio_1.setChannel(0)  
+    radio_1.payloadSize = 32  # Set the payload size to the maximum for simplicity
+    radio_1.startListening()
 
-def forward_data():
+    # radio_2 Hardware Setting
+    radio_2.setPALevel(RF24_PA_LOW)
+    radio_2.openWritingPipe(address[1])
+    radio_2.setChannel(100)  
+    radio_2.payloadSize = 32
+    #radio_2.setDataRate(RF24_2MBPS)
+    #radio_2.setAutoAck(True)
+
+def forward_data(radio_1, radio_2):
     while True:
         
         if radio_1.available():
@@ -60,6 +63,10 @@ def forward_data():
             radio_2.write(received_payload)
         
 if __name__ == "__main__":
-    forward_thread = threading.Thread(target=forward_data)
+    radio_1 = create_radio(CE_PIN_1, CSN_PIN_1)
+    radio_2 = create_radio(CE_PIN_2, CSN_PIN_2)
+    setup_radios(radio_1, radio_2)
+
+    forward_thread = threading.Thread(target=forward_data, args=(radio_1, radio_2))
     forward_thread.start()
     forward_thread.join()
@@ -1,144 +1,427 @@
+import time
 import socket
-import serial
 import threading
-import struct
-from queue import Queue
+from functools import partial
+from hal import open_serial
+from ccsds import PacketReassembler, HeaderValidator, parse_and_split_data, SequenceTracker
+from routing import RoutingTable, ROUTE_DROP, ROUTE_PORT, packet_apid
+from scheduler import PriorityScheduler, TrafficClass
+from ring import RingBuffer, SharedRing, drain_ring
+from multiproc import run_stages
+from eventlog import get_logger, setup_logging
+import metrics
+from metrics import PACKETS, BYTES, DROPPED, QUEUE_DEPTH, QUEUE_BYTES, QUEUE_HIGH_WATER, STAGE_LATENCY, COMPRESSION_SAVED, ReassemblerMetrics, SequenceMetrics
+from capture import CaptureWriter, UPLINK, DOWNLINK
+from archive import ArchiveWriter
+from compression import create_codec
+from serial_io import SerialReader, SerialWriter, CreditTracker
 
-# 송신용 아두이노 시리얼 포트 설정
-ser_tx = serial.Serial(
-    port='/dev/ttyACM0',  # 적절한 포트로 변경
-    baudrate=230400,
-)
+log = get_logger("G_S_CSP")
+log.limit("decompress_failed", rate=5, burst=20)
+log.limit("serial_closed", rate=1, burst=5)
 
-ser_rx = serial.Serial(
-    port='/dev/ttyACM3',  # 적절한 포트로 변경
-    baudrate=230400,
-)
+# 아두이노 시리얼 포트 설정
+SER_TX_PORT = '/dev/ttyACM0'  # 송신용, 적절한 포트로 변경
+SER_RX_PORT = '/dev/ttyACM3'  # 수신용, 적절한 포트로 변경
+BAUD_RATE = 230400
+
+# 시리얼 일괄 입출력 (serial_io.py)
+# 수신: 바이트가 이어서 들어오는 동안 최대 SERIAL_READ_DELAY 초까지 모아서 한 번에 읽음
+# 송신: 스케줄러에 쌓인 패킷을 SERIAL_WRITE_BATCH 바이트까지 이어 붙여 한 번에 씀
+#       SERIAL_WRITE_DELAY > 0 이면 그 시간까지 다음 패킷을 기다려 묶음을 채움 (0 이면 이미 쌓인 것만)
+SERIAL_READ_DELAY = 0.005
+SERIAL_WRITE_BATCH = 512
+SERIAL_WRITE_DELAY = 0.0
+SERIAL_CLOSED_RETRY = 0.5  # 수신 포트가 닫혀 있으면 이 시간(초)마다 다시 확인 (닫힌 동안 계속 돌지 않도록)
+
+# 송신용 아두이노 흐름 제어 (Command_Send.ino 의 FLOW_CONTROL 과 같이 켜야 함)
+# 아두이노가 알려준 한도까지만 보내고, 한도가 없으면 패킷은 상향 스케줄러에서 기다림
+FLOW_CONTROL = False
+
+# 로그 설정 ("DEBUG" 면 패킷마다 기록, LOG_PACKET_DUMP=True 면 패킷 내용(hex)까지 기록)
+LOG_LEVEL = "INFO"
+LOG_PACKET_DUMP = False
+
+# 측정값 내보내기 (None 이면 사용 안 함)
+METRICS_HTTP_PORT = None  # 예: 9101 -> http://127.0.0.1:9101/metrics
+METRICS_UDP_PORT = None  # 예: 9102 -> 아무 데이터그램이나 보내면 측정값으로 응답
+
+# 재조립한 패킷을 모두 기록할 캡처 파일 (None 이면 기록 안 함, capture.py 로 재생)
+CAPTURE_FILE = None
+capture = None
+
+# 내려받은 텔레메트리를 쌓을 아카이브 디렉터리 (None 이면 사용 안 함, archive.py 로 조회)
+ARCHIVE_DIR = None
+archive = None
+
+# 패킷 압축: COMPRESSION_APIDS 의 상향 패킷을 아두이노로 보내기 전에 압축하고, 내려받은 압축 패킷은 복원
+# 상대편(S_G_CSP)도 같은 설정과 사전이어야 함 (사전은 compression.py train 으로 캡처 파일에서 생성)
+COMPRESSION = False
+COMPRESSION_APIDS = ()  # 예: (0x081, 0x084)
+COMPRESSION_DICTIONARY_DIR = None
+compressor = None
+decompressor = None
+
+BRIDGE = "ground"
+_UPLINK_ROUTE_DROP = (BRIDGE, "uplink", "route")
+_DOWNLINK_ROUTE_DROP = (BRIDGE, "downlink", "route")
+_DOWNLINK_DECOMPRESS_DROP = (BRIDGE, "downlink", "decompress")
+_DOWNLINK_RING_DROP = (BRIDGE, "downlink", "ring_full")
+_UPLINK_RING_DROP = (BRIDGE, "uplink", "ring_full")
+_UPLINK_CLOSED_DROP = (BRIDGE, "uplink", "serial_closed")
+_UPLINK_COMPRESSION = (BRIDGE, "uplink")
+
+# 수신 스트림 재동기화 설정
+KNOWN_APIDS = None  # 허용할 APID 목록, None 이면 모두 허용
+MAX_PACKET_LENGTH = 4096  # 이보다 긴 Packet Length 는 깨진 헤더로 봄
+STALL_TIMEOUT = 1.0  # 이 시간(초) 동안 완성되지 않는 패킷은 버리고 다시 동기화
+
+# 깨진 헤더를 만나면 다음 유효 헤더까지 건너뛰는 재조립기
+# allow_compressed=True 면 압축 패킷 헤더도 허용 (압축을 켠 경우)
+def create_reassembler(allow_compressed=False):
+    validator = HeaderValidator(KNOWN_APIDS, max_length=MAX_PACKET_LENGTH, allow_compressed=allow_compressed)
+    return PacketReassembler(validator=validator, stall_timeout=STALL_TIMEOUT)
+
+# APID 라우팅 (기본: 모두 전달), main 에서 규칙 파일을 지정하면 그 규칙으로 바뀜
+# 상향(지상 -> 아두이노)은 drop 만, 하향(아두이노 -> UDP)은 drop/port 를 적용
+ROUTING_FILE = None
+routes = RoutingTable()
+
+# 상향 링크 스케줄링 (등급이 하나뿐이면 기존 FIFO 와 같음)
+# 예) UPLINK_CLASSES = [TrafficClass("command", priority=0),
+#                       TrafficClass("bulk", priority=1, rate=20000, burst=2048)]
+#     UPLINK_APID_CLASSES = {0x010: "command"}
+#     UPLINK_DEFAULT_CLASS = "bulk"
+UPLINK_CLASSES = [TrafficClass("default")]
+UPLINK_APID_CLASSES = {}
+UPLINK_DEFAULT_CLASS = None
+UPLINK_POLICY = "strict"  # "strict" 또는 "weighted"
+
+# 하향 큐도 같은 방식으로 등급을 나눌 수 있음 (drop_lowest 정책에서 먼저 버릴 APID 를 정할 때)
+DOWNLINK_CLASSES = [TrafficClass("default")]
+DOWNLINK_APID_CLASSES = {}
+DOWNLINK_DEFAULT_CLASS = None
+
+# 큐 한도 (None 이면 제한 없음)
+# 패킷 수와 바이트를 함께 제한해서 긴 패스 동안에도 메모리 사용량과 대기 시간이 한도 안에 머무르게 함
+# overflow: "block" (자리가 날 때까지 넣는 쪽이 대기), "drop_oldest", "drop_newest", "drop_lowest" (낮은 등급부터 버림)
+# 상향은 UDP 수신 스레드가 멈추면 나머지 데이터그램이 커널 소켓 버퍼에 쌓였다가 넘침
+# 하향은 시리얼 수신이 멈추면 아두이노에서 넘치므로 기다리지 않고 오래된 패킷을 버림
+SEND_QUEUE_MAX_PACKETS = 1024
+SEND_QUEUE_MAX_BYTES = 64 * 1024  # 230400 baud 에서 약 3초 분량
+SEND_QUEUE_OVERFLOW = "block"
+RECEIVE_QUEUE_MAX_PACKETS = 1024
+RECEIVE_QUEUE_MAX_BYTES = 256 * 1024
+RECEIVE_QUEUE_OVERFLOW = "drop_oldest"
+QUEUE_HIGH_WATER = 0.8  # 사용률이 이 이상이면 경고
+QUEUE_LOW_WATER = 0.5  # 이 이하로 내려오면 경고 해제
+
+# 하향 링: receive_queue 대신 RECEIVE_QUEUE_MAX_BYTES 바이트 SPSC 링 버퍼 사용
+# 시리얼에서 한 번에 읽은 패킷을 묶음으로 넣고 UDP 송신 스레드가 RING_BATCH 개씩 꺼냄
+# 잠금 없이 동작하는 대신 등급/대기 시간 측정이 없고, 가득 차면 새 패킷을 버림 (drop_newest)
+DOWNLINK_RING = False
+RING_BATCH = 32
+
+# 프로세스 모드: 시리얼 수신, 시리얼 송신, UDP 입출력을 각각의 프로세스로 실행해서 GIL 을 나눠 쓰지 않음 (multiproc.py)
+# 단계 사이는 공유 메모리 링 (UDP -> 시리얼 송신: SEND_QUEUE_MAX_BYTES, 시리얼 수신 -> UDP: RECEIVE_QUEUE_MAX_BYTES)
+# 시리얼 송신 프로세스는 링에서 꺼낸 패킷을 send_queue 스케줄러에 넣어 우선순위/한도를 그대로 적용
+# 프로세스마다 PROCESS_CORES 의 코어에 고정, 측정값은 METRICS_*_PORT 에 PROCESS_STAGES 순서만큼 더한 포트로 내보냄
+# 상향과 하향이 다른 프로세스에서 기록되므로 캡처 파일과 함께 쓸 수 없음
+PROCESSES = False
+PROCESS_STAGES = ("serial_rx", "serial_tx", "udp")
+PROCESS_CORES = {"serial_rx": 1, "serial_tx": 2, "udp": 3}
+
+def create_uplink_scheduler():
+    return PriorityScheduler(UPLINK_CLASSES, UPLINK_APID_CLASSES, policy=UPLINK_POLICY, default=UPLINK_DEFAULT_CLASS, observe_wait=observe_uplink_wait,
+                             **queue_limits("uplink", SEND_QUEUE_MAX_PACKETS, SEND_QUEUE_MAX_BYTES, SEND_QUEUE_OVERFLOW))
+
+# 하향 큐: 등급이 하나면 FIFO, 꺼낸 패킷의 대기 시간은 observe_downlink_wait 로 기록
+def create_downlink_queue():
+    return PriorityScheduler(DOWNLINK_CLASSES, DOWNLINK_APID_CLASSES, default=DOWNLINK_DEFAULT_CLASS, observe_wait=observe_downlink_wait,
+                             **queue_limits("downlink", RECEIVE_QUEUE_MAX_PACKETS, RECEIVE_QUEUE_MAX_BYTES, RECEIVE_QUEUE_OVERFLOW))
+
+# PriorityScheduler 의 한도 인자 (버린 패킷과 경고는 방향별 측정값/로그로 남김)
+def queue_limits(direction, max_packets, max_bytes, overflow):
+    return {
+        "max_packets": max_packets,
+        "max_bytes": max_bytes,
+        "overflow": overflow,
+        "high_water": QUEUE_HIGH_WATER,
+        "low_water": QUEUE_LOW_WATER,
+        "on_drop": partial(queue_dropped, direction),
+        "on_alarm": partial(queue_alarm, direction),
+    }
+
+def queue_dropped(direction, packet, class_name, reason):
+    log.debug("queue_dropped", direction=direction, queue=class_name, reason=reason, apid=f"{packet_apid(packet):#05x}")
+    DROPPED.inc((BRIDGE, direction, f"queue_{reason}"))
+
+def queue_alarm(direction, active, packets, queued_bytes):
+    if active:
+        log.warning("queue_high_water", direction=direction, packets=packets, bytes=queued_bytes)
+        QUEUE_HIGH_WATER.inc((BRIDGE, direction))
+    else:
+        log.info("queue_recovered", direction=direction, packets=packets, bytes=queued_bytes)
+
+# 상향 스케줄러 대기 시간 (등급별)
+def observe_uplink_wait(waited, class_name):
+    STAGE_LATENCY.observe(waited, (BRIDGE, f"uplink_queue.{class_name}"))
+
+def observe_downlink_wait(waited, class_name):
+    STAGE_LATENCY.observe(waited, (BRIDGE, "downlink_queue"))
+
+# 실제 시리얼 포트 열기 (import 시점에는 하드웨어에 접근하지 않음)
+# simulator.VirtualArduino 를 쓸 때는 각 스케치의 port 를 넘기면 됨
+def open_serial_ports(tx_port=SER_TX_PORT, rx_port=SER_RX_PORT):
+    ser_tx = open_serial(tx_port, BAUD_RATE)
+    ser_rx = open_serial(rx_port, BAUD_RATE)
+    return ser_tx, ser_rx
 
 # UDP/IP 큐(Queue) 설정
-send_queue = Queue()
-receive_queue = Queue()
+# 상향 큐는 패킷 단위로 APID 등급별 우선순위/속도 제한을 적용, 두 큐 모두 패킷 수/바이트 한도가 있음
+# 브리지를 시작할 때 main (프로세스 모드는 각 단계) 에서 만듦 (import 만 한 G_S_CSP_async 에 빈 큐 측정값이 남지 않도록)
+send_queue = None
+receive_queue = None
 
-# UDP/IP 수신
-def udp_receiver():
-    udp_ip = "127.0.0.1"
-    udp_port = 1234
+def queue_depths():
+    depths = {(BRIDGE, f"send_queue.{name}"): depth for name, depth in send_queue.depths().items()}
+    depths[(BRIDGE, "receive_queue")] = receive_queue.qsize()
+    return depths
 
+def queue_bytes():
+    return {(BRIDGE, "send_queue"): send_queue.qbytes(), (BRIDGE, "receive_queue"): receive_queue.qbytes()}
+
+# 큐를 만든 뒤 한 번만 등록 (같은 이름의 측정값이 두 번 나오지 않도록)
+def track_queues():
+    QUEUE_DEPTH.track(queue_depths)
+    QUEUE_BYTES.track(queue_bytes)
+
+# 스레드 방식 브리지의 큐를 만들고 측정값 등록 (main 을 거치지 않고 스레드 함수를 직접 실행할 때도 먼저 호출)
+# downlink_ring=True 면 receive_queue 를 SPSC 링 버퍼로 만듦
+def create_queues(downlink_ring=False):
+    global send_queue, receive_queue
+    send_queue = create_uplink_scheduler()
+    receive_queue = RingBuffer(RECEIVE_QUEUE_MAX_BYTES) if downlink_ring else create_downlink_queue()
+    track_queues()
+
+# UDP/IP 수신
+# 데이터그램을 CCSDS 패킷으로 나눠서 스케줄러에 넣음 (drop 규칙은 여기서 적용)
+# 스케줄러가 가득 차면 SEND_QUEUE_OVERFLOW 에 따라 여기서 대기하거나 패킷을 버림
+# ring 이 있으면 스케줄러 대신 링에 넣음 (프로세스 모드, 데이터그램마다 한 번에 공개)
+def udp_receiver(udp_ip="127.0.0.1", udp_port=1234, ring=None):
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.bind((udp_ip, udp_port))
 
-    print(f"Listening on {udp_ip}:{udp_port}")
+    log.info("listening", addr=f"{udp_ip}:{udp_port}")
     while True:
         data, addr = sock.recvfrom(1024)
-        print(f"Received UDP message from {addr}: {data.hex()}")
-        send_queue.put(data)
+        log.payload("udp_received", data, src=f"{addr[0]}:{addr[1]}")
+        for packet in parse_and_split_data(data):
+            if capture is not None:
+                capture.record(UPLINK, packet)
+            if routes.is_dropped(packet):
+                log.debug("packet_dropped", apid=f"{packet_apid(packet):#05x}")
+                DROPPED.inc(_UPLINK_ROUTE_DROP)
+                continue
+            if ring is None:
+                send_queue.put(packet)
+            elif not ring.put(packet, publish=False):
+                DROPPED.inc(_UPLINK_RING_DROP)
+        if ring is not None:
+            ring.publish()
         
 #UDP/IP 송신
-def udp_sender():
-    udp_ip = "127.0.0.1"
-    udp_port = 1235
-
+def udp_sender(udp_ip="127.0.0.1", udp_port=1235):
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         
+    ring = receive_queue if isinstance(receive_queue, RingBuffer) else None
     while True:
-        if not receive_queue.empty():
-            message = receive_queue.get()
-            sock.sendto(message, (udp_ip, udp_port))
-            print(f"Sent UDP message to {udp_ip}:{udp_port}\n {message}")
+        # 큐가 빌 때는 잠들어 기다림
+        messages = ring.get_wait(RING_BATCH) if ring is not None else (receive_queue.get(),)
+        for message in messages:
+            action, port = routes.route(message)
+            if action == ROUTE_DROP:
+                log.debug("packet_dropped", apid=f"{packet_apid(message):#05x}")
+                DROPPED.inc(_DOWNLINK_ROUTE_DROP)
+                continue
+            if action != ROUTE_PORT:
+                port = udp_port
+            sock.sendto(message, (udp_ip, port))
+            log.payload("udp_sent", message, port=port)
 
 # 시리얼 송신
-def send_to_arduino():
+# 스케줄러가 고른 순서대로 보냄 (보낼 패킷이 없거나 토큰이 모자라면 대기)
+# 앞 묶음을 쓰는 동안 쌓인 패킷은 다음 write 한 번으로 함께 보냄
+# flow_control=True 면 아두이노가 허락한 바이트만 씀 (한도를 기다리는 동안 다음 패킷은 스케줄러에 남음)
+def send_to_arduino(ser_tx, flow_control=FLOW_CONTROL):
+    writer = SerialWriter(ser_tx, SERIAL_WRITE_BATCH, credits=CreditTracker(ser_tx) if flow_control else None)
     while True:
-        if not send_queue.empty():
-            data = send_queue.get()
-            packets = parse_and_split_data(data)
-            for packet in packets:
-                if ser_tx.is_open:
-                    ser_tx.write(packet)
-                    print(f"Sent packet to Arduino: {packet.hex()}")
+        packet = send_queue.get()
+        if not ser_tx.is_open:
+            # 스케줄러에서 이미 꺼낸 패킷은 되돌리지 않고 버린 것으로 기록
+            log.warning("serial_closed", direction="uplink", apid=f"{packet_apid(packet):#05x}")
+            DROPPED.inc(_UPLINK_CLOSED_DROP)
+            continue
+        deadline = time.monotonic() + SERIAL_WRITE_DELAY
+        while packet is not None:
+            labels = (BRIDGE, "uplink", packet_apid(packet))
+            PACKETS.inc(labels)
+            BYTES.inc(labels, len(packet))
+            packet = compress_packet(packet)
+            log.payload("serial_sent", packet)
+            if writer.add(packet):
+                break
+            packet, _ = send_queue.poll()
+            if packet is None and SERIAL_WRITE_DELAY > 0:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    packet = send_queue.get(timeout=remaining)
+        started = time.monotonic()
+        writer.flush()
+        STAGE_LATENCY.observe(time.monotonic() - started, (BRIDGE, "serial_write"))
+
+# 압축을 켰으면 압축한 패킷 (프레임 수가 줄지 않으면 그대로)
+def compress_packet(packet):
+    if compressor is None:
+        return packet
+    compressed = compressor.compress(packet)
+    if len(compressed) != len(packet):
+        COMPRESSION_SAVED.inc(_UPLINK_COMPRESSION, len(packet) - len(compressed))
+    return compressed
+
+# 압축 패킷이면 복원한 패킷, 복원할 수 없으면 None
+def decompress_packet(packet):
+    if decompressor is None:
+        return packet
+    try:
+        return decompressor.decompress(packet)
+    except ValueError as e:
+        log.warning("decompress_failed", error=e)
+        DROPPED.inc(_DOWNLINK_DECOMPRESS_DROP)
+        return None
 
 #시리얼 수신
-def receive_to_arduino():
-    expected_length = None
-    buffer = b''
+def receive_to_arduino(ser_rx):
+    reassembler = create_reassembler(allow_compressed=decompressor is not None)
+    reassembler_metrics = ReassemblerMetrics(reassembler, BRIDGE, "downlink")
+    sequence = SequenceMetrics(SequenceTracker(), BRIDGE, "downlink")  # APID 별 손실/중복 감지
+    reader = SerialReader(ser_rx, max_delay=SERIAL_READ_DELAY, baudrate=BAUD_RATE)
+    ring = receive_queue if isinstance(receive_queue, RingBuffer) else None
 
     while True:
-        if ser_rx.is_open and ser_rx.in_waiting > 0:
-            received_data = ser_rx.read(ser_rx.in_waiting)  # 실제 데이터 읽기
-            buffer += received_data
-            print(f"Raw received data: {buffer.hex()}")
-
-            while len(buffer) >= 6:  # 최소한 헤더 크기만큼 데이터가 있어야 함
-                if expected_length is None:
-                    # 헤더를 읽고 전체 패킷 길이 계산
-                    header = buffer[:6]
-                    header_info = parse_primary_header(header)
-                    total_length = header_info["Packet Length"] + 7  # 패킷 길이 + 6바이트 헤더 + 1바이트 추가
-                    expected_length = total_length
-                    print(f"Expected length: {expected_length}")
-
-                # 수신된 데이터의 총 길이가 예상된 길이와 같거나 클 때
-                if len(buffer) >= expected_length:
-                    packet = buffer[:expected_length]  # 패킷을 분리
-                    print(f"Reassembled Data: {packet.hex()}")
-                    receive_queue.put(packet)  # UDP 송신 큐에 추가
-                    buffer = buffer[expected_length:]  # 처리한 패킷을 제거
-                    expected_length = None
-                else:
-                    break
+        if not ser_rx.is_open:
+            log.warning("serial_closed", direction="downlink")
+            time.sleep(SERIAL_CLOSED_RETRY)
+            continue
+
+        # 데이터가 올 때까지 잠들어 기다리고, 이어서 들어오는 바이트는 모아서 재사용 버퍼로 읽음
+        received_data = reader.read()
+        if received_data:
+            log.payload("serial_received", received_data)
+
+            # 헤더의 Packet Length + 7 바이트가 모이면 패킷 단위로 분리
+            for packet in reassembler.feed(received_data):
+                log.payload("packet_reassembled", packet)
+                packet = decompress_packet(packet)
+                if packet is None:
+                    continue
+                if capture is not None:
+                    capture.record(DOWNLINK, packet)
+                if archive is not None:
+                    archive.record(DOWNLINK, packet)
+                sequence.observe(packet)
+                labels = (BRIDGE, "downlink", packet_apid(packet))
+                PACKETS.inc(labels)
+                BYTES.inc(labels, len(packet))
+                if ring is None:
+                    receive_queue.put(bytes(packet))  # UDP 송신 큐에 추가 (버퍼 재사용을 위해 복사, 가득 차면 오래된 패킷부터 버림)
+                elif not ring.put(packet, publish=False):  # 링에 바로 복사, 이번에 읽은 패킷은 아래에서 한 번에 공개
+                    DROPPED.inc(_DOWNLINK_RING_DROP)
+            if ring is not None:
+                ring.publish()
+            reassembler_metrics.update()
           
-# 패킷을 파싱
-def parse_and_split_data(data):
-    packets = []
-    data_index = 0
-
-    while data_index < len(data):
-        if data_index + 6 <= len(data):
-            header = data[data_index:data_index + 6]
-            header_info = parse_primary_header(header)
-            packet_length = header_info["Packet Length"] + 7  # 6바이트 헤더 + 1바이트 추가 (추가 필요 시 조정)
-
-            if data_index + packet_length <= len(data):
-                packet = data[data_index:data_index + packet_length]
-                packets.append(packet)
-                data_index += packet_length
-            else:
-                break
-        else:
-            break
+# 설정된 포트로 측정값 내보내기 시작 (프로세스 모드에서는 단계마다 port_offset 만큼 뒤 포트)
+def start_metrics(port_offset=0):
+    if METRICS_HTTP_PORT is not None:
+        metrics.serve_http(METRICS_HTTP_PORT + port_offset)
+    if METRICS_UDP_PORT is not None:
+        metrics.serve_udp(METRICS_UDP_PORT + port_offset)
 
-    return packets
+# 프로세스 모드의 각 단계가 시작할 때: 라우팅 파일 감시와 측정값 포트는 프로세스마다 따로 둠
+# (부모의 백그라운드 스레드는 fork 한 프로세스에 없음)
+def start_stage(name):
+    routes.watch()
+    start_metrics(PROCESS_STAGES.index(name))
 
-# CCSDS 패킷 헤더 분석
-def parse_primary_header(header):
-    version_type_secflag_apid = struct.unpack(">H", header[:2])[0]
-    seq_flags_seq_count = struct.unpack(">H", header[2:4])[0]
-    packet_length = struct.unpack(">H", header[4:6])[0]
+# 프로세스 모드: 부모에서 연 시리얼 포트를 물려받아 단계별 프로세스로 실행, 한 단계라도 끝나면 RuntimeError
+def run_processes(ser_tx, ser_rx, archive_dir=None, flow_control=FLOW_CONTROL):
+    global receive_queue
+    uplink = SharedRing(SEND_QUEUE_MAX_BYTES)
+    downlink = SharedRing(RECEIVE_QUEUE_MAX_BYTES)
+    receive_queue = downlink.ring  # 시리얼 수신 프로세스가 넣고 UDP 프로세스의 udp_sender 가 꺼냄
 
-    version_number = (version_type_secflag_apid >> 13) & 0x07
-    packet_type = (version_type_secflag_apid >> 12) & 0x01
-    secondary_header_flag = (version_type_secflag_apid >> 11) & 0x01
-    apid = version_type_secflag_apid & 0x07FF
+    def serial_rx_stage():
+        global archive
+        start_stage("serial_rx")
+        if archive_dir is not None:
+            archive = ArchiveWriter(archive_dir)
+        receive_to_arduino(ser_rx)
 
-    sequence_flags = (seq_flags_seq_count >> 14) & 0x03
-    packet_sequence_count = seq_flags_seq_count & 0x3FFF
+    def serial_tx_stage():
+        global send_queue
+        start_stage("serial_tx")
+        send_queue = create_uplink_scheduler()
+        track_queues()
+        threading.Thread(target=drain_ring, args=(uplink.ring, send_queue.put, RING_BATCH), daemon=True).start()
+        send_to_arduino(ser_tx, flow_control)
 
-    return {
-        "Version Number": version_number,
-        "Packet Type": packet_type,
-        "Secondary Header Flag": secondary_header_flag,
-        "APID": apid,
-        "Sequence Flags": sequence_flags,
-        "Packet Sequence Count": packet_sequence_count,
-        "Packet Length": packet_length
-    }
+    def udp_stage():
+        start_stage("udp")
+        QUEUE_DEPTH.track(lambda: {(BRIDGE, "uplink_ring"): uplink.ring.qsize()})
+        QUEUE_BYTES.track(lambda: {(BRIDGE, "uplink_ring"): uplink.ring.qbytes()})
+        threading.Thread(target=udp_sender, daemon=True).start()
+        udp_receiver(ring=uplink.ring)
+
+    stages = {"serial_rx": serial_rx_stage, "serial_tx": serial_tx_stage, "udp": udp_stage}
+    try:
+        run_stages([(name, stages[name]) for name in PROCESS_STAGES], PROCESS_CORES)
+    finally:
+        uplink.close()
+        downlink.close()
+
+# routing_file 을 주면 APID 라우팅 규칙을 읽고, 파일이 바뀔 때마다 다시 읽음
+# capture_file 을 주면 양방향 패킷을 그 파일에 기록
+# archive_dir 를 주면 하향 패킷을 그 디렉터리의 아카이브에 기록
+# compression=True 면 COMPRESSION_APIDS 를 압축해서 보내고 받은 압축 패킷을 복원
+# flow_control=True 면 송신용 아두이노가 알려주는 한도까지만 보냄
+# downlink_ring=True 면 시리얼 수신과 UDP 송신 사이의 receive_queue 를 SPSC 링 버퍼로 바꿈
+# processes=True 면 프로세스 모드 (downlink_ring 대신 공유 메모리 링 사용)
+def main(ser_tx, ser_rx, routing_file=ROUTING_FILE, capture_file=CAPTURE_FILE, archive_dir=ARCHIVE_DIR, compression=COMPRESSION,
+         flow_control=FLOW_CONTROL, downlink_ring=DOWNLINK_RING, processes=PROCESSES):
+    global capture, archive, compressor, decompressor
+    if processes and capture_file is not None:
+        raise ValueError("capture cannot be combined with process mode")
+    if routing_file is not None:
+        routes.load_file(routing_file)
+    if compression:
+        compressor, decompressor = create_codec(COMPRESSION_APIDS, COMPRESSION_DICTIONARY_DIR)
+    if processes:
+        run_processes(ser_tx, ser_rx, archive_dir, flow_control)
+        return
+    routes.watch()
+    if capture_file is not None:
+        capture = CaptureWriter(capture_file)
+    if archive_dir is not None:
+        archive = ArchiveWriter(archive_dir)
+    create_queues(downlink_ring)
+    start_metrics()
 
-def main():
     # 스레드 시작
     udp_send_thread = threading.Thread(target=udp_sender)
     udp_recv_thread = threading.Thread(target=udp_receiver)
-    serial_send_thread = threading.Thread(target=send_to_arduino)
-    serial_receive_thread = threading.Thread(target=receive_to_arduino)
+    serial_send_thread = threading.Thread(target=send_to_arduino, args=(ser_tx, flow_control))
+    serial_receive_thread = threading.Thread(target=receive_to_arduino, args=(ser_rx,))
     
     udp_send_thread.start()
     udp_recv_thread.start()
@@ -151,4 +434,6 @@ def main():
     serial_receive_thread.join()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    setup_logging(LOG_LEVEL, dump=LOG_PACKET_DUMP)
+    ser_tx, ser_rx = open_serial_ports()
+    main(ser_tx, ser_rx)
\ No newline at end of file
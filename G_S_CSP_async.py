@@ -0,0 +1,275 @@
+import os
+import socket
+import asyncio
+from hal import open_serial
+from ccsds import parse_and_split_data, SequenceTracker
+from G_S_CSP import (create_reassembler, create_uplink_scheduler, start_metrics, routes, ROUTING_FILE, CAPTURE_FILE, ARCHIVE_DIR, LOG_LEVEL, LOG_PACKET_DUMP, BRIDGE,
+                     COMPRESSION, COMPRESSION_APIDS, COMPRESSION_DICTIONARY_DIR, FLOW_CONTROL)
+from capture import CaptureWriter, UPLINK, DOWNLINK
+from archive import ArchiveWriter
+from compression import create_codec
+from eventlog import get_logger, setup_logging
+from routing import ROUTE_DROP, ROUTE_PORT, packet_apid
+from serial_io import CreditTracker, CREDIT_WAIT
+from metrics import PACKETS, BYTES, DROPPED, QUEUE_DEPTH, COMPRESSION_SAVED, ReassemblerMetrics, SequenceMetrics
+
+###############################################################
+# Ground to Satellite Communication Support Program (asyncio)
+# G_S_CSP.py 와 같은 역할을 이벤트 루프 하나로 처리
+# 큐를 계속 확인하는 스레드 대신 소켓/시리얼 이벤트가 있을 때만 깨어남
+###############################################################
+
+#########################################################################################
+#
+# 시리얼 및 UDP/IP 설정
+#
+#########################################################################################
+
+SER_TX_PORT = '/dev/ttyACM0'  # 송신용 아두이노, 적절한 포트로 변경
+SER_RX_PORT = '/dev/ttyACM3'  # 수신용 아두이노, 적절한 포트로 변경
+BAUD_RATE = 230400
+
+UDP_IP = "127.0.0.1"
+UDP_RX_PORT = 1234  # 지상 소프트웨어 -> 브리지
+UDP_TX_PORT = 1235  # 브리지 -> 지상 소프트웨어
+
+log = get_logger("G_S_CSP_async")
+log.limit("decompress_failed", rate=5, burst=20)
+log.limit("credit_stall", rate=1, burst=5)
+
+capture = None  # main 에서 capture_file 을 주면 CaptureWriter
+archive = None  # main 에서 archive_dir 를 주면 ArchiveWriter
+compressor = None  # main 에서 compression=True 면 PacketCompressor / PacketDecompressor
+decompressor = None
+
+#########################################################################################
+#
+# 비동기 전송 계층
+#
+#########################################################################################
+
+# UDP/IP 수신: 데이터그램을 CCSDS 패킷으로 나눠 스케줄러에 넣고 송신 루프를 깨움
+class UdpReceiverProtocol(asyncio.DatagramProtocol):
+    def __init__(self, scheduler, ready):
+        self.scheduler = scheduler
+        self.ready = ready
+
+    def datagram_received(self, data, addr):
+        log.payload("udp_received", data, src=f"{addr[0]}:{addr[1]}")
+        for packet in parse_and_split_data(data):
+            if capture is not None:
+                capture.record(UPLINK, packet)
+            if routes.is_dropped(packet):
+                log.debug("packet_dropped", apid=f"{packet_apid(packet):#05x}")
+                DROPPED.inc((BRIDGE, "uplink", "route"))
+                continue
+            self.scheduler.put(packet, timeout=0)  # 이벤트 루프를 멈출 수 없으므로 가득 차면 block 정책이어도 버림
+        self.ready.set()
+
+# 시리얼 포트 비동기 래퍼
+# 파일 디스크립터를 이벤트 루프에 등록해서 읽을 데이터/쓸 공간이 있을 때만 처리
+class AsyncSerial:
+    def __init__(self, ser, on_data=None, read_size=4096):
+        self.ser = ser
+        self._fd = ser.fileno()
+        self._loop = asyncio.get_running_loop()
+        self._on_data = on_data
+        self._read_size = read_size
+        self._pending = bytearray()
+        self._drained = asyncio.Event()
+        self._drained.set()
+
+        os.set_blocking(self._fd, False)
+        if on_data is not None:
+            self._loop.add_reader(self._fd, self._on_readable)
+
+    # 읽을 데이터가 있을 때 이벤트 루프가 호출
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, self._read_size)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            log.error("serial_read_failed", port=self.ser.port, error=e)
+            self._loop.remove_reader(self._fd)
+            return
+        if data:
+            self._on_data(data)
+
+    # 바로 쓸 수 있는 만큼 쓰고, 나머지는 쓰기 가능 이벤트에서 이어서 씀
+    def write(self, data):
+        if not self._pending:
+            try:
+                written = os.write(self._fd, data)
+            except BlockingIOError:
+                written = 0
+            if written == len(data):
+                return
+            data = memoryview(data)[written:]
+            self._drained.clear()
+            self._loop.add_writer(self._fd, self._on_writable)
+        self._pending += data
+
+    def _on_writable(self):
+        try:
+            written = os.write(self._fd, self._pending)
+        except BlockingIOError:
+            return
+        del self._pending[:written]
+        if not self._pending:
+            self._loop.remove_writer(self._fd)
+            self._drained.set()
+
+    # 출력 버퍼가 비워질 때까지 대기
+    async def drain(self):
+        await self._drained.wait()
+
+    def close(self):
+        self._loop.remove_reader(self._fd)
+        self._loop.remove_writer(self._fd)
+
+#########################################################################################
+#
+# 브리지 실행
+#
+#########################################################################################
+
+# UDP 1234 -> 시리얼(송신용 아두이노), 시리얼(수신용 아두이노) -> UDP 1235
+# flow_control=True 면 송신용 아두이노가 알려주는 한도까지만 씀 (Command_Send.ino 의 FLOW_CONTROL, G_S_CSP 와 같은 방식)
+async def run_bridge(ser_tx, ser_rx, udp_ip=UDP_IP, udp_rx_port=UDP_RX_PORT, udp_tx_port=UDP_TX_PORT, flow_control=FLOW_CONTROL):
+    loop = asyncio.get_running_loop()
+    scheduler = create_uplink_scheduler()
+    ready = asyncio.Event()
+    reassembler = create_reassembler(allow_compressed=decompressor is not None)
+    reassembler_metrics = ReassemblerMetrics(reassembler, BRIDGE, "downlink")
+    sequence = SequenceMetrics(SequenceTracker(), BRIDGE, "downlink")  # APID 별 손실/중복 감지
+    QUEUE_DEPTH.track(lambda: {(BRIDGE, f"send_queue.{name}"): depth for name, depth in scheduler.depths().items()})
+
+    udp_rx, _ = await loop.create_datagram_endpoint(
+        lambda: UdpReceiverProtocol(scheduler, ready),
+        local_addr=(udp_ip, udp_rx_port),
+    )
+    udp_tx, _ = await loop.create_datagram_endpoint(
+        asyncio.DatagramProtocol,
+        family=socket.AF_INET,
+    )
+    log.info("listening", addr=f"{udp_ip}:{udp_rx_port}")
+
+    # 시리얼 수신: 읽은 조각을 바로 재조립해서 UDP 로 송신
+    def on_serial_data(data):
+        for packet in reassembler.feed(data):
+            if decompressor is not None:
+                try:
+                    packet = decompressor.decompress(packet)
+                except ValueError as e:
+                    log.warning("decompress_failed", error=e)
+                    DROPPED.inc((BRIDGE, "downlink", "decompress"))
+                    continue
+            if capture is not None:
+                capture.record(DOWNLINK, packet)
+            if archive is not None:
+                archive.record(DOWNLINK, packet)
+            sequence.observe(packet)
+            action, port = routes.route(packet)
+            labels = (BRIDGE, "downlink", packet_apid(packet))
+            PACKETS.inc(labels)
+            BYTES.inc(labels, len(packet))
+            if action == ROUTE_DROP:
+                log.debug("packet_dropped", apid=f"{packet_apid(packet):#05x}")
+                DROPPED.inc((BRIDGE, "downlink", "route"))
+                continue
+            if action != ROUTE_PORT:
+                port = udp_tx_port
+            udp_tx.sendto(packet, (udp_ip, port))
+            log.payload("udp_sent", packet, port=port)
+        reassembler_metrics.update()
+
+    # 흐름 제어: 송신용 아두이노의 출력에서 한도 메시지를 읽고, 한도가 늘면 송신 루프를 깨움
+    credits = CreditTracker(ser_tx) if flow_control else None
+    credit_ready = asyncio.Event()
+
+    def on_credit_data(data):
+        credits.feed(data)
+        if credits.available():
+            credit_ready.set()
+
+    # 한도가 허락하는 만큼씩 나눠서 씀 (한도를 기다리는 동안 다음 패킷은 스케줄러에 남음)
+    async def write_with_credits(packet):
+        view = memoryview(packet)
+        while view:
+            credit = credits.available()
+            if not credit:
+                credit_ready.clear()
+                try:
+                    await asyncio.wait_for(credit_ready.wait(), CREDIT_WAIT)
+                except asyncio.TimeoutError:
+                    credits.stalls += 1
+                    log.warning("credit_stall", pending=len(view), synced=credits.sent is not None)
+                continue
+            size = min(credit, len(view))
+            serial_tx.write(view[:size])
+            credits.consume(size)
+            view = view[size:]
+
+    serial_tx = AsyncSerial(ser_tx, on_credit_data if credits is not None else None)
+    serial_rx = AsyncSerial(ser_rx, on_serial_data)
+
+    # 시리얼 송신: 스케줄러가 고른 순서대로 보내고,
+    # 보낼 패킷이 없으면 새 데이터그램이나 토큰이 채워질 때까지 대기 (busy-wait 없음)
+    try:
+        while True:
+            packet, wait = scheduler.poll()
+            if packet is None:
+                ready.clear()
+                try:
+                    await asyncio.wait_for(ready.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            labels = (BRIDGE, "uplink", packet_apid(packet))
+            PACKETS.inc(labels)
+            BYTES.inc(labels, len(packet))
+            if compressor is not None:
+                size = len(packet)
+                packet = compressor.compress(packet)
+                if len(packet) != size:
+                    COMPRESSION_SAVED.inc((BRIDGE, "uplink"), size - len(packet))
+            if credits is None:
+                serial_tx.write(packet)
+            else:
+                await write_with_credits(packet)
+            log.payload("serial_sent", packet)
+            await serial_tx.drain()
+    finally:
+        serial_rx.close()
+        serial_tx.close()
+        udp_rx.close()
+        udp_tx.close()
+
+def main(routing_file=ROUTING_FILE, capture_file=CAPTURE_FILE, archive_dir=ARCHIVE_DIR, compression=COMPRESSION, flow_control=FLOW_CONTROL):
+    global capture, archive, compressor, decompressor
+    if routing_file is not None:
+        routes.load_file(routing_file)
+        routes.watch()
+    if capture_file is not None:
+        capture = CaptureWriter(capture_file)
+    if archive_dir is not None:
+        archive = ArchiveWriter(archive_dir)
+    if compression:
+        compressor, decompressor = create_codec(COMPRESSION_APIDS, COMPRESSION_DICTIONARY_DIR)
+    start_metrics()
+
+    ser_tx = open_serial(SER_TX_PORT, BAUD_RATE, timeout=0)
+    ser_rx = open_serial(SER_RX_PORT, BAUD_RATE, timeout=0)
+
+    try:
+        asyncio.run(run_bridge(ser_tx, ser_rx, flow_control=flow_control))
+    except KeyboardInterrupt:
+        log.info("exiting")
+    finally:
+        ser_tx.close()
+        ser_rx.close()
+
+if __name__ == "__main__":
+    setup_logging(LOG_LEVEL, dump=LOG_PACKET_DUMP)
+    main()
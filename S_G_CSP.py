@@ -1,9 +1,22 @@
 import time
 import socket
+import select
 import threading
-import struct
-from queue import Queue
-from pyrf24 import RF24, RF24_PA_HIGH, RF24_PA_LOW, RF24_DRIVER, RF24_1MBPS, RF24_2MBPS
+from functools import partial
+from hal import create_radio, RF24_PA_HIGH, RF24_PA_LOW, RF24_DRIVER, RF24_1MBPS, RF24_2MBPS
+from ccsds import PacketReassembler, HeaderValidator, split_data, SequenceTracker
+from radio_link import (PipelinedTransmitter, ArqSender, ArqReceiver, is_arq_control, StripedTransmitter, StripeReceiver,
+                        LinkTuner, LinkFollower, LINK_CONTROL_PIPE, FrameAggregator)
+from routing import RoutingTable, ROUTE_DROP, ROUTE_PORT, ROUTE_CHANNEL, packet_apid
+from scheduler import PriorityScheduler, TrafficClass
+from ring import RingBuffer, SharedRing, drain_ring
+from multiproc import run_stages
+from eventlog import get_logger, setup_logging
+import metrics
+from metrics import PACKETS, BYTES, DROPPED, FRAMES, WRITE_FAILURES, REASSEMBLY_RESETS, QUEUE_DEPTH, QUEUE_BYTES, STAGE_LATENCY, ReassemblerMetrics, SequenceMetrics, LINK_PROFILE, LINK_CHANGES, COMPRESSION_SAVED
+from capture import CaptureWriter, UPLINK, DOWNLINK
+from archive import ArchiveWriter
+from compression import create_codec
 
 ###############################################################
 # Satellite to Ground Communication Support Program
@@ -27,8 +40,6 @@ elif RF24_DRIVER == 'wiringPi':
 else:
     CE_PIN_1 = 22
 
-radio_rx = RF24(CE_PIN_1, CSN_PIN_1)
-
 # 송신용 라디오 핀 설정
 CSN_PIN_2 = 12  # SPI1 CE2 -> spidev1.2
 if RF24_DRIVER == 'MRAA':
@@ -38,30 +49,198 @@ elif RF24_DRIVER == 'wiringPi':
 else:
     CE_PIN_2 = 12
 
-radio_tx = RF24(CE_PIN_2, CSN_PIN_2)
+address = [b"1Node", b"2Node"]
+RX_CHANNEL = 0
+TX_CHANNEL = 100
 
-if not radio_rx.begin():
-    raise RuntimeError("radio_rx hardware is not responding")
+ARQ_POLL_INTERVAL = 0.01  # ARQ 재전송/피드백 처리 주기 (초)
 
-if not radio_tx.begin():
-    raise RuntimeError("radio_tx hardware is not responding")
+# 받은 프레임이 없을 때의 대기
+# 수신 알림(rx_event, simulator.VirtualRF24)이 있는 라디오는 프레임이 올 때까지 최대 RX_EVENT_TIMEOUT 초 잠들고,
+# 없는 라디오(실제 RF24, IRQ 핀 미사용)는 RX_IDLE_SLEEP 초 쉰 뒤 다시 확인 (3단 RX FIFO 가 차기 전에)
+RX_EVENT_TIMEOUT = 0.005
+RX_IDLE_SLEEP = 0.0002
 
-address = [b"1Node", b"2Node"]
+# 스트라이핑: 기본 라디오에 더해 추가 라디오를 다른 채널에 두고 프레임을 번갈아 보내서 처리량을 늘림
+# 상대편도 같은 채널 구성의 S_G_CSP 일 때만 사용 (아두이노 펌웨어는 미지원)
+# 추가 라디오가 begin() 에 실패하면 그 라디오만 빼고 나머지로 동작
+STRIPING = False
+STRIPE_RX_RADIOS = []  # 추가 수신 라디오 [(CE 핀, CSN 핀, 채널), ...]
+STRIPE_TX_RADIOS = []  # 추가 송신 라디오 [(CE 핀, CSN 핀, 채널), ...]
+STRIPE_DATA_RATE = RF24_2MBPS  # 스트라이핑 링크의 전송률 (기본 라디오 포함)
+STRIPE_POLL_INTERVAL = 0.01  # 빠진 프레임 건너뛰기 확인 주기 (초)
+STRIPE_IDLE_SLEEP = 0.0001  # 받은 프레임이 없을 때 쉬는 시간 (초), 3단 RX FIFO 가 차기 전에 다시 확인
+
+# 링크 적응: 송신 결과(실패율, ARC)에 따라 전송률/출력/재전송 설정 단계(radio_link.LINK_PROFILES)를 바꿈
+# 하향 수신 측(data_receive.ino)이 제어 파이프를 처리하는 펌웨어여야 함
+# 상향(radio_rx)은 상대편이 제안할 때만 바뀌므로 Command_Send.ino 와도 그대로 동작
+# 채널 라우팅으로 보내는 다른 장치도 같은 설정을 따라야 하므로 channel 규칙과 함께 쓰지 않음
+LINK_ADAPTATION = False
+
+# 작은 패킷 모으기: 하향 패킷을 이어 붙여 32바이트 프레임을 꽉 채워 보냄 (None 이면 패킷마다 새 프레임)
+# 다 차지 않은 프레임은 이 시간(초)까지 다음 패킷을 기다림, 수신 측은 data_receive.ino 그대로 분리
+# ARQ/스트라이핑 모드는 자체 프레임 형식을 쓰므로 적용하지 않음
+AGGREGATION_DELAY = None  # 예: 0.005
+
+# 수신 링: 라디오 수신 루프는 재조립한 패킷을 SPSC 링 버퍼에 복사만 하고,
+# 압축 복원/기록/라우팅/UDP 송신은 다른 스레드가 RING_BATCH 개씩 꺼내서 처리 (수신 루프가 프레임을 놓치지 않도록)
+# 링이 가득 차면 새 패킷을 버림
+RX_RING = False
+RX_RING_SIZE = 256 * 1024  # 링 데이터 영역 바이트
+RING_BATCH = 32
+
+# 프로세스 모드: 라디오 수신, 라디오 송신, UDP 입출력을 각각의 프로세스로 실행해서 GIL 을 나눠 쓰지 않음 (multiproc.py)
+# 단계 사이는 공유 메모리 링 (라디오 수신 -> UDP: RX_RING_SIZE, UDP -> 라디오 송신: TX_RING_SIZE)
+# 프로세스마다 PROCESS_CORES 의 코어에 고정 (0 번 코어는 부모 프로세스와 시스템에 남김)
+# 측정값은 단계마다 METRICS_*_PORT 에 PROCESS_STAGES 순서만큼 더한 포트로 내보냄
+# 캡처/아카이브는 UDP 프로세스에서 기록, ARQ 는 수신과 송신이 송신기 하나를 나눠 쓰므로 함께 쓸 수 없음
+PROCESSES = False
+PROCESS_STAGES = ("radio_rx", "radio_tx", "udp")
+PROCESS_CORES = {"radio_rx": 1, "radio_tx": 2, "udp": 3}
+TX_RING_SIZE = 256 * 1024
+
+# 로그 설정 ("DEBUG" 면 프레임/패킷마다 기록, LOG_PACKET_DUMP=True 면 내용(hex)까지 기록)
+LOG_LEVEL = "INFO"
+LOG_PACKET_DUMP = False
+
+log = get_logger("S_G_CSP")
+log.limit("send_failed", rate=5, burst=20)  # 링크가 끊기면 실패가 연속으로 나므로 초당 5건까지만
+log.limit("decompress_failed", rate=5, burst=20)
+
+# 측정값 내보내기 (None 이면 사용 안 함)
+METRICS_HTTP_PORT = None  # 예: 9103 -> http://127.0.0.1:9103/metrics
+METRICS_UDP_PORT = None  # 예: 9104 -> 아무 데이터그램이나 보내면 측정값으로 응답
+
+# 재조립한 패킷을 모두 기록할 캡처 파일 (None 이면 기록 안 함, capture.py 로 재생)
+CAPTURE_FILE = None
+capture = None
+
+# 라디오로 받은 패킷(nrf24_to_udp)을 쌓을 아카이브 디렉터리 (None 이면 사용 안 함, archive.py 로 조회)
+ARCHIVE_DIR = None
+archive = None
+
+# 패킷 압축: COMPRESSION_APIDS 의 패킷을 분할 전에 압축하고, 받은 압축 패킷은 재조립 후 복원
+# 상대편(G_S_CSP)도 같은 설정과 사전이어야 함 (사전은 compression.py train 으로 캡처 파일에서 생성)
+COMPRESSION = False
+COMPRESSION_APIDS = ()  # 예: (0x081, 0x084)
+COMPRESSION_DICTIONARY_DIR = None
+compressor = None
+decompressor = None
+
+# 위성 브리지: UDP -> 라디오 = 하향(downlink), 라디오 -> UDP = 상향(uplink)
+BRIDGE = "satellite"
+_BRIDGE_LABEL = (BRIDGE,)
+_TX_ROUTE_DROP = (BRIDGE, "downlink", "route")
+_RX_ROUTE_DROP = (BRIDGE, "uplink", "route")
+_TX_FRAMES = (BRIDGE, "downlink")
+_RX_FRAMES = (BRIDGE, "uplink")
+_STRIPE_SKIP = (BRIDGE, "uplink", "stripe_skip")
+_RX_DECOMPRESS_DROP = (BRIDGE, "uplink", "decompress")
+_RX_RING_DROP = (BRIDGE, "uplink", "ring_full")
+_TX_RING_DROP = (BRIDGE, "downlink", "ring_full")
+_TX_COMPRESSION = (BRIDGE, "downlink")
+_RADIO_SEND = (BRIDGE, "radio_send")
+_LINK_TX = (BRIDGE, "tx")
+_LINK_RX = (BRIDGE, "rx")
+
+# 수신 스트림 재동기화 설정
+KNOWN_APIDS = None  # 허용할 APID 목록, None 이면 모두 허용
+MAX_PACKET_LENGTH = 4096  # 이보다 긴 Packet Length 는 깨진 헤더로 봄
+STALL_TIMEOUT = 1.0  # 이 시간(초) 동안 완성되지 않는 패킷은 버리고 다시 동기화
+
+# 깨진 헤더를 만나면 다음 유효 헤더까지 건너뛰는 재조립기 (압축을 켰으면 압축 패킷 헤더도 허용)
+def create_reassembler():
+    validator = HeaderValidator(KNOWN_APIDS, max_length=MAX_PACKET_LENGTH, allow_compressed=decompressor is not None)
+    return PacketReassembler(validator=validator, stall_timeout=STALL_TIMEOUT)
+
+# APID 라우팅 (기본: 모두 전달), main 에서 규칙 파일을 지정하면 그 규칙으로 바뀜
+ROUTING_FILE = None
+routes = RoutingTable()
+
+# 상향 링크 스케줄링 (등급이 하나뿐이면 기존 FIFO 와 같음)
+# 예) UPLINK_CLASSES = [TrafficClass("command", priority=0),
+#                       TrafficClass("bulk", priority=1, rate=20000, burst=2048)]
+#     UPLINK_APID_CLASSES = {0x010: "command"}
+#     UPLINK_DEFAULT_CLASS = "bulk"
+UPLINK_CLASSES = [TrafficClass("default")]
+UPLINK_APID_CLASSES = {}
+UPLINK_DEFAULT_CLASS = None
+UPLINK_POLICY = "strict"  # "strict" 또는 "weighted"
+
+def create_uplink_scheduler():
+    return PriorityScheduler(UPLINK_CLASSES, UPLINK_APID_CLASSES, policy=UPLINK_POLICY, default=UPLINK_DEFAULT_CLASS, observe_wait=observe_tx_wait)
+
+# 송신 스케줄러 대기 시간 (등급별)
+def observe_tx_wait(waited, class_name):
+    STAGE_LATENCY.observe(waited, (BRIDGE, f"tx_queue.{class_name}"))
 
-# radio_rx Hardware Settinggpej 
-radio_rx.setPALevel(RF24_PA_LOW)
-radio_rx.openReadingPipe(1, address[1])
-radio_rx.setChannel(0)
-radio_rx.payloadSize = 32  # Set the payload size to the maximum for simplicity
-radio_rx.setDataRate(RF24_1MBPS)
-radio_rx.startListening()
-
-# radio_tx Hardware Setting
-radio_tx.setPALevel(RF24_PA_LOW)
-radio_tx.openWritingPipe(address[0])
-radio_tx.setChannel(100)
-radio_tx.setDataRate(RF24_1MBPS)
-radio_tx.payloadSize = 32
+# 실제 라디오 생성 (import 시점에는 하드웨어에 접근하지 않음)
+def create_radios():
+    return create_radio(CE_PIN_1, CSN_PIN_1), create_radio(CE_PIN_2, CSN_PIN_2)
+
+# 스트라이핑용 추가 라디오 생성: [(라디오, 채널), ...]
+def create_stripe_radios(config):
+    return [(create_radio(ce_pin, csn_pin), channel) for ce_pin, csn_pin, channel in config]
+
+# 링크 적응 단계가 바뀔 때 기록 (role: "tx" = LinkTuner, "rx" = LinkFollower)
+def link_change_reporter(link, labels):
+    LINK_PROFILE.track(lambda: {labels: link.level})
+
+    def on_change(previous, level, reason):
+        log.info("link_profile_changed", role=labels[1], profile=link.profiles[level].name, previous=link.profiles[previous].name, reason=reason)
+        LINK_CHANGES.inc(labels + (reason,))
+
+    return on_change
+
+# 라디오 초기화 및 설정 (실제 RF24 와 simulator.VirtualRF24 모두 사용 가능)
+# dynamic payload 로 프레임 길이를 그대로 전달 (패킷을 모아 보낸 부분 프레임 뒤에 0x00 패딩이 붙지 않음)
+# 상대편 아두이노도 enableDynamicPayloads() 를 켜야 함
+# data_rate 는 양쪽이 같아야 함 (스트라이핑 모드는 STRIPE_DATA_RATE)
+def setup_radios(radio_rx, radio_tx, data_rate=RF24_1MBPS):
+    if not radio_rx.begin():
+        raise RuntimeError("radio_rx hardware is not responding")
+
+    if not radio_tx.begin():
+        raise RuntimeError("radio_tx hardware is not responding")
+
+    # radio_rx Hardware Setting
+    radio_rx.setPALevel(RF24_PA_LOW)
+    radio_rx.openReadingPipe(1, address[1])
+    radio_rx.setChannel(RX_CHANNEL)
+    radio_rx.payloadSize = 32  # Set the payload size to the maximum for simplicity
+    radio_rx.setDataRate(data_rate)
+    radio_rx.startListening()
+
+    # radio_tx Hardware Setting
+    radio_tx.setPALevel(RF24_PA_LOW)
+    radio_tx.openWritingPipe(address[0])
+    radio_tx.setChannel(TX_CHANNEL)
+    radio_tx.setDataRate(data_rate)
+    radio_tx.payloadSize = 32
+
+    radio_rx.enableDynamicPayloads()
+    radio_tx.enableDynamicPayloads()
+
+# 스트라이핑용 추가 라디오 설정, begin() 에 성공한 라디오 목록을 돌려줌
+# 실패한 라디오는 기록만 하고 빼므로 남은 라디오 수만큼의 처리량으로 계속 동작
+def setup_stripe_radios(radios, listening):
+    ready = []
+    for radio, channel in radios:
+        if not radio.begin():
+            log.error("stripe_radio_failed", channel=channel, role="rx" if listening else "tx")
+            continue
+        radio.setPALevel(RF24_PA_LOW)
+        radio.setChannel(channel)
+        radio.setDataRate(STRIPE_DATA_RATE)
+        radio.payloadSize = 32
+        radio.enableDynamicPayloads()
+        if listening:
+            radio.openReadingPipe(1, address[1])
+            radio.startListening()
+        else:
+            radio.openWritingPipe(address[0])
+        ready.append(radio)
+    return ready
 
 #########################################################################################
 ## 사용할 함수 정의
@@ -69,119 +248,433 @@ radio_tx.payloadSize = 32
 #########################################################################################
 
 # UDP/IP 수신 및 NRF24L01 송신
-def udp_to_nrf24():
-    udp_ip = "127.0.0.1"
-    udp_port = 1235
+# pipelined=True 면 writeFast 로 TX FIFO 를 채워서 보내고, 수신 대기 전에 txStandBy 로 결과를 확정
+# arq_sender 가 있으면 selective-repeat ARQ 로 송신 (재전송/피드백 처리를 위해 주기적으로 pump)
+# scheduler 가 있으면 UDP 수신은 별도 스레드에서 하고, 이 스레드는 스케줄러가 고른 순서대로 송신
+# 라우팅은 분할 전에 패킷마다 한 번 결정 (drop 은 버리고, channel 은 그 채널로 잠시 옮겨서 송신)
+# striper 가 있으면 StripedTransmitter 로 여러 라디오에 나눠 송신 (radio_tx 는 striper 의 라디오 중 하나)
+# tuner 가 있으면 프레임마다 결과를 알려주고, 패킷 사이에서 설정 단계 변경을 처리
+# aggregation_delay 를 주면 패킷을 이어 붙여 프레임을 채우고, 부분 프레임은 그 시간(초)까지 기다린 뒤 송신
+# ring 이 있으면 UDP 대신 링에서 패킷을 받아 스케줄러에 넣음 (프로세스 모드, scheduler 필요)
+def udp_to_nrf24(radio_tx, udp_ip="127.0.0.1", udp_port=1235, pipelined=True, arq_sender=None, scheduler=None, striper=None, tuner=None,
+                 aggregation_delay=AGGREGATION_DELAY, ring=None):
+    if ring is not None and scheduler is None:
+        raise ValueError("ring input requires a scheduler")
+    if ring is None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((udp_ip, udp_port))
+        log.info("listening", addr=f"{udp_ip}:{udp_port}")
+    reassembler = create_reassembler()
+    transmitter = striper
+    if striper is None and arq_sender is None and pipelined:
+        transmitter = PipelinedTransmitter(radio_tx, on_complete=report_tx_result, on_frame=tuner.record if tuner is not None else None)
+
+    # 프레임 하나를 ACK 를 기다리며 송신
+    def write_frame(frame):
+        ok = radio_tx.write(frame)
+        if ok:
+            log.payload("chunk_sent", frame)
+        else:
+            log.warning("send_failed")
+            WRITE_FAILURES.inc(_BRIDGE_LABEL)
+        if tuner is not None:
+            tuner.record(ok, radio_tx.getARC())
+
+    aggregator = None
+    if aggregation_delay is not None and arq_sender is None and striper is None:
+        aggregator = FrameAggregator(transmitter.send if transmitter is not None else write_frame, aggregation_delay)
+
+    # 부분 프레임을 기다린 시간이 지났으면 송신하고 FIFO 에 남은 프레임 완료를 기다림
+    def flush_aggregated():
+        if aggregator.poll():
+            FRAMES.inc(_TX_FRAMES)
+            if transmitter is not None:
+                transmitter.flush()
+
+    def transmit(packet):
+        action, channel = routes.route(packet)
+        if action == ROUTE_DROP:
+            log.debug("packet_dropped", apid=f"{packet_apid(packet):#05x}")
+            DROPPED.inc(_TX_ROUTE_DROP)
+            return
+        log.payload("packet_processing", packet)
+        labels = (BRIDGE, "downlink", packet_apid(packet))
+        PACKETS.inc(labels)
+        BYTES.inc(labels, len(packet))
+        if compressor is not None:
+            size = len(packet)
+            packet = compressor.compress(packet)
+            if len(packet) != size:
+                COMPRESSION_SAVED.inc(_TX_COMPRESSION, size - len(packet))
+        if arq_sender is not None:
+            # ARQ 순번은 한 채널에서만 이어지므로 채널 라우팅은 적용하지 않음
+            arq_sender.send(packet)
+            return
+        if striper is not None:
+            # 스트라이핑 순번은 모든 채널에 걸쳐 이어지므로 채널 라우팅은 적용하지 않음
+            started = time.monotonic()
+            if not striper.send(packet):
+                log.warning("send_failed", apid=f"{packet_apid(packet):#05x}")
+                WRITE_FAILURES.inc(_BRIDGE_LABEL)
+            FRAMES.inc(_TX_FRAMES, -(-len(packet) // 31))
+            STAGE_LATENCY.observe(time.monotonic() - started, _RADIO_SEND)
+            return
+        switch = action == ROUTE_CHANNEL and channel != TX_CHANNEL
+        if switch:
+            if transmitter is not None:
+                transmitter.flush()
+            radio_tx.setChannel(channel)
+        started = time.monotonic()
+        if aggregator is not None and not switch:
+            FRAMES.inc(_TX_FRAMES, aggregator.add(packet))
+        elif transmitter is not None:
+            transmitter.send(packet)
+            FRAMES.inc(_TX_FRAMES, -(-len(packet) // 32))
+        else:
+            chunks = split_data(packet)
+            for chunk in chunks:
+                write_frame(bytes(chunk))
+            FRAMES.inc(_TX_FRAMES, len(chunks))
+        STAGE_LATENCY.observe(time.monotonic() - started, _RADIO_SEND)
+        if switch:
+            if transmitter is not None:
+                transmitter.flush()
+            radio_tx.setChannel(TX_CHANNEL)
+        if tuner is not None:
+            tuner.poll(transmitter.flush if transmitter is not None else None)
+
+    if scheduler is not None:
+        if ring is not None:
+            threading.Thread(target=drain_ring, args=(ring, scheduler.put, RING_BATCH), daemon=True).start()
+        else:
+            threading.Thread(target=udp_ingest, args=(sock, reassembler, scheduler), daemon=True).start()
+        timeout = ARQ_POLL_INTERVAL if arq_sender is not None else None
+        while True:
+            if aggregator is not None:
+                flush_aggregated()
+                timeout = aggregator.timeout()
+            packet = scheduler.get(timeout)
+            if packet is None:
+                if arq_sender is not None:
+                    arq_sender.pump()
+                continue
+            transmit(packet)
+            # 대기 중인 패킷이 없으면 FIFO 에 남은 프레임 전송 완료를 기다림
+            if transmitter is not None and scheduler.empty():
+                transmitter.flush()
+
+    if arq_sender is not None:
+        sock.settimeout(ARQ_POLL_INTERVAL)
+
+    while True:
+        if aggregator is not None:
+            flush_aggregated()
+            sock.settimeout(aggregator.timeout())
+        try:
+            data, addr = sock.recvfrom(1024)
+        except socket.timeout:
+            if arq_sender is not None:
+                arq_sender.pump()
+            continue
+        log.payload("udp_received", data, src=f"{addr[0]}:{addr[1]}", buffered=reassembler.pending + len(data))
+        
+        for packet in reassembler.feed(data):
+            if capture is not None:
+                capture.record(DOWNLINK, packet)
+            transmit(packet)
 
+        # 다음 데이터그램이 없으면 FIFO 에 남은 프레임 전송 완료를 기다림
+        if transmitter is not None and not select.select([sock], [], [], 0)[0]:
+            transmitter.flush()
+
+# 스케줄러 모드의 UDP 수신: 재조립한 패킷을 복사해서 스케줄러에 넣음
+def udp_ingest(sock, reassembler, scheduler):
+    while True:
+        data, addr = sock.recvfrom(1024)
+        log.payload("udp_received", data, src=f"{addr[0]}:{addr[1]}", buffered=reassembler.pending + len(data))
+        for packet in reassembler.feed(data):
+            if capture is not None:
+                capture.record(DOWNLINK, packet)
+            if routes.is_dropped(packet):
+                log.debug("packet_dropped", apid=f"{packet_apid(packet):#05x}")
+                DROPPED.inc(_TX_ROUTE_DROP)
+                continue
+            scheduler.put(bytes(packet))
+
+# 프로세스 모드의 UDP 수신: 재조립한 패킷을 라디오 송신 프로세스로 가는 링에 넣음 (데이터그램마다 한 번에 공개)
+def udp_to_ring(ring, udp_ip="127.0.0.1", udp_port=1235):
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.bind((udp_ip, udp_port))
-
-    print(f"Listening on {udp_ip}:{udp_port}")
-    buffer = b''
-    
+    log.info("listening", addr=f"{udp_ip}:{udp_port}")
+    reassembler = create_reassembler()
     while True:
         data, addr = sock.recvfrom(1024)
-        buffer += data
-        print(f"Received UDP message from {addr}, buffer size: {len(buffer)}")
-        
-        while len(buffer) >= 6:
-            header = buffer[:6]
-            header_info = parse_primary_header(header)
-            packet_length = header_info["Packet Length"] + 1 + 6
-            
-            if len(buffer) >= packet_length:
-                packet = buffer[:packet_length]
-                buffer = buffer[packet_length:]
-                
-                print(f"Processing CCSDS packet: {packet.hex()}")
-                chunks = split_data(packet)
-                for chunk in chunks:
-                    if radio_tx.write(chunk):
-                        print(f"Sent chunk: {chunk.hex()}")
-                    else:
-                        print(f"Sending Failed")
-            else:
-                break
+        log.payload("udp_received", data, src=f"{addr[0]}:{addr[1]}", buffered=reassembler.pending + len(data))
+        for packet in reassembler.feed(data):
+            if capture is not None:
+                capture.record(DOWNLINK, packet)
+            if routes.is_dropped(packet):
+                log.debug("packet_dropped", apid=f"{packet_apid(packet):#05x}")
+                DROPPED.inc(_TX_ROUTE_DROP)
+                continue
+            if not ring.put(packet, publish=False):
+                DROPPED.inc(_TX_RING_DROP)
+        ring.publish()
+
+# 파이프라인 송신 결과 (패킷 단위)
+def report_tx_result(packet_id, ok):
+    if ok:
+        log.debug("packet_sent", packet_id=packet_id)
+    else:
+        log.warning("send_failed", packet_id=packet_id)
+        WRITE_FAILURES.inc(_BRIDGE_LABEL)
             
+# 라디오로 받은 패킷을 라우팅 규칙에 따라 UDP 로 전달하는 함수 (port 규칙이면 그 포트로)
+# 압축 복원, 캡처/아카이브 기록, 순번 확인도 여기서 함
+def create_deliver(udp_ip="127.0.0.1", udp_port=1234):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sequence = SequenceMetrics(SequenceTracker(), BRIDGE, "uplink")  # APID 별 손실/중복 감지
+
+    def deliver(packet):
+        if decompressor is not None:
+            try:
+                packet = decompressor.decompress(packet)
+            except ValueError as e:
+                log.warning("decompress_failed", error=e)
+                DROPPED.inc(_RX_DECOMPRESS_DROP)
+                return
+        if capture is not None:
+            capture.record(UPLINK, packet)
+        if archive is not None:
+            archive.record(UPLINK, packet)
+        sequence.observe(packet)
+        action, port = routes.route(packet)
+        labels = (BRIDGE, "uplink", packet_apid(packet))
+        PACKETS.inc(labels)
+        BYTES.inc(labels, len(packet))
+        if action == ROUTE_DROP:
+            log.debug("packet_dropped", apid=f"{packet_apid(packet):#05x}")
+            DROPPED.inc(_RX_ROUTE_DROP)
+            return
+        if action != ROUTE_PORT:
+            port = udp_port
+        sock.sendto(packet, (udp_ip, port))
+        log.payload("udp_sent", packet, port=port)
+
+    return deliver
+
 # NRF24L01 수신 및 UDP/IP 송신
-def nrf24_to_udp():
-    udp_ip = "127.0.0.1"
-    udp_port = 1234
+# arq_sender 가 있으면 ARQ 모드: 데이터 프레임은 순서를 복원한 뒤 재조립하고,
+# 제어 프레임(상대편 피드백)은 같은 방향 송신기에 전달, 우리 피드백은 radio_tx 로 보냄
+# stripe_radios 가 있으면 스트라이핑 모드: radio_rx 와 추가 라디오에서 받은 프레임을 순번대로 정렬한 뒤 재조립
+# link_follower 가 있으면 제어 파이프로 온 프레임은 링크 적응 제어로 처리
+# ring 이 있으면 재조립한 패킷을 링에 넣고, 전달은 drain_ring 스레드에서 처리
+# (drain=False 면 링은 다른 프로세스가 비움, 프로세스 모드의 UDP 단계)
+def nrf24_to_udp(radio_rx, udp_ip="127.0.0.1", udp_port=1234, arq_sender=None, stripe_radios=None, link_follower=None, ring=None, drain=True):
+    reassembler = create_reassembler()
+    reassembler_metrics = ReassemblerMetrics(reassembler, BRIDGE, "uplink")
 
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    received_data = b''
-    expected_length = None
+    if ring is None:
+        accept = create_deliver(udp_ip, udp_port)
+    else:
+        if drain:
+            threading.Thread(target=drain_ring, args=(ring, create_deliver(udp_ip, udp_port), RING_BATCH), daemon=True).start()
+
+        def accept(packet):
+            if not ring.put(packet):
+                DROPPED.inc(_RX_RING_DROP)
+
+    def forward(data):
+        for packet in reassembler.feed(data):
+            accept(packet)
+        reassembler_metrics.update()
+
+    if arq_sender is not None:
+        arq_receiver = ArqReceiver(forward, arq_sender.queue_control)
+
+    if stripe_radios is not None:
+        stripe_receive(radio_rx, stripe_radios, forward)
+
+    # 링크 적응 제어 프레임을 처리하고 데이터 프레임이 있는지 돌려줌
+    def data_available():
+        has_payload, pipe = radio_rx.available_pipe()
+        if not has_payload:
+            link_follower.poll()
+            return False
+        if pipe == LINK_CONTROL_PIPE:
+            link_follower.on_control(radio_rx.read(radio_rx.getDynamicPayloadSize()))
+            return False
+        link_follower.on_frame()
+        return True
 
+    available = radio_rx.available if link_follower is None else data_available
+    wait = create_rx_wait([radio_rx])
     while True:
-        if radio_rx.available():
-            length = radio_rx.getDynamicPayloadSize()
-            incoming_message = radio_rx.read(length)
-            print(f"Received chunk: {incoming_message.hex()}")
-            received_data += incoming_message
-
-            while len(received_data) >= 6:
-                if expected_length is None:
-                    header = received_data[:6]
-                    header_info = parse_primary_header(header)
-                    expected_length = header_info["Packet Length"] + 1 + 6
-                    print(f"Expected length: {expected_length}")
-
-                if expected_length is not None and len(received_data) >= expected_length:
-                    packet = received_data[:expected_length]
-                    if packet[0] == 0x00:
-                        if len(received_data) < expected_length:
-                            continue
-                        received_data = b''
-                        expected_length = None
-                        break
-                    print(f"Reassembled Data: {packet.hex()}")
-                    sock.sendto(packet, (udp_ip, udp_port))
-                    print(f"Sent UDP message to {udp_ip}:{udp_port}\n {packet}")
-                    received_data = received_data[expected_length:]
-                    expected_length = None
-                else:
-                    break
-
-            if expected_length is None and len(received_data) < 6:
-                received_data = b''
-                expected_length = None
-
-# CCSDS 패킷 분해
-def split_data(data, chunk_size=32):
-    chunks = []
-    for i in range(0, len(data), chunk_size):
-        chunk = data[i:i + chunk_size]
-        chunks.append(chunk)
-    return chunks
-
-# CCSDS 패킷 헤더 분석
-def parse_primary_header(header):
-    version_type_secflag_apid = struct.unpack(">H", header[:2])[0]
-    seq_flags_seq_count = struct.unpack(">H", header[2:4])[0]
-    packet_length = struct.unpack(">H", header[4:6])[0]
-
-    version_number = (version_type_secflag_apid >> 13) & 0x07
-    packet_type = (version_type_secflag_apid >> 12) & 0x01
-    secondary_header_flag = (version_type_secflag_apid >> 11) & 0x01
-    apid = version_type_secflag_apid & 0x07FF
-
-    sequence_flags = (seq_flags_seq_count >> 14) & 0x03
-    packet_sequence_count = seq_flags_seq_count & 0x3FFF
-
-    return {
-        "Version Number": version_number,
-        "Packet Type": packet_type,
-        "Secondary Header Flag": secondary_header_flag,
-        "APID": apid,
-        "Sequence Flags": sequence_flags,
-        "Packet Sequence Count": packet_sequence_count,
-        "Packet Length": packet_length
-    }
-
-def main():
+        if not available():
+            wait()
+            continue
+        length = radio_rx.getDynamicPayloadSize()
+        incoming_message = radio_rx.read(length)
+        log.payload("chunk_received", incoming_message)
+        FRAMES.inc(_RX_FRAMES)
+
+        if arq_sender is not None:
+            if is_arq_control(incoming_message):
+                arq_sender.on_feedback(incoming_message)
+            else:
+                arq_receiver.on_frame(incoming_message)
+            continue
+
+        # dynamic payload 라 패딩이 없으므로 프레임 끝에 걸친 다음 패킷의 앞부분은 그대로 이어서 재조립
+        for packet in reassembler.feed(incoming_message):
+            accept(packet)
+        reassembler_metrics.update()
+
+# 받은 프레임이 없을 때 호출할 대기 함수 (여러 라디오는 하나의 알림을 같이 씀)
+# 알림을 지운 뒤 호출한 쪽이 available() 을 다시 확인하므로 그 사이에 온 프레임도 놓치지 않음
+def create_rx_wait(radios, idle_sleep=RX_IDLE_SLEEP):
+    if not all(hasattr(radio, "rx_event") for radio in radios):
+        return partial(time.sleep, idle_sleep)
+    event = threading.Event()
+    for radio in radios:
+        radio.rx_event = event
+
+    def wait():
+        event.wait(RX_EVENT_TIMEOUT)
+        event.clear()
+    return wait
+
+# 스트라이핑 수신: 모든 라디오를 돌아가며 읽고, 빠진 순번은 일정 시간 뒤 건너뜀
+def stripe_receive(radio_rx, stripe_radios, forward):
+    radios = [radio_rx] + list(stripe_radios)
+    wait = create_rx_wait(radios, STRIPE_IDLE_SLEEP)  # 라디오 여러 대를 계속 확인하느라 CPU 를 독점하지 않도록
+    receiver = StripeReceiver(forward)
+    skipped = 0
+    next_poll = time.monotonic() + STRIPE_POLL_INTERVAL
+    while True:
+        idle = True
+        for radio in radios:
+            while radio.available():
+                frame = radio.read(radio.getDynamicPayloadSize())
+                log.payload("chunk_received", frame)
+                FRAMES.inc(_RX_FRAMES)
+                receiver.on_frame(frame)
+                idle = False
+        if idle:
+            wait()
+        now = time.monotonic()
+        if now >= next_poll:
+            receiver.poll()
+            next_poll = now + STRIPE_POLL_INTERVAL
+            if receiver.skipped != skipped:
+                log.warning("stripe_frames_skipped", count=receiver.skipped - skipped)
+                REASSEMBLY_RESETS.inc(_STRIPE_SKIP, receiver.skipped - skipped)
+                skipped = receiver.skipped
+
+# 설정된 포트로 측정값 내보내기 시작 (프로세스 모드에서는 단계마다 port_offset 만큼 뒤 포트)
+def start_metrics(port_offset=0):
+    if METRICS_HTTP_PORT is not None:
+        metrics.serve_http(METRICS_HTTP_PORT + port_offset)
+    if METRICS_UDP_PORT is not None:
+        metrics.serve_udp(METRICS_UDP_PORT + port_offset)
+
+def open_outputs(capture_file=None, archive_dir=None):
+    global capture, archive
+    if capture_file is not None:
+        capture = CaptureWriter(capture_file)
+    if archive_dir is not None:
+        archive = ArchiveWriter(archive_dir)
+
+# 프로세스 모드의 각 단계가 시작할 때: 라우팅 파일 감시와 측정값 포트는 프로세스마다 따로 둠
+# (부모의 백그라운드 스레드는 fork 한 프로세스에 없음)
+def start_stage(name):
+    routes.watch()
+    start_metrics(PROCESS_STAGES.index(name))
+
+# 프로세스 모드: 부모에서 설정한 라디오를 물려받아 단계별 프로세스로 실행, 한 단계라도 끝나면 RuntimeError
+def run_processes(radio_rx, radio_tx, capture_file=None, archive_dir=None, stripe_radios=None, striper=None, tuner=None, link_follower=None):
+    rx_ring = SharedRing(RX_RING_SIZE)
+    tx_ring = SharedRing(TX_RING_SIZE)
+
+    def radio_rx_stage():
+        start_stage("radio_rx")
+        nrf24_to_udp(radio_rx, stripe_radios=stripe_radios, link_follower=link_follower, ring=rx_ring.ring, drain=False)
+
+    def radio_tx_stage():
+        start_stage("radio_tx")
+        scheduler = create_uplink_scheduler()
+        QUEUE_DEPTH.track(lambda: {(BRIDGE, f"tx_queue.{name}"): depth for name, depth in scheduler.depths().items()})
+        udp_to_nrf24(radio_tx, scheduler=scheduler, striper=striper, tuner=tuner, ring=tx_ring.ring)
+
+    def udp_stage():
+        start_stage("udp")
+        open_outputs(capture_file, archive_dir)
+        QUEUE_DEPTH.track(lambda: {(BRIDGE, "rx_ring"): rx_ring.ring.qsize(), (BRIDGE, "tx_ring"): tx_ring.ring.qsize()})
+        QUEUE_BYTES.track(lambda: {(BRIDGE, "rx_ring"): rx_ring.ring.qbytes(), (BRIDGE, "tx_ring"): tx_ring.ring.qbytes()})
+        threading.Thread(target=drain_ring, args=(rx_ring.ring, create_deliver(), RING_BATCH), daemon=True).start()
+        udp_to_ring(tx_ring.ring)
+
+    stages = {"radio_rx": radio_rx_stage, "radio_tx": radio_tx_stage, "udp": udp_stage}
+    try:
+        run_stages([(name, stages[name]) for name in PROCESS_STAGES], PROCESS_CORES)
+    finally:
+        rx_ring.close()
+        tx_ring.close()
+
+# arq=True 는 상대편도 ARQ 모드로 동작하는 S_G_CSP 일 때만 사용 (아두이노 펌웨어는 미지원)
+# routing_file 을 주면 APID 라우팅 규칙을 읽고, 파일이 바뀔 때마다 다시 읽음
+# capture_file 을 주면 양방향 패킷을 그 파일에 기록
+# archive_dir 를 주면 라디오로 받은 패킷을 그 디렉터리의 아카이브에 기록
+# stripe_rx/stripe_tx 를 주면 스트라이핑 모드: 기본 라디오와 추가 라디오 [(라디오, 채널), ...] 를 함께 사용
+# link_adaptation=True 면 radio_tx 는 LinkTuner 로 설정을 바꾸고, radio_rx 는 상대편 제안을 따름
+# compression=True 면 COMPRESSION_APIDS 를 압축해서 보내고 받은 압축 패킷을 복원
+# rx_ring=True 면 라디오 수신과 UDP 전달 사이에 RX_RING_SIZE 바이트 링 버퍼를 둠
+# processes=True 면 프로세스 모드 (rx_ring 대신 공유 메모리 링 사용)
+def main(radio_rx, radio_tx, arq=False, routing_file=ROUTING_FILE, capture_file=CAPTURE_FILE, archive_dir=ARCHIVE_DIR, stripe_rx=None, stripe_tx=None,
+         link_adaptation=LINK_ADAPTATION, compression=COMPRESSION, rx_ring=RX_RING, processes=PROCESSES):
+    global compressor, decompressor
+    striping = stripe_rx is not None or stripe_tx is not None
+    if arq and striping:
+        raise ValueError("ARQ and striping cannot be combined")
+    if link_adaptation and (arq or striping):
+        raise ValueError("link adaptation cannot be combined with ARQ or striping")
+    if arq and processes:
+        raise ValueError("ARQ cannot be combined with process mode")
+    if routing_file is not None:
+        routes.load_file(routing_file)
+    if compression:
+        compressor, decompressor = create_codec(COMPRESSION_APIDS, COMPRESSION_DICTIONARY_DIR)
+    if not processes:
+        routes.watch()
+        open_outputs(capture_file, archive_dir)
+        start_metrics()
+    setup_radios(radio_rx, radio_tx, data_rate=STRIPE_DATA_RATE if striping else RF24_1MBPS)
+    arq_sender = ArqSender(radio_tx.write) if arq else None
+    striper = stripe_rx_radios = None
+    if striping:
+        stripe_rx_radios = setup_stripe_radios(stripe_rx or [], listening=True)
+        striper = StripedTransmitter([radio_tx] + setup_stripe_radios(stripe_tx or [], listening=False))
+        log.info("striping", rx_radios=1 + len(stripe_rx_radios), tx_radios=striper.lanes)
+    tuner = link_follower = None
+    if link_adaptation:
+        tuner = LinkTuner(radio_tx, address[0])
+        tuner.on_change = link_change_reporter(tuner, _LINK_TX)
+        link_follower = LinkFollower(radio_rx, address[1])
+        link_follower.on_change = link_change_reporter(link_follower, _LINK_RX)
+    if processes:
+        run_processes(radio_rx, radio_tx, capture_file, archive_dir, stripe_rx_radios, striper, tuner, link_follower)
+        return
+    scheduler = create_uplink_scheduler()
+    QUEUE_DEPTH.track(lambda: {(BRIDGE, f"tx_queue.{name}"): depth for name, depth in scheduler.depths().items()})
+    ring = None
+    if rx_ring:
+        ring = RingBuffer(RX_RING_SIZE)
+        QUEUE_DEPTH.track(lambda: {(BRIDGE, "rx_ring"): ring.qsize()})
+        QUEUE_BYTES.track(lambda: {(BRIDGE, "rx_ring"): ring.qbytes()})
+
     # Threads for UDP to NRF24 and NRF24 to UDP
-    udp_to_nrf24_thread = threading.Thread(target=udp_to_nrf24)
-    nrf24_to_udp_thread = threading.Thread(target=nrf24_to_udp)
+    udp_to_nrf24_thread = threading.Thread(target=udp_to_nrf24, args=(radio_tx,), kwargs={"arq_sender": arq_sender, "scheduler": scheduler, "striper": striper, "tuner": tuner})
+    nrf24_to_udp_thread = threading.Thread(target=nrf24_to_udp, args=(radio_rx,), kwargs={"arq_sender": arq_sender, "stripe_radios": stripe_rx_radios, "link_follower": link_follower, "ring": ring})
 
     udp_to_nrf24_thread.start()
     nrf24_to_udp_thread.start()
@@ -190,10 +683,16 @@ def main():
     nrf24_to_udp_thread.join()
 
 if __name__ == "__main__":
+    setup_logging(LOG_LEVEL, dump=LOG_PACKET_DUMP)
+    radio_rx, radio_tx = create_radios()
+    stripe_rx = create_stripe_radios(STRIPE_RX_RADIOS) if STRIPING else None
+    stripe_tx = create_stripe_radios(STRIPE_TX_RADIOS) if STRIPING else None
     try:
-        main()
+        main(radio_rx, radio_tx, stripe_rx=stripe_rx, stripe_tx=stripe_tx)
     except KeyboardInterrupt:
-        print("Exiting program")
+        log.info("exiting")
     finally:
         radio_rx.powerDown()
-        radio_tx.powerDown()
\ No newline at end of file
+        radio_tx.powerDown()
+        for radio, _ in (stripe_rx or []) + (stripe_tx or []):
+            radio.powerDown()
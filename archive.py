@@ -0,0 +1,455 @@
+import os
+import sys
+import time
+import mmap
+import heapq
+import atexit
+import struct
+import argparse
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from ccsds import APID_COUNT
+from capture import CaptureWriter, CaptureReader, DOWNLINK, UPLINK, DIRECTION_NAMES
+from eventlog import get_logger
+
+###############################################################
+# 텔레메트리 아카이브
+# 브리지가 받은 패킷을 시간 단위 세그먼트 파일에 쌓고, 세그먼트마다 색인 파일을 붙여서
+# "APID 0x081 을 지난 패스 동안" 같은 조회가 해당 레코드만 mmap 으로 읽게 함
+#
+# 디렉터리 구조: <첫 패킷 시각 ns 20자리>.cap  세그먼트 (capture.py 와 같은 형식, 그대로 재생 가능)
+#                <첫 패킷 시각 ns 20자리>.idx  색인 (세그먼트를 닫을 때 생성)
+# 색인 구조   : [헤더 32바이트] [APID 목록표 2048 x (시작, 개수) u32]
+#               [시각 u64 x N] [레코드 위치 u64 x N] [APID 별 항목 번호 u32 x N]
+#               시각/위치 배열은 시각 순으로 정렬, APID 별 항목 번호도 각 APID 안에서 시각 순
+# 색인은 기계 바이트 순서 그대로 mmap 해서 읽음 (라즈베리파이/PC 모두 little endian)
+###############################################################
+
+log = get_logger("archive")
+
+INDEX_MAGIC = b"CSPIDX\x00\x01"
+_INDEX_HEADER = struct.Struct("<8sIIQQ")  # 매직, 항목 수, 예약, 첫 시각, 마지막 시각
+_DIRECTORY_SIZE = APID_COUNT * 2 * 4
+
+SEGMENT_SECONDS = 3600  # 세그먼트 하나에 담을 시간
+SEGMENT_BYTES = 256 * 1024 * 1024  # 세그먼트 최대 크기
+
+def _segment_name(first_ns):
+    return f"{first_ns:020d}"
+
+#########################################################################################
+#
+# 색인
+#
+#########################################################################################
+
+# 시각 / 위치 / APID 배열로 색인 파일 작성 (임시 파일에 쓴 뒤 이름을 바꿔서 반쯤 쓰인 색인이 보이지 않게 함)
+def write_index(path, timestamps, offsets, apids):
+    count = len(timestamps)
+    order = list(range(count))
+    if any(timestamps[i] > timestamps[i + 1] for i in range(count - 1)):
+        order.sort(key=timestamps.__getitem__)  # 시계가 뒤로 간 경우에만 정렬
+
+    sorted_ts = array("Q", (timestamps[i] for i in order))
+    sorted_offsets = array("Q", (offsets[i] for i in order))
+
+    # APID 별 항목 번호 (counting sort)
+    counts = [0] * APID_COUNT
+    for i in order:
+        counts[apids[i]] += 1
+    directory = array("I", bytes(_DIRECTORY_SIZE))
+    start = 0
+    for apid, n in enumerate(counts):
+        directory[2 * apid] = start
+        directory[2 * apid + 1] = n
+        start += n
+    fill = [directory[2 * apid] for apid in range(APID_COUNT)]
+    postings = array("I", bytes(4 * count))
+    for position, i in enumerate(order):
+        apid = apids[i]
+        postings[fill[apid]] = position
+        fill[apid] += 1
+
+    first = sorted_ts[0] if count else 0
+    last = sorted_ts[-1] if count else 0
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_INDEX_HEADER.pack(INDEX_MAGIC, count, 0, first, last))
+        f.write(directory.tobytes())
+        f.write(sorted_ts.tobytes())
+        f.write(sorted_offsets.tobytes())
+        f.write(postings.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+# 세그먼트를 처음부터 읽어서 색인 생성 (색인 없이 남은 세그먼트 복구용)
+def build_index(segment_path, index_path):
+    timestamps, offsets, apids = array("Q"), array("Q"), array("H")
+    with CaptureReader(segment_path) as reader:
+        for offset, timestamp_ns, direction, apid in reader.offsets():
+            timestamps.append(timestamp_ns)
+            offsets.append(offset)
+            apids.append(apid)
+    write_index(index_path, timestamps, offsets, apids)
+    return len(timestamps)
+
+class SegmentIndex:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, _, self.first_ns, self.last_ns = _INDEX_HEADER.unpack_from(self._mmap)
+        if magic != INDEX_MAGIC or len(self._mmap) != _INDEX_HEADER.size + _DIRECTORY_SIZE + count * 20:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a valid index")
+        self.count = count
+        view = memoryview(self._mmap)
+        pos = _INDEX_HEADER.size
+        self._directory = view[pos:pos + _DIRECTORY_SIZE].cast("I")
+        pos += _DIRECTORY_SIZE
+        self._timestamps = view[pos:pos + 8 * count].cast("Q")
+        pos += 8 * count
+        self._offsets = view[pos:pos + 8 * count].cast("Q")
+        pos += 8 * count
+        self._postings = view[pos:pos + 4 * count].cast("I")
+        self._view = view
+
+    # 헤더만 읽어서 (항목 수, 첫 시각, 마지막 시각)
+    @staticmethod
+    def read_header(path):
+        with open(path, "rb") as f:
+            magic, count, _, first_ns, last_ns = _INDEX_HEADER.unpack(f.read(_INDEX_HEADER.size))
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{path} is not a valid index")
+        return count, first_ns, last_ns
+
+    # 조건에 맞는 레코드 위치를 시각 순으로 (start_ns 이상, end_ns 미만)
+    def offsets(self, apids=None, start_ns=None, end_ns=None):
+        timestamps = self._timestamps
+        lo = 0 if start_ns is None else bisect_left(timestamps, start_ns)
+        hi = self.count if end_ns is None else bisect_left(timestamps, end_ns)
+        if lo >= hi:
+            return
+        if apids is None:
+            positions = range(lo, hi)
+        else:
+            postings = self._postings
+            ranges = []
+            for apid in apids:
+                first = self._directory[2 * apid]
+                last = first + self._directory[2 * apid + 1]
+                a = bisect_left(postings, lo, first, last)
+                b = bisect_left(postings, hi, a, last)
+                if a < b:
+                    ranges.append(postings[a:b])
+            positions = ranges[0] if len(ranges) == 1 else heapq.merge(*ranges)
+        offsets = self._offsets
+        for i in positions:
+            yield offsets[i]
+
+    def close(self):
+        for view in (self._directory, self._timestamps, self._offsets, self._postings, self._view):
+            view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # 조회 중인 slice 가 남아 있으면 GC 때 닫힘
+
+#########################################################################################
+#
+# 기록
+#
+#########################################################################################
+
+class ArchiveWriter:
+    # CaptureWriter 와 같은 record(방향, 패킷) 로 기록
+    # segment_seconds 가 지나거나 segment_bytes 를 넘으면 세그먼트를 닫고 색인을 만듦
+    def __init__(self, directory, segment_seconds=SEGMENT_SECONDS, segment_bytes=SEGMENT_BYTES, batch_size=64 * 1024, flush_interval=0.5):
+        self.directory = directory
+        self.segment_ns = int(segment_seconds * 1e9)
+        self.segment_bytes = segment_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._writer = None
+        self._closed = False
+        self._indexers = []
+        reindex(directory)  # 지난번에 색인을 못 만들고 끝난 세그먼트
+        atexit.register(self.close)
+
+    def _open_segment(self, first_ns):
+        name = os.path.join(self.directory, _segment_name(first_ns))
+        while os.path.exists(name + ".cap"):
+            first_ns += 1
+            name = os.path.join(self.directory, _segment_name(first_ns))
+        self._writer = CaptureWriter(name + ".cap", self.batch_size, self.flush_interval)
+        self._segment_start = first_ns
+        self._index_path = name + ".idx"
+        self._timestamps, self._offsets, self._apids = array("Q"), array("Q"), array("H")
+
+    # 세그먼트를 닫고 색인은 백그라운드에서 작성 (수신 루프를 막지 않음)
+    def _seal_segment(self, background=True):
+        writer = self._writer
+        self._writer = None
+        writer.close()
+        args = (self._index_path, self._timestamps, self._offsets, self._apids)
+        if background:
+            thread = threading.Thread(target=self._write_index, args=args, daemon=True)
+            thread.start()
+            self._indexers = [t for t in self._indexers if t.is_alive()] + [thread]
+        else:
+            self._write_index(*args)
+
+    @staticmethod
+    def _write_index(path, timestamps, offsets, apids):
+        started = time.monotonic()
+        try:
+            write_index(path, timestamps, offsets, apids)
+        except OSError as e:
+            log.error("segment_index_failed", path=path, error=e)  # 다음 시작 때 reindex 로 복구
+            return
+        log.info("segment_indexed", path=path, records=len(timestamps), seconds=time.monotonic() - started)
+
+    def record(self, direction, packet, timestamp_ns=None):
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        with self._lock:
+            if self._closed:
+                return
+            writer = self._writer
+            if writer is not None and (timestamp_ns - self._segment_start >= self.segment_ns or writer.size >= self.segment_bytes):
+                self._seal_segment()
+                writer = None
+            if writer is None:
+                self._open_segment(timestamp_ns)
+                writer = self._writer
+            self._offsets.append(writer.record(direction, packet, timestamp_ns))
+            self._timestamps.append(timestamp_ns)
+            self._apids.append((packet[0] & 0x07) << 8 | packet[1])
+
+    def flush(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.flush()
+
+    # 마지막 세그먼트까지 색인을 만들고 종료
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._writer is not None:
+                self._seal_segment(background=False)
+        for thread in self._indexers:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# 색인 없는 세그먼트의 색인 생성 (기록 중인 세그먼트가 없을 때만 호출)
+def reindex(directory):
+    rebuilt = 0
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".cap"):
+            continue
+        segment = os.path.join(directory, name)
+        index = segment[:-4] + ".idx"
+        if os.path.exists(index):
+            continue
+        try:
+            records = build_index(segment, index)
+        except ValueError as e:
+            log.warning("reindex_failed", path=segment, error=e)
+            continue
+        log.info("segment_reindexed", path=segment, records=records)
+        rebuilt += 1
+    return rebuilt
+
+#########################################################################################
+#
+# 조회
+#
+#########################################################################################
+
+class TelemetryArchive:
+    def __init__(self, directory):
+        self.directory = directory
+
+    # [(첫 시각 ns, 세그먼트 경로, 색인 경로 또는 None)] 시각 순
+    def segments(self):
+        result = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".cap") and name[:-4].isdigit():
+                segment = os.path.join(self.directory, name)
+                index = segment[:-4] + ".idx"
+                result.append((int(name[:-4]), segment, index if os.path.exists(index) else None))
+        return result
+
+    # 조건에 맞는 세그먼트만 고름 (색인 헤더 32바이트만 읽음)
+    def _candidates(self, start_ns, end_ns):
+        segments = self.segments()
+        for i, (first_ns, segment, index) in enumerate(segments):
+            if index is not None:
+                try:
+                    count, first_ns, last_ns = SegmentIndex.read_header(index)
+                except (OSError, ValueError) as e:
+                    log.warning("index_unreadable", path=index, error=e)
+                    index, last_ns = None, None
+                else:
+                    if count == 0:
+                        continue
+            else:
+                last_ns = None  # 기록 중인 세그먼트: 끝을 알 수 없음
+            if end_ns is not None and first_ns >= end_ns:
+                continue
+            if start_ns is not None and last_ns is not None and last_ns < start_ns:
+                continue
+            yield segment, index
+
+    # (시각 ns, 방향, APID, 패킷 memoryview) 를 시각 순으로 돌려줌
+    # apids: APID 목록 (None 이면 전체), start_ns 이상 end_ns 미만, directions: 방향 집합
+    # 돌려받은 memoryview 는 다음 항목으로 넘어가기 전에 쓰거나 복사해야 함
+    def query(self, apids=None, start_ns=None, end_ns=None, directions=None):
+        if apids is not None:
+            apids = sorted(set(apids))
+        for segment, index in self._candidates(start_ns, end_ns):
+            with CaptureReader(segment, sequential=False) as reader:
+                if index is not None:
+                    seg_index = SegmentIndex(index)
+                    try:
+                        for offset in seg_index.offsets(apids, start_ns, end_ns):
+                            record = reader.record_at(offset)
+                            if directions is None or record[1] in directions:
+                                yield record
+                    finally:
+                        seg_index.close()
+                else:
+                    # 색인이 아직 없는 세그먼트는 이 세그먼트만 차례로 확인
+                    wanted = None if apids is None else set(apids)
+                    matches = []
+                    for offset, timestamp_ns, direction, apid in reader.offsets():
+                        if wanted is not None and apid not in wanted:
+                            continue
+                        if start_ns is not None and timestamp_ns < start_ns:
+                            continue
+                        if end_ns is not None and timestamp_ns >= end_ns:
+                            continue
+                        if directions is not None and direction not in directions:
+                            continue
+                        matches.append((timestamp_ns, offset))
+                    matches.sort()
+                    for timestamp_ns, offset in matches:
+                        yield reader.record_at(offset)
+
+    # 세그먼트별 (경로, 항목 수, 첫 시각, 마지막 시각), 색인이 없으면 항목 수 None
+    def summary(self):
+        result = []
+        for first_ns, segment, index in self.segments():
+            if index is None:
+                result.append((segment, None, first_ns, None))
+                continue
+            count, first_ns, last_ns = SegmentIndex.read_header(index)
+            result.append((segment, count, first_ns, last_ns))
+        return result
+
+#########################################################################################
+#
+# 명령행
+#
+#########################################################################################
+
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# "90m", "2h", "1d", "30" (초)
+def parse_duration(text):
+    unit = _DURATION_UNITS.get(text[-1:].lower())
+    if unit is None:
+        return float(text)
+    return float(text[:-1]) * unit
+
+# ISO 시각 ("2024-05-01T12:30:00") 또는 epoch 초 -> ns
+def parse_time(text):
+    try:
+        return int(float(text) * 1e9)
+    except ValueError:
+        return int(datetime.fromisoformat(text).timestamp() * 1e9)
+
+def _format_time(timestamp_ns):
+    seconds, ns = divmod(timestamp_ns, 1000000000)
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(seconds)) + f".{ns // 1000:06d}"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="CCSDS telemetry archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    info = sub.add_parser("info", help="list archive segments")
+    info.add_argument("directory")
+
+    query = sub.add_parser("query", help="print or extract matching packets")
+    query.add_argument("directory")
+    query.add_argument("--apid", action="append", type=lambda s: int(s, 0), help="APID to select (repeatable)")
+    query.add_argument("--since", type=parse_duration, help="only the last N s/m/h/d, e.g. 15m")
+    query.add_argument("--start", type=parse_time, help="ISO time or epoch seconds")
+    query.add_argument("--end", type=parse_time, help="ISO time or epoch seconds (exclusive)")
+    query.add_argument("--direction", choices=("uplink", "downlink", "both"), default="both")
+    query.add_argument("--output", help="write matches to a capture file (replayable with capture.py)")
+    query.add_argument("--count", action="store_true", help="only print the number of matches")
+    query.add_argument("--hex", action="store_true", help="print packet contents")
+
+    rebuild = sub.add_parser("reindex", help="build missing segment indexes")
+    rebuild.add_argument("directory")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "reindex":
+        print(f"Rebuilt {reindex(args.directory)} indexes")
+        return
+
+    archive = TelemetryArchive(args.directory)
+    if args.command == "info":
+        for segment, count, first_ns, last_ns in archive.summary():
+            if count is None:
+                print(f"{os.path.basename(segment)}  (open)  from {_format_time(first_ns)}")
+            elif count:
+                print(f"{os.path.basename(segment)}  {count:9d} packets  {_format_time(first_ns)} .. {_format_time(last_ns)}")
+        return
+
+    start_ns = args.start
+    if args.since is not None:
+        start_ns = time.time_ns() - int(args.since * 1e9)
+    directions = None
+    if args.direction != "both":
+        directions = {UPLINK if args.direction == "uplink" else DOWNLINK}
+
+    matches = archive.query(args.apid, start_ns, args.end, directions)
+    if args.output is not None:
+        count = 0
+        with CaptureWriter(args.output) as writer:
+            for timestamp_ns, direction, apid, packet in matches:
+                writer.record(direction, packet, timestamp_ns)
+                count += 1
+        print(f"Wrote {count} packets to {args.output}", file=sys.stderr)
+        return
+
+    count = 0
+    for timestamp_ns, direction, apid, packet in matches:
+        count += 1
+        if args.count:
+            continue
+        line = f"{_format_time(timestamp_ns)} {DIRECTION_NAMES.get(direction, direction):8s} {apid:#05x} {len(packet):5d}"
+        if args.hex:
+            line += " " + bytes(packet).hex()
+        print(line)
+    if args.count:
+        print(count)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import random
+import asyncio
+import argparse
+import platform
+import threading
+import G_S_CSP
+import S_G_CSP
+import G_S_CSP_async
+from ccsds import HEADER_SIZE, LENGTH_OFFSET
+from eventlog import setup_logging
+from radio_link import LinkTuner
+from compression import create_codec
+from simulator import RadioMedium, VirtualRF24, CommandSendSketch, DataReceiveSketch, step_loss_profile
+
+###############################################################
+# 지상국 <-> 위성 경로 처리량/지연 벤치마크
+# G_S_CSP -> 시리얼 -> 라디오 -> S_G_CSP -> UDP 전체 체인을 한 프로세스에서 실행하고
+# CCSDS 트래픽을 UDP 로 넣어서 packets/s, bytes/s, 지연 백분위, 손실, 단계별 CPU 를 측정
+# 결과는 JSON 으로 출력 (릴리스 간 회귀 비교용)
+###############################################################
+
+# 한 프로세스에서 두 브리지를 돌리므로 UDP 포트를 겹치지 않게 따로 지정
+GROUND_UPLINK_PORT = 41234    # 지상 소프트웨어 -> G_S_CSP (원래 1234)
+GROUND_DOWNLINK_PORT = 41235  # G_S_CSP -> 지상 소프트웨어 (원래 1235)
+SAT_DOWNLINK_PORT = 42235     # 위성 소프트웨어 -> S_G_CSP (원래 1235)
+SAT_UPLINK_PORT = 42234       # S_G_CSP -> 위성 소프트웨어 (원래 1234)
+
+LOCALHOST = "127.0.0.1"
+
+# 헤더 다음에 송신 시각(ns)과 패킷 번호를 기록해서 지연을 측정
+_STAMP = struct.Struct(">QI")
+MIN_PACKET_SIZE = HEADER_SIZE + _STAMP.size + 1
+MAX_PACKET_SIZE = 1024  # 브리지의 recvfrom(1024), 아두이노 버퍼(1024) 한계
+LOOPBACK_FIFO_SIZE = 4096
+
+#########################################################################################
+#
+# 트래픽 생성
+#
+#########################################################################################
+
+# "20:5,100:3,512:1" 같은 "값:가중치" 목록 분석 (값은 0x081 처럼 16진수도 가능)
+def parse_mix(text):
+    values = []
+    weights = []
+    for item in text.split(","):
+        value, _, weight = item.partition(":")
+        values.append(int(value, 0))
+        weights.append(float(weight) if weight else 1.0)
+    return values, weights
+
+# "0:0.05,5:0.4" 같은 "시작 초:손실 확률" 목록 분석 (시간에 따라 바뀌는 손실)
+def parse_loss_profile(text):
+    steps = []
+    for item in text.split(","):
+        start, _, loss = item.partition(":")
+        steps.append((float(start), float(loss)))
+    return step_loss_profile(steps)
+
+# 벤치마크용 CCSDS 패킷 (Secondary Header Flag = 1)
+def build_packet(apid, sequence_count, total_length, packet_id, send_ns):
+    word0 = (1 << 11) | (apid & 0x07FF)
+    word1 = (0x3 << 14) | (sequence_count & 0x3FFF)
+    header = struct.pack(">HHH", word0, word1, total_length - LENGTH_OFFSET)
+    stamp = _STAMP.pack(send_ns, packet_id)
+    filler = bytes((packet_id + i) & 0xFF or 0x55 for i in range(total_length - len(header) - len(stamp)))
+    return header + stamp + filler
+
+# 측정용 데이터를 패킷에서 꺼냄
+def read_stamp(packet):
+    return _STAMP.unpack_from(packet, HEADER_SIZE)
+
+class TrafficGenerator:
+    def __init__(self, name, target_port, sizes, apids, rate, duration, seed):
+        self.name = name
+        self.target = (LOCALHOST, target_port)
+        self.sizes = sizes
+        self.apids = apids
+        self.rate = rate  # 0 이면 최대 속도
+        self.duration = duration
+        self._rng = random.Random(seed)
+        self.sent = {}  # packet_id -> 패킷 길이
+        self.first_send_ns = None
+        self.last_send_ns = None
+
+    def run(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sequence_counts = {}
+        interval = 1.0 / self.rate if self.rate else 0.0
+        start = time.monotonic()
+        deadline = start + self.duration
+        packet_id = 0
+
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if interval:
+                # 누적 오차가 생기지 않도록 절대 시각 기준으로 전송
+                next_send = start + packet_id * interval
+                if next_send > now:
+                    time.sleep(next_send - now)
+
+            size = self._rng.choices(*self.sizes)[0]
+            apid = self._rng.choices(*self.apids)[0]
+            sequence_count = sequence_counts.get(apid, 0)
+            sequence_counts[apid] = (sequence_count + 1) & 0x3FFF
+
+            send_ns = time.monotonic_ns()
+            packet = build_packet(apid, sequence_count, size, packet_id, send_ns)
+            sock.sendto(packet, self.target)
+            self.sent[packet_id] = len(packet)
+            if self.first_send_ns is None:
+                self.first_send_ns = send_ns
+            self.last_send_ns = send_ns
+            packet_id += 1
+        sock.close()
+
+class TrafficCollector:
+    def __init__(self, name, listen_port):
+        self.name = name
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((LOCALHOST, listen_port))
+        self.sock.settimeout(0.1)
+        self.latencies_ns = []
+        self.received = set()
+        self.duplicates = 0
+        self.invalid = 0
+        self.bytes = 0
+        self.last_receive_ns = None
+        self._stop = threading.Event()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                packet = self.sock.recv(65535)
+            except socket.timeout:
+                continue
+            receive_ns = time.monotonic_ns()
+            if len(packet) < MIN_PACKET_SIZE:
+                self.invalid += 1
+                continue
+            send_ns, packet_id = read_stamp(packet)
+            if packet_id in self.received:
+                self.duplicates += 1
+                continue
+            self.received.add(packet_id)
+            self.latencies_ns.append(receive_ns - send_ns)
+            self.bytes += len(packet)
+            self.last_receive_ns = receive_ns
+        self.sock.close()
+
+    def stop(self):
+        self._stop.set()
+
+#########################################################################################
+#
+# 측정 및 결과 정리
+#
+#########################################################################################
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+def summarize(generator, collector):
+    sent = len(generator.sent)
+    received = len(collector.received)
+    latencies = sorted(collector.latencies_ns)
+    # 보낸 트래픽 구간 (첫 송신 ~ 마지막 송신, 늦게 도착한 패킷이 있으면 마지막 수신까지)
+    # 링크가 중간에 멈추면 처리량이 받은 패킷 수만큼 낮게 나오도록 수신 쪽만으로 구간을 정하지 않음
+    if generator.first_send_ns is not None:
+        end_ns = max(generator.last_send_ns, collector.last_receive_ns or 0)
+        elapsed = (end_ns - generator.first_send_ns) / 1e9
+    else:
+        elapsed = 0.0
+
+    def ms(value):
+        return None if value is None else value / 1e6
+
+    return {
+        "sent": sent,
+        "received": received,
+        "drops": sent - received,
+        "duplicates": collector.duplicates,
+        "invalid": collector.invalid,
+        "offered_bytes": sum(generator.sent.values()),
+        "delivered_bytes": collector.bytes,
+        "packets_per_s": received / elapsed if elapsed else 0.0,
+        "bytes_per_s": collector.bytes / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 0.50)),
+            "p99": ms(percentile(latencies, 0.99)),
+            "p999": ms(percentile(latencies, 0.999)),
+            "max": ms(latencies[-1] if latencies else None),
+        },
+    }
+
+# 브리지 단계별 스레드를 실행하고 스레드별 CPU 시간을 /proc 에서 읽음
+class StageThreads:
+    def __init__(self):
+        self._native_ids = {}
+
+    def start(self, name, target, *args, **kwargs):
+        def run():
+            self._native_ids[name] = threading.get_native_id()
+            target(*args, **kwargs)
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def cpu_seconds(self):
+        ticks = os.sysconf("SC_CLK_TCK")
+        usage = {}
+        for name, tid in self._native_ids.items():
+            try:
+                with open(f"/proc/self/task/{tid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                usage[name] = None
+                continue
+            # utime, stime (stat 의 14, 15번째 필드)
+            usage[name] = (int(fields[11]) + int(fields[12])) / ticks
+        return usage
+
+    # 스레드별 read/write 계열 시스템 호출 수 (/proc/.../io) 와 자발적 문맥 전환 수 (select/sleep 등으로 잠든 횟수)
+    def syscalls(self):
+        counts = {}
+        for name, tid in self._native_ids.items():
+            try:
+                with open(f"/proc/self/task/{tid}/io") as f:
+                    io_fields = dict(line.split(": ") for line in f.read().splitlines())
+                with open(f"/proc/self/task/{tid}/status") as f:
+                    status = dict(line.split(":\t", 1) for line in f.read().splitlines() if ":\t" in line)
+            except OSError:
+                counts[name] = None
+                continue
+            counts[name] = {
+                "read": int(io_fields["syscr"]),
+                "write": int(io_fields["syscw"]),
+                "context_switches": int(status["voluntary_ctxt_switches"]),
+            }
+        return counts
+
+#########################################################################################
+#
+# 전체 체인 구성
+#
+#########################################################################################
+
+def start_chain(config, stages):
+    if config.link == "loopback":
+        # 전파 시간과 손실이 없고, RX FIFO 도 넉넉해서 브리지 소프트웨어 자체의 비용만 측정
+        medium = RadioMedium(realtime=False, seed=config.seed)
+        realtime = False
+        fifo_size = LOOPBACK_FIFO_SIZE
+    else:
+        medium = RadioMedium(
+            loss=config.loss,
+            ack_loss=config.ack_loss,
+            latency=config.latency,
+            seed=config.seed,
+            loss_profile=parse_loss_profile(config.loss_profile) if config.loss_profile else None,
+            link_model=config.link_model,
+        )
+        realtime = True
+        fifo_size = 3
+
+    # 양쪽 브리지에 같은 압축 설정 (사전 없이 트래픽의 모든 APID)
+    if config.compress:
+        apids = parse_mix(config.apids)[0]
+        for bridge in (S_G_CSP, G_S_CSP, G_S_CSP_async):
+            bridge.compressor, bridge.decompressor = create_codec(apids)
+
+    command_send = CommandSendSketch(medium, realtime=realtime, radio_fifo_size=fifo_size, aggregation_delay=config.aggregate or 0.0,
+                                     flow_control=config.flow_control).start()
+    data_receive = DataReceiveSketch(medium, realtime=realtime, radio_fifo_size=fifo_size).start()
+
+    # 위성 쪽 브리지 (S_G_CSP)
+    radio_rx = VirtualRF24(S_G_CSP.CE_PIN_1, S_G_CSP.CSN_PIN_1, medium, fifo_size=fifo_size)
+    radio_tx = VirtualRF24(S_G_CSP.CE_PIN_2, S_G_CSP.CSN_PIN_2, medium, fifo_size=fifo_size)
+    S_G_CSP.setup_radios(radio_rx, radio_tx)
+    # 하향 링크 적응 (data_receive 스케치가 따라옴, Command_Send 는 고정 설정이므로 상향은 그대로)
+    tuner = LinkTuner(radio_tx, S_G_CSP.address[0]) if config.adaptive else None
+    stages.start("satellite.udp_to_nrf24", S_G_CSP.udp_to_nrf24, radio_tx, udp_port=SAT_DOWNLINK_PORT, tuner=tuner,
+                 aggregation_delay=config.aggregate)
+    stages.start("satellite.nrf24_to_udp", S_G_CSP.nrf24_to_udp, radio_rx, udp_port=SAT_UPLINK_PORT)
+
+    # 지상 쪽 브리지 (G_S_CSP 또는 G_S_CSP_async)
+    ser_tx, ser_rx = G_S_CSP.open_serial_ports(command_send.port, data_receive.port)
+    if config.engine == "asyncio":
+        bridge = G_S_CSP_async.run_bridge(
+            ser_tx,
+            ser_rx,
+            udp_rx_port=GROUND_UPLINK_PORT,
+            udp_tx_port=GROUND_DOWNLINK_PORT,
+            flow_control=config.flow_control,
+        )
+        stages.start("ground.asyncio", asyncio.run, bridge)
+    else:
+        G_S_CSP.create_queues()
+        stages.start("ground.udp_receiver", G_S_CSP.udp_receiver, udp_port=GROUND_UPLINK_PORT)
+        stages.start("ground.udp_sender", G_S_CSP.udp_sender, udp_port=GROUND_DOWNLINK_PORT)
+        stages.start("ground.send_to_arduino", G_S_CSP.send_to_arduino, ser_tx, flow_control=config.flow_control)
+        stages.start("ground.receive_to_arduino", G_S_CSP.receive_to_arduino, ser_rx)
+
+    return medium, command_send, data_receive, tuner
+
+def run_benchmark(config):
+    sizes = parse_mix(config.sizes)
+    apids = parse_mix(config.apids)
+    for size in sizes[0]:
+        if not MIN_PACKET_SIZE <= size <= MAX_PACKET_SIZE:
+            raise ValueError(f"packet size {size} out of range {MIN_PACKET_SIZE}..{MAX_PACKET_SIZE}")
+
+    stages = StageThreads()
+    pairs = []
+    if config.direction in ("uplink", "both"):
+        pairs.append((
+            TrafficGenerator("uplink", GROUND_UPLINK_PORT, sizes, apids, config.rate, config.duration, config.seed),
+            TrafficCollector("uplink", SAT_UPLINK_PORT),
+        ))
+    if config.direction in ("downlink", "both"):
+        pairs.append((
+            TrafficGenerator("downlink", SAT_DOWNLINK_PORT, sizes, apids, config.rate, config.duration, config.seed + 1),
+            TrafficCollector("downlink", GROUND_DOWNLINK_PORT),
+        ))
+
+    # 브리지의 로그 출력은 버리되, 로그 비용은 그대로 측정에 포함
+    # (브리지 스레드는 프로세스 종료까지 계속 돌기 때문에 원래 stdout 으로 되돌리지 않음)
+    sys.stdout = open(os.devnull, "w")
+    setup_logging(config.log_level, dump=config.log_dump)
+    medium, command_send, data_receive, tuner = start_chain(config, stages)
+    time.sleep(0.2)  # 소켓 bind 대기
+
+    started = time.monotonic()
+    collectors = [threading.Thread(target=c.run, daemon=True) for _, c in pairs]
+    generators = [threading.Thread(target=g.run, daemon=True) for g, _ in pairs]
+    for thread in collectors + generators:
+        thread.start()
+    for thread in generators:
+        thread.join()
+    time.sleep(config.drain)
+    for _, collector in pairs:
+        collector.stop()
+    for thread in collectors:
+        thread.join()
+    wall_seconds = time.monotonic() - started
+    cpu = stages.cpu_seconds()
+    syscalls = stages.syscalls()
+    directions = {g.name: summarize(g, c) for g, c in pairs}
+
+    # Command_Send 의 시리얼 수신 버퍼가 넘치면 깨진 길이를 읽은 뒤 상향 패킷을 계속 잃으므로
+    # 브리지가 아니라 시험 구성의 한계를 잰 결과가 됨 (--flow-control 을 켜거나 --rate 를 낮춤)
+    if command_send.Serial.overruns:
+        uplink = directions.get("uplink", {"sent": 0, "received": 0})
+        raise RuntimeError(f"Command_Send serial buffer overran {command_send.Serial.overruns} times "
+                           f"({uplink['received']}/{uplink['sent']} uplink packets delivered); "
+                           "use --flow-control or a lower --rate")
+
+    # 지상 브리지 시리얼 단계의 패킷당 시스템 호출 수 (read + write)
+    # 송신 단계는 보낸 패킷 전부, 수신 단계는 끝까지 전달된 패킷 기준
+    serial_stages = {"ground.send_to_arduino": ("uplink", "sent"), "ground.receive_to_arduino": ("downlink", "received")}
+    per_packet = {}
+    for stage, (direction, key) in serial_stages.items():
+        counts = syscalls.get(stage)
+        if counts is not None and direction in directions and directions[direction][key]:
+            per_packet[stage] = (counts["read"] + counts["write"]) / directions[direction][key]
+
+    results = {
+        "config": vars(config),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "wall_seconds": wall_seconds,
+        "directions": directions,
+        "cpu_seconds": cpu,
+        "syscalls": syscalls,
+        "serial_syscalls_per_packet": per_packet,
+        "simulator": {
+            "command_send_serial_overruns": command_send.Serial.overruns,
+            "radio_transmissions": medium.transmissions,
+        },
+    }
+    if config.compress:
+        results["compression"] = {
+            name: {
+                "compressed": bridge.compressor.compressed,
+                "not_smaller": bridge.compressor.not_smaller,
+                "ratio": bridge.compressor.ratio(),
+                "decompress_failures": bridge.decompressor.failed,
+            }
+            for name, bridge in (("satellite", S_G_CSP), ("ground", G_S_CSP_async if config.engine == "asyncio" else G_S_CSP))
+        }
+    if tuner is not None:
+        results["link_adaptation"] = {
+            "profile": tuner.profile.name,
+            "switches": tuner.switches,
+            "failed_handshakes": tuner.failed_handshakes,
+            "receiver_profile": data_receive.link.profiles[data_receive.link.level].name,
+            "receiver_switches": data_receive.link.switches,
+            "last_goodput": tuner.last_goodput,
+        }
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ground <-> satellite bridge benchmark")
+    parser.add_argument("--direction", choices=("uplink", "downlink", "both"), default="both")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads",
+                        help="ground bridge runtime (G_S_CSP or G_S_CSP_async)")
+    parser.add_argument("--link", choices=("sim", "loopback"), default="sim",
+                        help="sim: real-time nRF24/UART timing, loopback: lossless, no airtime")
+    parser.add_argument("--sizes", default="32:5,64:3,256:1",
+                        help="packet size mix as total_length:weight,...")
+    parser.add_argument("--apids", default="0x081:3,0x084:1",
+                        help="APID mix as apid:weight,...")
+    parser.add_argument("--rate", type=float, default=50.0,
+                        help="offered load per direction in packets/s (0 = as fast as possible)")
+    parser.add_argument("--duration", type=float, default=5.0, help="traffic duration in seconds")
+    parser.add_argument("--drain", type=float, default=2.0, help="seconds to wait for in-flight packets")
+    parser.add_argument("--loss", type=float, default=0.0, help="radio frame loss probability")
+    parser.add_argument("--ack-loss", type=float, default=0.0, help="radio ACK loss probability")
+    parser.add_argument("--latency", type=float, default=0.0, help="extra radio latency in seconds")
+    parser.add_argument("--loss-profile", help="time-varying loss as start_seconds:loss,... (overrides --loss)")
+    parser.add_argument("--link-model", action="store_true",
+                        help="scale loss by the sender's data rate and PA level")
+    parser.add_argument("--adaptive", action="store_true", help="enable downlink link adaptation (LinkTuner)")
+    parser.add_argument("--aggregate", type=float, metavar="SECONDS",
+                        help="pack small packets into shared radio frames, waiting up to SECONDS for a partial frame")
+    parser.add_argument("--compress", action="store_true", help="compress packets of every APID in the mix before framing")
+    parser.add_argument("--flow-control", action=argparse.BooleanOptionalAction, default=True,
+                        help="credit-based flow control between the ground bridge and Command_Send "
+                             "(without it Command_Send's 64-byte serial buffer overruns at the default rate)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="INFO", help="bridge log level (DEBUG logs every frame and packet)")
+    parser.add_argument("--log-dump", action="store_true", help="include packet contents in DEBUG logs")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    config = parse_args(argv)
+    try:
+        results = run_benchmark(config)
+    except RuntimeError as e:
+        sys.exit(f"benchmark failed: {e}")
+    text = json.dumps(results, indent=2)
+    if config.output:
+        with open(config.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.__stdout__.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
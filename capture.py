@@ -0,0 +1,279 @@
+import os
+import sys
+import mmap
+import time
+import struct
+import socket
+import atexit
+import argparse
+import threading
+from ccsds import split_data
+from eventlog import get_logger, setup_logging
+
+###############################################################
+# 패킷 캡처 및 재생
+# 브리지가 재조립한 CCSDS 패킷을 추가 전용(append-only) 바이너리 파일에 기록하고,
+# 기록한 파일을 UDP(1234/1235) 또는 시뮬레이터 라디오로 다시 보내서 현장 상황을 재현
+#
+# 파일 구조: [매직 8바이트] [레코드] [레코드] ...
+# 레코드    : [시각 ns (u64)] [방향 (u8)] [APID (u16)] [길이 (u32)] [패킷]  (little endian)
+# 읽을 때는 mmap 으로 열어서 패킷을 복사 없이 memoryview 로 돌려줌
+###############################################################
+
+log = get_logger("capture")
+
+CAPTURE_MAGIC = b"CSPCAP\x00\x01"
+_RECORD = struct.Struct("<QBHI")
+
+UPLINK = 0  # 지상 -> 위성
+DOWNLINK = 1  # 위성 -> 지상
+DIRECTION_NAMES = {UPLINK: "uplink", DOWNLINK: "downlink"}
+
+# 재생 기본 목적지 (상향은 지상국 브리지, 하향은 위성 브리지의 UDP 입력)
+REPLAY_PORTS = {UPLINK: 1234, DOWNLINK: 1235}
+
+#########################################################################################
+#
+# 기록
+#
+#########################################################################################
+
+class CaptureWriter:
+    # batch_size 바이트가 모이거나 flush_interval 초가 지나면 한 번에 write
+    def __init__(self, path, batch_size=64 * 1024, flush_interval=0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._buf = bytearray()
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.size = os.fstat(self._fd).st_size  # 아직 write 하지 않은 버퍼까지 포함한 파일 크기
+        if self.size == 0:
+            os.write(self._fd, CAPTURE_MAGIC)
+            self.size = len(CAPTURE_MAGIC)
+        else:
+            with open(path, "rb") as f:
+                if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+                    os.close(self._fd)
+                    raise ValueError(f"{path} is not a capture file")
+
+        self.records = 0
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, args=(flush_interval,), daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    # 패킷 하나 기록 (memoryview 도 가능, 버퍼에 복사되므로 호출 후 재사용해도 됨)
+    # 레코드가 들어갈 파일 위치(offset)를 돌려줌
+    def record(self, direction, packet, timestamp_ns=None):
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        apid = (packet[0] & 0x07) << 8 | packet[1]
+        with self._lock:
+            offset = self.size
+            self._buf += _RECORD.pack(timestamp_ns, direction, apid, len(packet))
+            self._buf += packet
+            self.size += _RECORD.size + len(packet)
+            self.records += 1
+            if len(self._buf) >= self.batch_size:
+                self._flush_locked()
+        return offset
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buf and self._fd is not None:
+            view = memoryview(self._buf)
+            while view:
+                view = view[os.write(self._fd, view):]
+            view.release()
+            self._buf.clear()
+
+    def _flush_periodically(self, interval):
+        while not self._closed.wait(interval):
+            self.flush()
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        with self._lock:
+            self._flush_locked()
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+#########################################################################################
+#
+# 읽기
+#
+#########################################################################################
+
+class CaptureReader:
+    # sequential=False 면 필요한 레코드만 골라 읽는 용도 (색인 조회)
+    def __init__(self, path, sequential=True):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < len(CAPTURE_MAGIC):
+                raise ValueError(f"{path} is not a capture file")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a capture file")
+        if hasattr(self._mmap, "madvise"):
+            self._mmap.madvise(mmap.MADV_SEQUENTIAL if sequential else mmap.MADV_RANDOM)
+        self._view = memoryview(self._mmap)
+
+    # (시각 ns, 방향, APID, 패킷 memoryview) 를 차례로 돌려줌
+    # 마지막 레코드가 잘려 있으면(기록 중 종료) 거기서 멈춤
+    def __iter__(self):
+        view = self._view
+        end = len(view)
+        offset = len(CAPTURE_MAGIC)
+        unpack_from = _RECORD.unpack_from
+        header_size = _RECORD.size
+        while offset + header_size <= end:
+            timestamp_ns, direction, apid, length = unpack_from(view, offset)
+            start = offset + header_size
+            offset = start + length
+            if offset > end:
+                break
+            yield timestamp_ns, direction, apid, view[start:offset]
+
+    # offset 위치의 레코드 하나: (시각 ns, 방향, APID, 패킷 memoryview)
+    def record_at(self, offset):
+        timestamp_ns, direction, apid, length = _RECORD.unpack_from(self._view, offset)
+        start = offset + _RECORD.size
+        if start + length > len(self._view):
+            raise ValueError(f"truncated record at offset {offset}")
+        return timestamp_ns, direction, apid, self._view[start:start + length]
+
+    # (offset, 시각 ns, 방향, APID) 를 차례로 돌려줌 (색인 재생성용)
+    def offsets(self):
+        end = len(self._view)
+        offset = len(CAPTURE_MAGIC)
+        while offset + _RECORD.size <= end:
+            timestamp_ns, direction, apid, length = _RECORD.unpack_from(self._view, offset)
+            if offset + _RECORD.size + length > end:
+                break
+            yield offset, timestamp_ns, direction, apid
+            offset += _RECORD.size + length
+
+    # 방향/APID 별 패킷 수와 기록 구간
+    def summary(self):
+        counts = {}
+        first = last = None
+        total = 0
+        for timestamp_ns, direction, apid, packet in self:
+            key = (DIRECTION_NAMES.get(direction, str(direction)), apid)
+            counts[key] = counts.get(key, 0) + 1
+            if first is None:
+                first = timestamp_ns
+            last = timestamp_ns
+            total += 1
+        duration = (last - first) / 1e9 if total else 0.0
+        return {"records": total, "duration": duration, "packets": counts}
+
+    # 밖에서 잡고 있는 memoryview 가 남아 있으면 mmap 은 GC 때 닫힘
+    def close(self):
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+#########################################################################################
+#
+# 재생
+#
+#########################################################################################
+
+# speed: 1 = 기록된 속도, N = N 배속, 0 = 최대 속도
+# send(direction, packet) 로 보내고, directions 를 주면 그 방향만 재생
+def replay(path, send, speed=1.0, directions=None):
+    sent = 0
+    with CaptureReader(path) as reader:
+        started = None
+        for timestamp_ns, direction, apid, packet in reader:
+            if directions is not None and direction not in directions:
+                continue
+            if speed > 0:
+                if started is None:
+                    started = (time.monotonic(), timestamp_ns)
+                due = started[0] + (timestamp_ns - started[1]) / 1e9 / speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            send(direction, packet)
+            sent += 1
+            packet.release()
+    return sent
+
+# UDP 로 재생: 방향별 포트로 패킷을 그대로 보냄
+def udp_sender(udp_ip="127.0.0.1", ports=REPLAY_PORTS):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(direction, packet):
+        sock.sendto(packet, (udp_ip, ports[direction]))
+
+    return send
+
+# 시뮬레이터(또는 실제) 라디오로 재생: 32바이트 프레임으로 나눠서 write
+def radio_sender(radio, chunk_size=32):
+    def send(direction, packet):
+        for chunk in split_data(packet, chunk_size):
+            if not radio.write(bytes(chunk)):
+                log.warning("replay_send_failed", apid=f"{(packet[0] & 0x07) << 8 | packet[1]:#05x}")
+
+    return send
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="CCSDS packet capture replay")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    info = sub.add_parser("info", help="summarize a capture file")
+    info.add_argument("path")
+
+    play = sub.add_parser("replay", help="send captured packets to the bridges over UDP")
+    play.add_argument("path")
+    play.add_argument("--speed", type=float, default=1.0, help="1 = recorded pace, N = N times faster, 0 = as fast as possible")
+    play.add_argument("--direction", choices=("uplink", "downlink", "both"), default="both")
+    play.add_argument("--udp-ip", default="127.0.0.1")
+    play.add_argument("--uplink-port", type=int, default=REPLAY_PORTS[UPLINK])
+    play.add_argument("--downlink-port", type=int, default=REPLAY_PORTS[DOWNLINK])
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "info":
+        with CaptureReader(args.path) as reader:
+            summary = reader.summary()
+        print(f"{summary['records']} packets over {summary['duration']:.3f} s")
+        for (direction, apid), count in sorted(summary["packets"].items()):
+            print(f"  {direction:8s} APID {apid:#05x}: {count}")
+        return
+
+    setup_logging()
+    directions = None
+    if args.direction != "both":
+        directions = {UPLINK if args.direction == "uplink" else DOWNLINK}
+    ports = {UPLINK: args.uplink_port, DOWNLINK: args.downlink_port}
+    started = time.monotonic()
+    sent = replay(args.path, udp_sender(args.udp_ip, ports), args.speed, directions)
+    print(f"Replayed {sent} packets in {time.monotonic() - started:.3f} s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
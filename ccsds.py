@@ -0,0 +1,471 @@
+import time
+import struct
+import binascii
+from array import array
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # 일괄 분석(decode_headers)에서만 필요
+    np = None
+
+###############################################################
+# CCSDS Space Packet 공용 모듈
+# 지상국(G_S_CSP)과 위성(S_G_CSP) 브리지가 함께 사용
+# 헤더 분석과 스트림 재조립을 한 곳에서 관리
+###############################################################
+
+HEADER_SIZE = 6
+# 전체 패킷 길이 = Packet Length + 6바이트 헤더 + 1바이트 추가
+LENGTH_OFFSET = HEADER_SIZE + 1
+MAX_PACKET_SIZE = 0xFFFF + LENGTH_OFFSET
+# CCSDS 는 Version 000 만 사용하므로, 압축한 패킷(compression.py)은 Version 을 100 으로 표시
+VERSION_COMPRESSED = 0b100
+
+_U16 = struct.Struct(">H")
+_PRIMARY_HEADER = struct.Struct(">HHH")
+
+if np is not None:
+    HEADER_DTYPE = np.dtype([
+        ("version", np.uint8),
+        ("packet_type", np.uint8),
+        ("secondary_header_flag", np.uint8),
+        ("apid", np.uint16),
+        ("sequence_flags", np.uint8),
+        ("sequence_count", np.uint16),
+        ("packet_length", np.uint16),
+    ])
+
+# 헤더 필드 이름 (PrimaryHeader 와 일괄 분석 결과가 같은 이름을 사용)
+HEADER_FIELDS = (
+    "version",
+    "packet_type",
+    "secondary_header_flag",
+    "apid",
+    "sequence_flags",
+    "sequence_count",
+    "packet_length",
+)
+
+# 분석된 CCSDS 프라이머리 헤더 (namedtuple 이므로 인스턴스마다 dict 를 만들지 않음)
+class PrimaryHeader(namedtuple("PrimaryHeader", HEADER_FIELDS)):
+    __slots__ = ()
+
+    # 헤더를 포함한 전체 패킷 길이
+    @property
+    def total_length(self):
+        return self.packet_length + LENGTH_OFFSET
+
+# 미리 컴파일한 Struct 로 세 워드를 한 번에 읽어 헤더 분석
+def decode_primary_header(buffer, offset=0):
+    word0, word1, packet_length = _PRIMARY_HEADER.unpack_from(buffer, offset)
+    return PrimaryHeader(
+        (word0 >> 13) & 0x07,
+        (word0 >> 12) & 0x01,
+        (word0 >> 11) & 0x01,
+        word0 & 0x07FF,
+        (word1 >> 14) & 0x03,
+        word1 & 0x3FFF,
+        packet_length,
+    )
+
+# Packet Length 만 읽는 빠른 경로 (헤더 전체를 분석하지 않음)
+def packet_total_length(buffer, offset=0):
+    return _U16.unpack_from(buffer, offset + 4)[0] + LENGTH_OFFSET
+
+# CCSDS 패킷 헤더 분석 (기존 dict 형식 호환용)
+def parse_primary_header(header):
+    header = decode_primary_header(header)
+    return {
+        "Version Number": header.version,
+        "Packet Type": header.packet_type,
+        "Secondary Header Flag": header.secondary_header_flag,
+        "APID": header.apid,
+        "Sequence Flags": header.sequence_flags,
+        "Packet Sequence Count": header.sequence_count,
+        "Packet Length": header.packet_length
+    }
+
+#########################################################################################
+#
+# 일괄(batch) 헤더 분석
+# 캡처/아카이브 버퍼처럼 패킷이 연속으로 붙어 있는 경우 NumPy 로 한 번에 분석
+#
+#########################################################################################
+
+# 버퍼 안의 완전한 패킷 시작 위치 목록
+# 길이 필드가 다음 위치를 결정하므로 순차적으로 따라가되, 길이만 읽는 빠른 경로를 사용
+def packet_offsets(buffer, start=0, end=None):
+    if np is None:
+        raise ImportError("packet_offsets requires numpy")
+    if end is None:
+        end = len(buffer)
+    offsets = []
+    unpack_from = _U16.unpack_from
+    offset = start
+    while offset + HEADER_SIZE <= end:
+        next_offset = offset + unpack_from(buffer, offset + 4)[0] + LENGTH_OFFSET
+        if next_offset > end:
+            break
+        offsets.append(offset)
+        offset = next_offset
+    return np.array(offsets, dtype=np.int64)
+
+# 주어진 위치들의 헤더를 벡터 연산으로 분석
+# HEADER_FIELDS 이름을 가진 구조화 배열(structured array)을 돌려줌
+def decode_headers(buffer, offsets=None):
+    if np is None:
+        raise ImportError("decode_headers requires numpy")
+    if offsets is None:
+        offsets = packet_offsets(buffer)
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    raw = data[offsets[:, None] + np.arange(HEADER_SIZE)].astype(np.uint16)
+    word0 = (raw[:, 0] << 8) | raw[:, 1]
+    word1 = (raw[:, 2] << 8) | raw[:, 3]
+
+    headers = np.empty(len(offsets), dtype=HEADER_DTYPE)
+    headers["version"] = (word0 >> 13) & 0x07
+    headers["packet_type"] = (word0 >> 12) & 0x01
+    headers["secondary_header_flag"] = (word0 >> 11) & 0x01
+    headers["apid"] = word0 & 0x07FF
+    headers["sequence_flags"] = (word1 >> 14) & 0x03
+    headers["sequence_count"] = word1 & 0x3FFF
+    headers["packet_length"] = (raw[:, 4] << 8) | raw[:, 5]
+    return headers
+
+#########################################################################################
+#
+# 헤더 검증 및 재동기화
+# 깨진 헤더의 Packet Length 를 그대로 믿으면 오지 않을 데이터를 최대 65 KB 까지 기다리게 됨
+# 헤더가 그럴듯한지(version 0, 알려진 APID, 길이 범위) 확인하고, 아니면 다음 후보 위치를 찾음
+#
+#########################################################################################
+
+APID_COUNT = 0x800  # 11비트 APID
+RESYNC_SCAN_BLOCK = 4096  # 한 번에 벡터 검사할 바이트 수 (후보가 앞쪽에 있으면 일찍 끝남)
+_VECTOR_SCAN_MIN = 64  # 이보다 짧은 구간은 NumPy 호출 비용이 더 큼
+
+class HeaderValidator:
+    # apids: 허용할 APID 목록 (None 이면 모두 허용)
+    # min_length/max_length: 헤더 포함 전체 패킷 길이 범위
+    # crc: 패킷 끝 2바이트가 CRC-16-CCITT (Packet Error Control) 인지
+    # allow_compressed: Version 이 VERSION_COMPRESSED 인 압축 패킷도 허용
+    def __init__(self, apids=None, min_length=LENGTH_OFFSET, max_length=MAX_PACKET_SIZE, crc=False, allow_compressed=False):
+        if not LENGTH_OFFSET <= min_length <= max_length <= MAX_PACKET_SIZE:
+            raise ValueError(f"length bounds must satisfy {LENGTH_OFFSET} <= min_length <= max_length <= {MAX_PACKET_SIZE}")
+        if crc and min_length < LENGTH_OFFSET + 2:
+            min_length = LENGTH_OFFSET + 2
+        self.min_length = min_length
+        self.max_length = max_length
+        self.crc = crc
+        self._version_mask = 0x60 if allow_compressed else 0xE0  # 0 이어야 하는 Version 비트
+        # Packet Length 필드 값의 범위
+        self._min_field = min_length - LENGTH_OFFSET
+        self._max_field = max_length - LENGTH_OFFSET
+
+        # APID -> 허용 여부 (2048 칸 조회표)
+        self._apid_table = None
+        self._apid_mask = None
+        if apids is not None:
+            self._apid_table = bytearray(APID_COUNT)
+            for apid in apids:
+                self._apid_table[apid & 0x07FF] = 1
+            if np is not None:
+                self._apid_mask = np.frombuffer(bytes(self._apid_table), dtype=np.bool_)
+
+    # offset 위치의 6바이트가 그럴듯한 프라이머리 헤더인지
+    def is_valid(self, buffer, offset=0):
+        first = buffer[offset]
+        if first & self._version_mask:
+            return False  # version != 0
+        if self._apid_table is not None and not self._apid_table[(first & 0x07) << 8 | buffer[offset + 1]]:
+            return False
+        length = buffer[offset + 4] << 8 | buffer[offset + 5]
+        return self._min_field <= length <= self._max_field
+
+    # 완성된 패킷의 CRC 확인 (crc=False 면 항상 통과)
+    def check_crc(self, packet):
+        if not self.crc:
+            return True
+        return binascii.crc_hqx(packet[:-2], 0xFFFF) == (packet[-2] << 8 | packet[-1])
+
+    # [start, end) 안에서 헤더 6바이트가 모두 들어 있는 첫 유효 위치, 없으면 -1
+    # 버퍼를 복사하지 않고 NumPy view 로 블록 단위 검사
+    def find_header(self, buffer, start=0, end=None):
+        if end is None:
+            end = len(buffer)
+        last = end - HEADER_SIZE  # 검사할 수 있는 마지막 시작 위치
+        if np is None or last - start < _VECTOR_SCAN_MIN:
+            for offset in range(start, last + 1):
+                if self.is_valid(buffer, offset):
+                    return offset
+            return -1
+
+        data = np.frombuffer(buffer, dtype=np.uint8)
+        block_start = start
+        while block_start <= last:
+            block_end = min(block_start + RESYNC_SCAN_BLOCK, last + 1)
+            window = data[block_start:block_end + HEADER_SIZE - 1]
+            count = block_end - block_start
+            first = window[:count]
+            mask = (first & self._version_mask) == 0
+            if self._apid_mask is not None:
+                apid = (first & 0x07).astype(np.uint16) << 8 | window[1:count + 1]
+                mask &= self._apid_mask[apid]
+            length = window[4:count + 4].astype(np.uint16) << 8 | window[5:count + 5]
+            mask &= (length >= self._min_field) & (length <= self._max_field)
+            hit = int(mask.argmax())
+            if mask[hit]:
+                return block_start + hit
+            block_start = block_end
+        return -1
+
+# 데이터그램을 CCSDS 패킷 단위로 파싱
+def parse_and_split_data(data):
+    packets = []
+    data_index = 0
+
+    while data_index < len(data):
+        if data_index + 6 <= len(data):
+            packet_length = packet_total_length(data, data_index)  # 6바이트 헤더 + 1바이트 추가 (추가 필요 시 조정)
+
+            if data_index + packet_length <= len(data):
+                packet = data[data_index:data_index + packet_length]
+                packets.append(packet)
+                data_index += packet_length
+            else:
+                break
+        else:
+            break
+
+    return packets
+
+# CCSDS 패킷 분해
+# 32 바이트씩 쪼개서 데이터 저장 (memoryview 입력이면 복사 없이 view 로 분할)
+def split_data(data, chunk_size=32):
+    chunks = []
+    for i in range(0, len(data), chunk_size):
+        chunk = data[i:i + chunk_size]
+        chunks.append(chunk)
+    return chunks
+
+#########################################################################################
+#
+# 스트림 재조립기
+# 미리 할당한 bytearray 에 조각(chunk)을 쌓고, 완성된 패킷을 memoryview 로 돌려준다.
+# 버퍼 끝에 도달하면 남은 데이터만 앞으로 옮기므로(compaction) 복사량은 패킷당 상수.
+# validator 를 주면 깨진 헤더를 만났을 때 다음 유효 헤더까지 건너뛰고(재동기화),
+# stall_timeout 초 동안 완성되지 않은 패킷은 가짜 헤더로 보고 그 다음부터 다시 찾는다.
+# 따라서 복구에 필요한 데이터는 최대 max_length 바이트 또는 stall_timeout 초로 제한된다.
+#
+#########################################################################################
+
+class PacketReassembler:
+    def __init__(self, capacity=2 * MAX_PACKET_SIZE, validator=None, stall_timeout=None):
+        if capacity < MAX_PACKET_SIZE:
+            raise ValueError(f"capacity must be at least {MAX_PACKET_SIZE} bytes")
+        if validator is None and stall_timeout is not None:
+            validator = HeaderValidator()
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._head = 0  # 아직 처리하지 않은 데이터의 시작 위치
+        self._tail = 0  # 다음 데이터를 쓸 위치
+        self.validator = validator
+        self.stall_timeout = stall_timeout
+        self._partial_since = None  # 미완성 패킷을 기다리기 시작한 시각
+        self._recovery_start = None  # 재동기화 중이면 시작 시각
+        self._recovery_bytes = 0
+
+        # 재동기화 통계
+        self.resyncs = 0  # 깨진 헤더를 만난 횟수
+        self.discarded_bytes = 0  # 재동기화로 버린 바이트 수
+        self.last_recovery_bytes = 0  # 마지막 복구에서 버린 바이트 수
+        self.last_recovery_time = 0.0  # 마지막 복구에 걸린 시간 (초)
+        self.max_recovery_bytes = 0
+
+    # 재조립 대기 중인 바이트 수
+    @property
+    def pending(self):
+        return self._tail - self._head
+
+    # 대기 중인 데이터를 모두 버림
+    def reset(self):
+        self._head = 0
+        self._tail = 0
+        self._partial_since = None
+
+    # 조각을 넣고 완성된 패킷을 하나씩 돌려줌
+    # 돌려준 memoryview 는 다음 반복(또는 다음 feed 호출) 전까지만 유효하다.
+    # 큐에 넣는 등 보관이 필요하면 bytes(packet) 으로 복사할 것.
+    def feed(self, data):
+        data = memoryview(data).cast("B")
+        if self._partial_since is not None and self.stall_timeout is not None:
+            if time.monotonic() - self._partial_since > self.stall_timeout:
+                # 오래 완성되지 않은 패킷의 헤더는 가짜로 보고 바로 뒤부터 다시 찾음
+                self._resync(self._head + 1)
+        while data:
+            written = self._write(data)
+            data = data[written:]
+            yield from self._drain()
+
+    # 남은 공간에 최대한 복사, 공간이 모자라면 먼저 앞으로 당김
+    def _write(self, data):
+        capacity = len(self._buf)
+        if self._tail + len(data) > capacity and self._head > 0:
+            remaining = self._tail - self._head
+            self._view[:remaining] = self._view[self._head:self._tail]
+            self._head = 0
+            self._tail = remaining
+        written = min(len(data), capacity - self._tail)
+        self._view[self._tail:self._tail + written] = data[:written]
+        self._tail += written
+        return written
+
+    # 헤더의 Packet Length 로 완성된 패킷을 잘라냄
+    def _drain(self):
+        validator = self.validator
+        while self._tail - self._head >= HEADER_SIZE:
+            start = self._head
+            if validator is not None and not validator.is_valid(self._buf, start):
+                self._resync(start + 1)
+                continue
+            total_length = _U16.unpack_from(self._buf, start + 4)[0] + LENGTH_OFFSET
+            if self._tail - start < total_length:
+                if self._partial_since is None and self.stall_timeout is not None:
+                    self._partial_since = time.monotonic()
+                break
+            if validator is not None and not validator.check_crc(self._view[start:start + total_length]):
+                self._resync(start + 1)
+                continue
+            self._head = start + total_length
+            self._partial_since = None
+            if self._recovery_start is not None:
+                self._finish_recovery()
+            yield self._view[start:self._head]
+        if self._head == self._tail:
+            self._head = 0
+            self._tail = 0
+
+    # from_offset 이후의 다음 유효 헤더로 이동, 찾지 못하면 헤더가 걸쳐 있을 수 있는 끝부분만 남김
+    def _resync(self, from_offset):
+        if self._recovery_start is None:
+            self._recovery_start = time.monotonic()
+            self._recovery_bytes = 0
+            self.resyncs += 1
+        found = self.validator.find_header(self._buf, from_offset, self._tail)
+        if found < 0:
+            found = max(from_offset, self._tail - HEADER_SIZE + 1)
+        skipped = found - self._head
+        self._recovery_bytes += skipped
+        self.discarded_bytes += skipped
+        self._head = found
+        self._partial_since = None
+
+    def _finish_recovery(self):
+        self.last_recovery_bytes = self._recovery_bytes
+        self.last_recovery_time = time.monotonic() - self._recovery_start
+        self.max_recovery_bytes = max(self.max_recovery_bytes, self._recovery_bytes)
+        self._recovery_start = None
+
+#########################################################################################
+#
+# APID 별 Packet Sequence Count 추적
+# 14비트 카운터가 APID 마다 1씩 늘어나므로 직전 값과의 차이로 손실/중복/순서 바뀜을 판단
+#  - 차이 1                 : 정상
+#  - 차이 0                 : 중복
+#  - 차이 2 ~ max_gap       : 그 사이 패킷 손실 (차이 - 1 개)
+#  - 뒤로 reorder_window 이내 : 늦게 도착한 패킷 (앞에서 손실로 센 것을 하나 되돌림)
+#  - 그 밖                  : 송신측 재시작으로 보고 새로 시작
+# idle 패킷(APID 0x7FF)의 카운터는 의미가 없으므로 추적하지 않음
+#
+#########################################################################################
+
+SEQUENCE_MODULO = 0x4000  # 14비트 Packet Sequence Count
+IDLE_APID = 0x7FF
+
+SEQ_OK = 0
+SEQ_FIRST = 1  # 해당 APID 의 첫 패킷
+SEQ_GAP = 2
+SEQ_DUPLICATE = 3
+SEQ_REORDERED = 4
+SEQ_RESTART = 5
+SEQUENCE_RESULT_NAMES = ("ok", "first", "gap", "duplicate", "reordered", "restart")
+
+class SequenceTracker:
+    def __init__(self, reorder_window=64, max_gap=SEQUENCE_MODULO // 2):
+        self.reorder_window = reorder_window
+        self.max_gap = max_gap
+        # APID 별 값 (2048 칸 배열, -1 = 아직 받은 적 없음)
+        self._last = array("h", [-1]) * APID_COUNT
+        self.received = array("Q", [0]) * APID_COUNT
+        self.lost = array("Q", [0]) * APID_COUNT
+        self.duplicates = array("Q", [0]) * APID_COUNT
+        self.reordered = array("Q", [0]) * APID_COUNT
+        self.restarts = array("Q", [0]) * APID_COUNT
+        self.last_gap = 0  # 마지막 SEQ_GAP 에서 빠진 패킷 수
+
+    # 패킷 하나의 카운터를 확인하고 결과(SEQ_*)를 돌려줌
+    def observe(self, packet):
+        apid = (packet[0] & 0x07) << 8 | packet[1]
+        if apid == IDLE_APID:
+            return SEQ_OK
+        count = (packet[2] & 0x3F) << 8 | packet[3]
+        last = self._last[apid]
+        self.received[apid] += 1
+        if last < 0:
+            self._last[apid] = count
+            return SEQ_FIRST
+        delta = (count - last) & (SEQUENCE_MODULO - 1)
+        if delta == 1:
+            self._last[apid] = count
+            return SEQ_OK
+        if delta == 0:
+            self.duplicates[apid] += 1
+            return SEQ_DUPLICATE
+        if delta <= self.max_gap:
+            self._last[apid] = count
+            self.last_gap = delta - 1
+            self.lost[apid] += delta - 1
+            return SEQ_GAP
+        if SEQUENCE_MODULO - delta <= self.reorder_window:
+            self.reordered[apid] += 1
+            if self.lost[apid]:
+                self.lost[apid] -= 1
+            return SEQ_REORDERED
+        self._last[apid] = count
+        self.restarts[apid] += 1
+        return SEQ_RESTART
+
+    # 다음 패킷의 기대 카운터 (받은 적 없으면 None)
+    def expected(self, apid):
+        last = self._last[apid]
+        return None if last < 0 else (last + 1) & (SEQUENCE_MODULO - 1)
+
+    # 손실률 = 손실 / (중복을 뺀 수신 + 손실)
+    def loss_rate(self, apid):
+        lost = self.lost[apid]
+        total = self.received[apid] - self.duplicates[apid] + lost
+        return lost / total if total else 0.0
+
+    # 받은 적 있는 APID 목록
+    def apids(self):
+        return [apid for apid in range(APID_COUNT) if self._last[apid] >= 0]
+
+    # APID -> 통계
+    def stats(self):
+        return {
+            apid: {
+                "received": self.received[apid],
+                "lost": self.lost[apid],
+                "duplicates": self.duplicates[apid],
+                "reordered": self.reordered[apid],
+                "restarts": self.restarts[apid],
+                "loss_rate": self.loss_rate(apid),
+            }
+            for apid in self.apids()
+        }
+
+    # 기준 카운터를 지움 (링크 재설정 후 등), 누적 통계는 유지
+    def reset(self):
+        self._last = array("h", [-1]) * APID_COUNT
@@ -0,0 +1,263 @@
+import os
+import zlib
+import argparse
+from collections import Counter
+from ccsds import HEADER_SIZE, LENGTH_OFFSET, APID_COUNT, VERSION_COMPRESSED
+from capture import CaptureReader
+from eventlog import get_logger
+
+###############################################################
+# APID 별 패킷 압축
+# split_data 로 나누기 전에 데이터 필드를 APID 별 사전(preset dictionary)으로 deflate 압축하고,
+# 재조립한 뒤 원래 패킷으로 복원해서 무선 프레임 수(= ACK 왕복 수)를 줄임
+#
+# 압축 패킷: [헤더 6바이트] [사전 번호 (u8)] [raw deflate 데이터]
+#  - 헤더의 Version 을 VERSION_COMPRESSED(0b100) 로 바꾸고 Packet Length 를 압축 후 길이로 고침
+#    (APID, 순번은 그대로이므로 아두이노 펌웨어는 길이만 보고 그대로 전달)
+#  - 사전 번호 0 은 사전 없이 압축, 그 외는 사전 내용의 CRC32 로 만든 번호 (양쪽 사전이 다르면 복원 실패)
+# 프레임 수가 줄지 않으면 원래 패킷을 그대로 보냄
+# 계속 줄지 않는 APID 는 retry_every 번에 한 번만 압축을 시도해서 CPU 사용을 제한
+###############################################################
+
+log = get_logger("compression")
+
+DICTIONARY_SIZE = 4096  # 학습 사전 최대 크기
+# 사전과 패킷이 들어가는 8KB 창, 작은 내부 상태로 패킷마다 하는 copy() 비용을 줄임
+# (raw deflate 이므로 복원 쪽은 창 크기와 상관없이 -15 로 풀 수 있음)
+WINDOW_BITS = 13
+MEM_LEVEL = 5
+DICTIONARY_SUFFIX = ".dict"
+FRAME_SIZE = 32
+
+# 사전 내용으로 만든 1바이트 번호 (0 은 사전 없음)
+def dictionary_id(dictionary):
+    return zlib.crc32(dictionary) % 255 + 1
+
+# 압축된 패킷인지
+def is_compressed(packet):
+    return packet[0] >> 5 == VERSION_COMPRESSED
+
+#########################################################################################
+#
+# 사전 학습 / 저장
+#
+#########################################################################################
+
+# 같은 APID 패킷들의 데이터 필드로 사전 생성
+# deflate 는 가까운(사전 끝쪽) 내용을 더 짧게 참조하므로 자주 나온 내용일수록 뒤에 둠
+def train_dictionary(samples, size=DICTIONARY_SIZE):
+    counts = Counter(bytes(sample[HEADER_SIZE:]) for sample in samples)
+    dictionary = bytearray()
+    for body, _ in reversed(counts.most_common()):
+        dictionary += body
+    return bytes(dictionary[-size:])
+
+# 캡처 파일의 패킷으로 APID 별 사전 생성: {APID: 사전}
+def train_from_capture(paths, apids=None, size=DICTIONARY_SIZE, max_samples=1000):
+    samples = {}
+    for path in paths:
+        with CaptureReader(path) as reader:
+            for _, _, apid, packet in reader:
+                if (apids is None or apid in apids) and not is_compressed(packet):
+                    samples.setdefault(apid, []).append(bytes(packet))
+                packet.release()
+    return {apid: train_dictionary(packets[-max_samples:], size) for apid, packets in samples.items()}
+
+# 사전 디렉터리: APID 마다 "0x081.dict" 파일 하나
+def save_dictionaries(directory, dictionaries):
+    os.makedirs(directory, exist_ok=True)
+    for apid, dictionary in dictionaries.items():
+        with open(os.path.join(directory, f"{apid:#05x}{DICTIONARY_SUFFIX}"), "wb") as f:
+            f.write(dictionary)
+
+def load_dictionaries(directory):
+    dictionaries = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(DICTIONARY_SUFFIX):
+            with open(os.path.join(directory, name), "rb") as f:
+                dictionaries[int(name[:-len(DICTIONARY_SUFFIX)], 0)] = f.read()
+    return dictionaries
+
+#########################################################################################
+#
+# 압축 / 복원
+#
+#########################################################################################
+
+class PacketCompressor:
+    # apids: 압축할 APID 목록, dictionaries: {APID: 사전} (사전이 없는 APID 는 사전 없이 압축)
+    # 압축해도 프레임 수가 줄지 않는 일이 miss_limit 번 연속이면 그 APID 는 retry_every 번에 한 번만 시도
+    def __init__(self, apids, dictionaries=None, level=6, frame_size=FRAME_SIZE, miss_limit=8, retry_every=16):
+        dictionaries = dictionaries or {}
+        self.frame_size = frame_size
+        self.miss_limit = miss_limit
+        self.retry_every = retry_every
+
+        # APID -> (사전 번호, 사전을 미리 읽어 둔 compressobj), 매번 copy() 해서 사용
+        self._table = [None] * APID_COUNT
+        for apid in apids:
+            if isinstance(apid, str):
+                apid = int(apid, 0)
+            dictionary = dictionaries.get(apid)
+            if dictionary:
+                primed = zlib.compressobj(level, zlib.DEFLATED, -WINDOW_BITS, MEM_LEVEL, zlib.Z_DEFAULT_STRATEGY, dictionary)
+                self._table[apid] = (dictionary_id(dictionary), primed)
+            else:
+                self._table[apid] = (0, zlib.compressobj(level, zlib.DEFLATED, -WINDOW_BITS, MEM_LEVEL))
+        self._misses = bytearray(APID_COUNT)  # 연속으로 줄지 않은 횟수 (miss_limit 까지)
+        self._skipped = bytearray(APID_COUNT)
+
+        self.compressed = 0
+        self.not_smaller = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    # 압축한 패킷 또는 (대상이 아니거나 프레임이 줄지 않으면) 원래 패킷
+    def compress(self, packet):
+        apid = (packet[0] & 0x07) << 8 | packet[1]
+        entry = self._table[apid]
+        frame_size = self.frame_size
+        frames = -(-len(packet) // frame_size)
+        # 한 프레임에 들어가는 패킷은 더 줄일 수 없음
+        if entry is None or frames <= 1 or packet[0] >> 5 != 0:
+            return packet
+        if self._misses[apid] >= self.miss_limit:
+            self._skipped[apid] += 1
+            if self._skipped[apid] < self.retry_every:
+                self.skipped += 1
+                return packet
+            self._skipped[apid] = 0
+
+        number, primed = entry
+        compressor = primed.copy()
+        body = compressor.compress(packet[HEADER_SIZE:]) + compressor.flush()
+        length = HEADER_SIZE + 1 + len(body)
+        if -(-length // frame_size) >= frames:
+            if self._misses[apid] < self.miss_limit:
+                self._misses[apid] += 1
+            self.not_smaller += 1
+            return packet
+        self._misses[apid] = 0
+
+        out = bytearray(length)
+        out[0] = packet[0] & 0x1F | VERSION_COMPRESSED << 5
+        out[1:4] = packet[1:4]
+        out[4] = (length - LENGTH_OFFSET) >> 8
+        out[5] = (length - LENGTH_OFFSET) & 0xFF
+        out[HEADER_SIZE] = number
+        out[HEADER_SIZE + 1:] = body
+        self.compressed += 1
+        self.bytes_in += len(packet)
+        self.bytes_out += length
+        return out
+
+    # 압축한 패킷의 평균 크기 비율 (압축 후 / 압축 전)
+    def ratio(self):
+        return self.bytes_out / self.bytes_in if self.bytes_in else 1.0
+
+class PacketDecompressor:
+    # dictionaries: {APID: 사전}, 상대편 PacketCompressor 와 같아야 함
+    def __init__(self, dictionaries=None, max_length=0xFFFF + LENGTH_OFFSET):
+        self.max_length = max_length
+        self._primed = {0: zlib.decompressobj(-15)}  # 사전 번호 -> decompressobj
+        self._apids = {}  # APID -> 사전 번호
+        for apid, dictionary in (dictionaries or {}).items():
+            if isinstance(apid, str):
+                apid = int(apid, 0)
+            number = dictionary_id(dictionary)
+            self._apids[apid] = number
+            self._primed[(apid, number)] = zlib.decompressobj(-15, dictionary)
+
+        self.decompressed = 0
+        self.failed = 0
+
+    # 원래 패킷 (압축되지 않은 패킷은 그대로), 복원할 수 없으면 ValueError
+    def decompress(self, packet):
+        if packet[0] >> 5 != VERSION_COMPRESSED:
+            return packet
+        apid = (packet[0] & 0x07) << 8 | packet[1]
+        number = packet[HEADER_SIZE]
+        primed = self._primed.get(0 if number == 0 else (apid, number))
+        if primed is None:
+            self.failed += 1
+            known = self._apids.get(apid)
+            raise ValueError(f"unknown dictionary {number} for APID {apid:#05x} (local: {known})")
+        decompressor = primed.copy()
+        try:
+            body = decompressor.decompress(packet[HEADER_SIZE + 1:], self.max_length - HEADER_SIZE)
+        except zlib.error as e:
+            self.failed += 1
+            raise ValueError(f"corrupt compressed packet for APID {apid:#05x}: {e}") from None
+        if not decompressor.eof or decompressor.unconsumed_tail:
+            self.failed += 1
+            raise ValueError(f"truncated compressed packet for APID {apid:#05x}")
+
+        length = HEADER_SIZE + len(body)
+        out = bytearray(length)
+        out[0] = packet[0] & 0x1F
+        out[1:4] = packet[1:4]
+        out[4] = (length - LENGTH_OFFSET) >> 8
+        out[5] = (length - LENGTH_OFFSET) & 0xFF
+        out[HEADER_SIZE:] = body
+        self.decompressed += 1
+        return out
+
+# 브리지 설정으로 (압축기, 복원기) 생성
+# 사전 디렉터리가 없으면 사전 없이 압축
+def create_codec(apids, dictionary_dir=None):
+    dictionaries = load_dictionaries(dictionary_dir) if dictionary_dir is not None else {}
+    log.info("compression_enabled", apids=len(apids), dictionaries=len(dictionaries))
+    return PacketCompressor(apids, dictionaries), PacketDecompressor(dictionaries)
+
+#########################################################################################
+#
+# 명령줄
+#
+#########################################################################################
+
+def _apid(text):
+    apid = int(text, 0)
+    if not 0 <= apid < APID_COUNT:
+        raise argparse.ArgumentTypeError(f"APID out of range: {text}")
+    return apid
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Per-APID packet compression dictionaries")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train = sub.add_parser("train", help="build per-APID dictionaries from capture files")
+    train.add_argument("captures", nargs="+")
+    train.add_argument("--output", required=True, help="dictionary directory")
+    train.add_argument("--apid", type=_apid, action="append", help="only train this APID (repeatable)")
+    train.add_argument("--size", type=int, default=DICTIONARY_SIZE, help="maximum dictionary size in bytes")
+
+    check = sub.add_parser("check", help="report compression ratios for a capture file")
+    check.add_argument("capture")
+    check.add_argument("--dictionaries", help="dictionary directory (default: no dictionaries)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "train":
+        dictionaries = train_from_capture(args.captures, set(args.apid) if args.apid else None, args.size)
+        save_dictionaries(args.output, dictionaries)
+        for apid, dictionary in sorted(dictionaries.items()):
+            print(f"APID {apid:#05x}: {len(dictionary)} bytes (id {dictionary_id(dictionary)})")
+        return
+
+    dictionaries = load_dictionaries(args.dictionaries) if args.dictionaries else {}
+    frames = {}  # APID -> [패킷 수, 원래 프레임 수, 압축 후 프레임 수]
+    with CaptureReader(args.capture) as reader:
+        packets = [(apid, bytes(packet)) for _, _, apid, packet in reader]
+    compressor = PacketCompressor({apid for apid, _ in packets}, dictionaries, miss_limit=len(packets) + 1)
+    for apid, packet in packets:
+        counts = frames.setdefault(apid, [0, 0, 0])
+        counts[0] += 1
+        counts[1] += -(-len(packet) // FRAME_SIZE)
+        counts[2] += -(-len(compressor.compress(packet)) // FRAME_SIZE)
+    for apid, (count, before, after) in sorted(frames.items()):
+        print(f"APID {apid:#05x}: {count} packets, {before} -> {after} frames ({after / before:.1%})")
+
+if __name__ == "__main__":
+    main()
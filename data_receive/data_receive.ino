@@ -6,6 +6,9 @@
 #define BAUD_RATE 230400
 #define PAYLOAD_SIZE 32
 
+// 시리얼 프레이밍: 1 이면 패킷마다 COBS 로 인코딩하고 0x00 구분자를 붙여 출력 (framing.py 의 CobsDecoder 로 복원)
+#define SERIAL_FRAMING_COBS 0
+
 #define CE_PIN 7
 #define CSN_PIN 8
 
@@ -13,6 +16,29 @@ RF24 radio(CE_PIN, CSN_PIN);
 
 uint8_t address[][6] = { "1Node", "2Node" };
 
+// 링크 적응 (radio_link.py 의 LinkTuner 와 같은 단계표/제어 프레임)
+// 제어 프레임 : ['L'] [1=PROPOSE 2=CONFIRM] [단계 번호] [epoch], pipe 2 ("CNode") 로 수신
+// PROPOSE 를 받으면 바로 그 단계로 바꾸고, CONFIRM_TIMEOUT 안에 CONFIRM 이 없으면 이전 단계로 되돌림
+// RENDEZVOUS_TIMEOUT 동안 아무것도 받지 못하면 시작 단계로 돌아감 (송신 측도 같은 규칙)
+#define LINK_CONTROL_PIPE 2
+#define LINK_CONTROL_MARKER 0x4C
+#define LINK_PROPOSE 1
+#define LINK_CONFIRM 2
+#define LINK_DEFAULT_PROFILE 2
+#define CONFIRM_TIMEOUT 500UL
+#define RENDEZVOUS_TIMEOUT 5000UL
+
+const rf24_datarate_e linkDataRates[] = { RF24_250KBPS, RF24_1MBPS, RF24_1MBPS, RF24_2MBPS };
+const rf24_pa_dbm_e linkPaLevels[] = { RF24_PA_MAX, RF24_PA_MAX, RF24_PA_LOW, RF24_PA_MAX };
+#define LINK_PROFILE_COUNT 4
+
+uint8_t controlAddress[6] = "CNode";
+uint8_t linkLevel = LINK_DEFAULT_PROFILE;
+bool linkPending = false;
+uint8_t pendingLevel, pendingEpoch, previousLevel;
+unsigned long pendingSince = 0;
+unsigned long lastReceived = 0;
+
 struct ParsedHeader {
   uint8_t versionNumber;
   uint8_t packetType;
@@ -50,10 +76,80 @@ void setup() {
   }
   radio.setPALevel(RF24_PA_LOW);
   radio.setPayloadSize(PAYLOAD_SIZE);
+  radio.enableDynamicPayloads();  // 송신 측이 보낸 길이 그대로 받음 (부분 프레임 뒤에 0x00 패딩이 없음)
   radio.openReadingPipe(1, address[0]);
   radio.setChannel(100);
   radio.startListening();
   radio.setDataRate(RF24_1MBPS);
+  radio.openReadingPipe(LINK_CONTROL_PIPE, controlAddress);
+  lastReceived = millis();
+#if SERIAL_FRAMING_COBS
+  Serial.write((byte)0x00);  // 시작 전에 출력된 문자열을 호스트가 한 프레임으로 버리도록 구분자를 보냄
+#endif
+}
+
+// 패킷을 시리얼로 출력, SERIAL_FRAMING_COBS 면 254 바이트 블록 단위로 COBS 인코딩
+void writePacket(byte* packet, int length) {
+#if SERIAL_FRAMING_COBS
+  byte block[0xFF];
+  int blockLength = 1;
+  for (int i = 0; i < length; i++) {
+    if (packet[i] == 0x00) {
+      block[0] = blockLength;
+      Serial.write(block, blockLength);
+      blockLength = 1;
+    } else {
+      block[blockLength++] = packet[i];
+      if (blockLength == 0xFF) {
+        block[0] = 0xFF;
+        Serial.write(block, blockLength);
+        blockLength = 1;
+      }
+    }
+  }
+  block[0] = blockLength;
+  Serial.write(block, blockLength);
+  Serial.write((byte)0x00);
+#else
+  Serial.write(packet, length);
+#endif
+}
+
+void applyLinkLevel(uint8_t level) {
+  radio.setDataRate(linkDataRates[level]);
+  radio.setPALevel(linkPaLevels[level]);
+  linkLevel = level;
+}
+
+void handleLinkControl(byte* frame) {
+  if (frame[0] != LINK_CONTROL_MARKER || frame[2] >= LINK_PROFILE_COUNT) {
+    return;
+  }
+  if (frame[1] == LINK_PROPOSE) {
+    if (linkPending && pendingEpoch == frame[3]) {
+      return;  // 같은 PROPOSE 의 재전송
+    }
+    if (!linkPending) {
+      previousLevel = linkLevel;
+    }
+    linkPending = true;
+    pendingLevel = frame[2];
+    pendingEpoch = frame[3];
+    pendingSince = millis();
+    applyLinkLevel(pendingLevel);
+  } else if (frame[1] == LINK_CONFIRM && linkPending && pendingLevel == frame[2] && pendingEpoch == frame[3]) {
+    linkPending = false;
+  }
+}
+
+void pollLink() {
+  unsigned long now = millis();
+  if (linkPending && now - pendingSince >= CONFIRM_TIMEOUT) {
+    linkPending = false;
+    applyLinkLevel(previousLevel);
+  } else if (linkLevel != LINK_DEFAULT_PROFILE && now - lastReceived > RENDEZVOUS_TIMEOUT) {
+    applyLinkLevel(LINK_DEFAULT_PROFILE);
+  }
 }
 
 byte data[1024];  // 최대 데이터 길이 설정, 필요에 따라 조정 가능
@@ -62,56 +158,60 @@ int totalLength = 0;
 bool headerParsed = false;
 
 void loop() {
-  if (radio.available()) {
+  uint8_t pipe;
+  if (!radio.available(&pipe)) {
+    pollLink();
+  } else {
+    uint8_t length = radio.getDynamicPayloadSize();
+    if (length == 0) {
+      return;  // 길이가 깨진 프레임 (라이브러리가 RX FIFO 를 비움)
+    }
     byte payload[PAYLOAD_SIZE];
-    radio.read(payload, PAYLOAD_SIZE); // 32바이트씩 데이터 읽기
+    radio.read(payload, length);
+    lastReceived = millis();
+    if (pipe == LINK_CONTROL_PIPE) {
+      handleLinkControl(payload);
+      return;
+    }
 
     // 수신한 데이터를 전체 데이터 버퍼에 복사
-    for (int i = 0; i < PAYLOAD_SIZE; i++) {
+    for (int i = 0; i < length; i++) {
       if (dataIndex < sizeof(data)) {
         data[dataIndex++] = payload[i];
       }
     }
 
-    // 헤더가 파싱되지 않았으면 헤더를 파싱
-    if (!headerParsed && dataIndex >= HEADER_SIZE) {
-      ParsedHeader header = parsePrimaryHeader(data);
-      /*
-      Serial.print("Version Number: "); Serial.println(header.versionNumber);
-      Serial.print("Packet Type: "); Serial.println(header.packetType);
-      Serial.print("Secondary Header Flag: "); Serial.println(header.secondaryHeaderFlag);
-      Serial.print("APID: "); Serial.println(header.apid);
-      Serial.print("Sequence Flags: "); Serial.println(header.sequenceFlags);
-      Serial.print("Packet Sequence Count: "); Serial.println(header.packetSequenceCount);
-      Serial.print("Packet Length: "); Serial.println(header.packetLength);
-      */
-      totalLength = HEADER_SIZE + header.packetLength + 1; // 전체 패킷 길이 계산
-      headerParsed = true;
-    }
+    // 완성된 패킷을 모두 시리얼로 출력 (송신 측이 모아 보내면 한 프레임에 여러 패킷과 다음 패킷의 앞부분이 있음)
+    while (true) {
+      // 헤더가 파싱되지 않았으면 헤더를 파싱
+      if (!headerParsed && dataIndex >= HEADER_SIZE) {
+        ParsedHeader header = parsePrimaryHeader(data);
+        /*
+        Serial.print("Version Number: "); Serial.println(header.versionNumber);
+        Serial.print("Packet Type: "); Serial.println(header.packetType);
+        Serial.print("Secondary Header Flag: "); Serial.println(header.secondaryHeaderFlag);
+        Serial.print("APID: "); Serial.println(header.apid);
+        Serial.print("Sequence Flags: "); Serial.println(header.sequenceFlags);
+        Serial.print("Packet Sequence Count: "); Serial.println(header.packetSequenceCount);
+        Serial.print("Packet Length: "); Serial.println(header.packetLength);
+        */
+        totalLength = HEADER_SIZE + header.packetLength + 1; // 전체 패킷 길이 계산
+        headerParsed = true;
+      }
+
+      // 패킷이 아직 완성되지 않았으면 다음 프레임을 기다림
+      if (!headerParsed || dataIndex < totalLength) {
+        break;
+      }
+      writePacket(data, totalLength);
 
-    // 전체 데이터가 수신되었으면 시리얼로 출력
-    if (headerParsed && dataIndex >= totalLength) {
-      if (totalLength <= 32) {
-        // 패킷이 32바이트 이하인 경우 그대로 전송
-        Serial.write(data, totalLength);
-
-        // dataIndex를 초기화
-        dataIndex = 0;
-        headerParsed = false;
-      } else {
-        // 패킷이 32바이트보다 큰 경우 전체 패킷이 수신될 때까지 대기한 후 전송
-        Serial.write(data, totalLength);
-
-        // 남은 데이터를 별도의 버퍼로 이동
-        int remainingDataLength = dataIndex - totalLength;
-        for (int i = 0; i < remainingDataLength; i++) {
-          data[i] = data[totalLength + i];
-        }
-
-        // dataIndex를 초기화
-        dataIndex = 0;
-        headerParsed = false;
+      // 남은 데이터(다음 패킷)를 버퍼 앞으로 이동
+      int remainingDataLength = dataIndex - totalLength;
+      for (int i = 0; i < remainingDataLength; i++) {
+        data[i] = data[totalLength + i];
       }
+      dataIndex = remainingDataLength;
+      headerParsed = false;
     }
   }
 }
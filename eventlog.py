@@ -0,0 +1,198 @@
+import os
+import sys
+import time
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+###############################################################
+# 브리지 구조화 로그
+# 송수신 루프에서는 레벨 확인과 레코드를 큐에 넣는 일만 하고,
+# 문자열 변환과 출력은 백그라운드 스레드(QueueListener)에서 처리
+# 출력 형식: 시각 레벨 모듈 이벤트 key=value ...
+# 패킷 내용(hex) 출력은 dump 모드에서만 (setup_logging(dump=True))
+###############################################################
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+ROOT_LOGGER = "csp"
+LOG_QUEUE_SIZE = 10000  # 큐가 가득 차면 레코드를 버림 (송수신 루프를 막지 않음)
+
+_dump = False
+_listener = None
+
+#########################################################################################
+#
+# 백그라운드 출력
+#
+#########################################################################################
+
+# 레코드를 그대로 큐에 넣음 (QueueHandler 기본 동작은 호출 스레드에서 format 함)
+class _BackgroundHandler(QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+# key=value 형식, bytes 는 hex 로 출력
+class EventFormatter(logging.Formatter):
+    def format(self, record):
+        created = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+        parts = [f"{created}.{int(record.msecs):03d}", record.levelname, record.name.rpartition(".")[2], record.getMessage()]
+        for key, value in getattr(record, "fields", {}).items():
+            if isinstance(value, (bytes, bytearray, memoryview)):
+                value = bytes(value).hex()
+            elif isinstance(value, float):
+                value = f"{value:.6g}"
+            else:
+                value = str(value)
+                if " " in value:
+                    value = repr(value)
+            parts.append(f"{key}={value}")
+        return " ".join(parts)
+
+# 로그 설정: level 이상만 기록, dump=True 면 패킷 내용까지 기록
+def setup_logging(level=INFO, dump=False, stream=None, queue_size=LOG_QUEUE_SIZE):
+    global _dump, _listener
+    if _listener is not None:
+        _listener.stop()
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    root.propagate = False
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    log_queue = queue.Queue(queue_size)
+    root.addHandler(_BackgroundHandler(log_queue))
+    output = logging.StreamHandler(stream if stream is not None else sys.stdout)
+    output.setFormatter(EventFormatter())
+    _listener = QueueListener(log_queue, output)
+    _listener.start()
+    _dump = dump
+    return _listener
+
+# 큐에 남은 로그를 모두 출력하고 백그라운드 스레드 종료
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown_logging)
+
+# fork 한 자식 프로세스에는 출력 스레드가 없으므로 새 큐와 스레드로 다시 시작
+# (부모 큐에 남아 있던 레코드는 부모가 출력하므로 자식은 새 큐로 시작)
+def _restart_after_fork():
+    global _listener
+    if _listener is None:
+        return
+    log_queue = queue.Queue(_listener.queue.maxsize)
+    for handler in logging.getLogger(ROOT_LOGGER).handlers:
+        if isinstance(handler, _BackgroundHandler):
+            handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers)
+    _listener.start()
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+#########################################################################################
+#
+# 이벤트 로거
+#
+#########################################################################################
+
+# 이벤트별 빈도 제한: every 번에 한 번만 통과(샘플링) + 초당 rate 개(토큰 버킷)
+class _EventLimit:
+    __slots__ = ("every", "rate", "burst", "tokens", "updated", "count", "suppressed")
+
+    def __init__(self, rate=None, burst=None, every=1):
+        self.every = every
+        self.rate = rate
+        self.burst = burst if burst is not None else (rate or 0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.count = 0
+        self.suppressed = 0  # 마지막 기록 이후 생략된 수
+
+    def allow(self):
+        self.count += 1
+        if self.count % self.every:
+            self.suppressed += 1
+            return False
+        if self.rate is not None:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                self.suppressed += 1
+                return False
+            self.tokens -= 1
+        return True
+
+class EventLogger:
+    def __init__(self, name):
+        self._logger = logging.getLogger(f"{ROOT_LOGGER}.{name}")
+        self._limits = {}
+
+    # 패킷 내용 출력 여부
+    @property
+    def dump(self):
+        return _dump
+
+    def is_enabled(self, level):
+        return self._logger.isEnabledFor(level)
+
+    # 이벤트 빈도 제한 설정 (생략된 수는 다음 기록에 suppressed=N 으로 붙음)
+    def limit(self, event, rate=None, burst=None, every=1):
+        self._limits[event] = _EventLimit(rate, burst, every)
+
+    def log(self, level, event, **fields):
+        if not self._logger.isEnabledFor(level):
+            return
+        limit = self._limits.get(event)
+        if limit is not None:
+            if not limit.allow():
+                return
+            if limit.suppressed:
+                fields["suppressed"] = limit.suppressed
+                limit.suppressed = 0
+        # findCaller 를 거치지 않도록 레코드를 직접 만듦
+        record = self._logger.makeRecord(self._logger.name, level, "", 0, event, (), None, extra={"fields": fields})
+        self._logger.handle(record)
+
+    def debug(self, event, **fields):
+        self.log(DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.log(ERROR, event, **fields)
+
+    # 송수신 데이터 기록 (DEBUG): 평소에는 길이만, dump 모드에서만 내용을 복사해서 기록
+    def payload(self, event, data, **fields):
+        if not self._logger.isEnabledFor(DEBUG):
+            return
+        fields["length"] = len(data)
+        if _dump:
+            fields["data"] = bytes(data)
+        self.log(DEBUG, event, **fields)
+
+def get_logger(name):
+    return EventLogger(name)
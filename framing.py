@@ -0,0 +1,293 @@
+import time
+import random
+import argparse
+from ccsds import MAX_PACKET_SIZE, parse_and_split_data
+
+try:
+    import numpy as np
+except ImportError:  # 여러 패킷을 한 번에 인코딩할 때만 사용 (없으면 패킷마다 인코딩)
+    np = None
+
+###############################################################
+# 시리얼 프레이밍 (COBS, Consistent Overhead Byte Stuffing)
+# 호스트 <-> 아두이노 시리얼에서 패킷 하나를 프레임 하나로 보내고 0x00 을 프레임 구분자로 사용
+# 데이터 안의 0x00 은 "다음 0x00 까지의 거리" 코드로 바뀌므로 프레임 안에는 0x00 이 없음
+#
+# 프레임: [코드] [0 이 아닌 바이트 (코드 - 1 개)] [코드] ... [0x00]
+#  - 코드 < 0xFF 인 블록 뒤에는 원래 0x00 이 있었음 (프레임의 마지막 블록은 제외)
+#  - 코드 0xFF 는 0 이 아닌 바이트 254 개, 뒤에 0x00 없음
+# 오버헤드는 254 바이트마다 1 바이트 + 구분자 1 바이트로 고정
+# 구분자만 찾으면 되므로 읽다가 끊긴 곳, 깨진 프레임이 있어도 다음 0x00 에서 다시 맞춰짐
+# (이전 escape_data 방식은 \xFF 가 청크 경계에 걸리면 복원 결과가 달라졌음)
+###############################################################
+
+FRAME_DELIMITER = 0x00
+MAX_BLOCK = 254  # 코드 하나가 담는 최대 데이터 바이트 수
+
+# length 바이트 패킷을 인코딩한 프레임의 최대 길이 (구분자 포함)
+def max_encoded_size(length):
+    return length + length // MAX_BLOCK + 2
+
+MAX_FRAME_SIZE = max_encoded_size(MAX_PACKET_SIZE)
+
+#########################################################################################
+#
+# 인코딩
+#
+#########################################################################################
+
+# 패킷 하나를 구분자까지 붙인 프레임으로 인코딩
+# 0x00 으로 나누는 일(split)은 C 에서 처리되므로 파이썬 반복은 0x00 개수만큼만 돔
+def cobs_encode(data):
+    out = bytearray()
+    for part in bytes(data).split(b"\x00"):
+        while len(part) >= MAX_BLOCK:
+            out.append(0xFF)
+            out += part[:MAX_BLOCK]
+            part = part[MAX_BLOCK:]
+        out.append(len(part) + 1)
+        out += part
+    out.append(FRAME_DELIMITER)
+    return bytes(out)
+
+# 여러 패킷을 한 번에 인코딩해서 이어 붙인 프레임들
+# 각 패킷을 [0x00] 패킷 [0x00] 로 이어 붙인 뒤 0x00 위치의 차이로 코드를 한 번에 계산 (NumPy)
+# 0 이 아닌 바이트가 254 개 이상 이어지는 패킷이 있으면 패킷마다 인코딩
+def cobs_encode_packets(packets):
+    if np is None or not packets:
+        return b"".join(cobs_encode(packet) for packet in packets)
+    stream = np.frombuffer(b"\x00" + b"\x00\x00".join(packets) + b"\x00", dtype=np.uint8).copy()
+    zeros = np.flatnonzero(stream == 0)
+    gaps = np.diff(zeros)
+    if len(gaps) and gaps.max() > MAX_BLOCK:
+        return b"".join(cobs_encode(packet) for packet in packets)
+    stream[zeros[:-1]] = gaps
+    # 패킷 끝의 구분자는 0x00 으로 되돌림
+    ends = np.cumsum(np.fromiter((len(packet) + 2 for packet in packets), dtype=np.int64, count=len(packets))) - 1
+    stream[ends] = FRAME_DELIMITER
+    return stream.tobytes()
+
+#########################################################################################
+#
+# 복원
+#
+#########################################################################################
+
+# buf[start:end] 의 프레임(구분자 제외)을 같은 자리에 복원해서 (시작 위치, 길이) 를 돌려줌, 잘못된 프레임이면 None
+# 코드 < 0xFF 블록만 있으면 다음 코드 자리를 0 으로 바꾸는 것으로 끝나고 복원 결과는 buf[start + 1:end]
+# 0xFF 블록을 지난 뒤의 데이터만 그 수만큼 앞으로 당김 (254 바이트 넘게 0 이 없는 패킷에서만 생김)
+def _decode_in_place(buf, view, start, end):
+    position = start
+    code = buf[position]
+    shift = 0  # 지금까지 빠진 0xFF 블록 뒤 코드 바이트 수
+    while True:
+        block_end = position + code
+        if block_end > end:
+            return None
+        if shift:
+            view[position + 1 - shift:block_end - shift] = view[position + 1:block_end]
+        if block_end == end:
+            return start + 1, end - shift - start - 1
+        next_code = buf[block_end]
+        if code == 0xFF:
+            shift += 1
+        else:
+            buf[block_end - shift] = 0
+        position = block_end
+        code = next_code
+
+# 프레임 하나(구분자는 있어도 되고 없어도 됨)를 복원, 잘못된 프레임이면 ValueError
+def cobs_decode(frame):
+    buf = bytearray(frame)
+    if buf and buf[-1] == FRAME_DELIMITER:
+        del buf[-1]
+    if FRAME_DELIMITER in buf:
+        raise ValueError("COBS frame contains a delimiter byte")
+    if not buf:
+        raise ValueError("empty COBS frame")
+    decoded = _decode_in_place(buf, memoryview(buf), 0, len(buf))
+    if decoded is None:
+        raise ValueError("truncated COBS frame")
+    offset, length = decoded
+    return bytes(buf[offset:offset + length])
+
+# 시리얼에서 읽은 조각을 넣으면 완성된 프레임을 복원해서 돌려주는 스트림 복원기
+# PacketReassembler 처럼 미리 할당한 bytearray 에 쌓고, 구분자는 새로 들어온 바이트에서만 찾음
+# 프레임은 버퍼 안에서 제자리 복원해서 memoryview 로 돌려주므로 추가 복사가 없음 (0x00 자리만 고침)
+# max_frame 바이트가 넘도록 구분자가 없으면 다음 구분자까지 버림
+class CobsDecoder:
+    def __init__(self, max_frame=MAX_FRAME_SIZE, capacity=None):
+        if capacity is None:
+            capacity = 2 * max_frame
+        if capacity < max_frame:
+            raise ValueError(f"capacity must be at least max_frame ({max_frame} bytes)")
+        self.max_frame = max_frame
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._head = 0  # 아직 처리하지 않은 프레임의 시작 위치
+        self._scan = 0  # 구분자를 찾기 시작할 위치 (이미 찾아 본 바이트는 다시 보지 않음)
+        self._tail = 0  # 다음 데이터를 쓸 위치
+        self._discarding = False  # 너무 긴 프레임을 버리는 중
+
+        self.frames = 0
+        self.errors = 0  # 잘못되었거나 너무 길어서 버린 프레임 수
+        self.discarded_bytes = 0
+
+    # 복원 대기 중인 바이트 수
+    @property
+    def pending(self):
+        return self._tail - self._head
+
+    # 대기 중인 데이터를 모두 버림
+    def reset(self):
+        self._head = self._scan = self._tail = 0
+        self._discarding = False
+
+    # 조각을 넣고 복원한 프레임을 하나씩 돌려줌
+    # 돌려준 memoryview 는 다음 반복(또는 다음 feed 호출) 전까지만 유효하다.
+    # 큐에 넣는 등 보관이 필요하면 bytes(frame) 으로 복사할 것.
+    def feed(self, data):
+        data = memoryview(data).cast("B")
+        while data:
+            written = self._write(data)
+            data = data[written:]
+            yield from self._drain()
+
+    # 남은 공간에 최대한 복사, 공간이 모자라면 먼저 앞으로 당김
+    def _write(self, data):
+        capacity = len(self._buf)
+        if self._tail + len(data) > capacity and self._head > 0:
+            remaining = self._tail - self._head
+            self._view[:remaining] = self._view[self._head:self._tail]
+            self._scan -= self._head
+            self._head = 0
+            self._tail = remaining
+        written = min(len(data), capacity - self._tail)
+        self._view[self._tail:self._tail + written] = data[:written]
+        self._tail += written
+        return written
+
+    def _drain(self):
+        buf = self._buf
+        while True:
+            end = buf.find(FRAME_DELIMITER, self._scan, self._tail)
+            if end < 0:
+                if self._head == self._tail:
+                    self._head = self._scan = self._tail = 0
+                    return
+                self._scan = self._tail
+                if self._tail - self._head > self.max_frame:
+                    # 구분자 없이 너무 길면 지금까지 받은 것을 버리고 다음 구분자를 기다림
+                    self.discarded_bytes += self._tail - self._head
+                    if not self._discarding:
+                        self._discarding = True
+                        self.errors += 1
+                    self._head = self._scan = self._tail = 0
+                return
+            start = self._head
+            self._head = self._scan = end + 1
+            if self._discarding:
+                self._discarding = False
+                self.discarded_bytes += end + 1 - start
+                continue
+            if end == start:
+                continue  # 연속된 구분자 (동기화용)
+            decoded = _decode_in_place(buf, self._view, start, end)
+            if decoded is None:
+                self.errors += 1
+                self.discarded_bytes += end + 1 - start
+                continue
+            offset, length = decoded
+            self.frames += 1
+            yield self._view[offset:offset + length]
+
+#########################################################################################
+#
+# 벤치마크: COBS 와 이전 escape_data/unescape_data 방식 비교
+#
+#########################################################################################
+
+# 이전 S_G_CSP_not.py 의 방식 (비교용)
+def _escape(data):
+    return data.replace(b'\xFF', b'\xFF\xFF').replace(b'\x00', b'\xFF\x00')
+
+def _unescape(data):
+    return data.replace(b'\xFF\x00', b'\x00').replace(b'\xFF\xFF', b'\xFF')
+
+# CCSDS 처럼 0x00 과 0xFF 가 섞인 패킷
+def _sample_packets(size, count, seed):
+    rng = random.Random(seed)
+    packets = []
+    for i in range(count):
+        body = bytes(rng.choice((0x00, 0x00, 0xFF, rng.randrange(256))) for _ in range(size - 6))
+        packets.append(bytes([0x08, 0x81, 0xC0 | (i >> 8) & 0x3F, i & 0xFF, (size - 7) >> 8, (size - 7) & 0xFF]) + body)
+    return packets
+
+def _timed(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+# 복원 결과 중 원래 패킷과 다르거나 빠진 패킷 수
+def _corrupted(decoded, packets):
+    return sum(bytes(a) != b for a, b in zip(decoded, packets)) + max(len(packets) - len(decoded), 0)
+
+# 크기별 인코딩/복원 시간 (패킷당 µs) 과 오버헤드, 32바이트씩 읽을 때 복원이 틀린 패킷 수
+def benchmark(sizes=(32, 64, 256, 1024), count=2000, chunk_size=32, repeat=3, seed=1):
+    results = []
+    for size in sizes:
+        packets = _sample_packets(size, count, seed)
+        raw_bytes = size * count
+        escaped = b"".join(_escape(packet) for packet in packets)
+        encoded = cobs_encode_packets(packets)
+        chunks = [encoded[i:i + chunk_size] for i in range(0, len(encoded), chunk_size)]
+        escaped_chunks = [escaped[i:i + chunk_size] for i in range(0, len(escaped), chunk_size)]
+
+        def decode_cobs():
+            decoder = CobsDecoder()
+            for chunk in chunks:
+                for _ in decoder.feed(chunk):
+                    pass
+
+        # 이전 방식은 읽은 조각마다 복원하므로 조각 경계에 걸친 \xFF 가 잘못 풀림
+        unescaped = b"".join(_unescape(chunk) for chunk in escaped_chunks)
+        decoder = CobsDecoder()
+        decoded = [bytes(frame) for chunk in chunks for frame in decoder.feed(chunk)]
+
+        results.append({
+            "size": size,
+            "escape_encode_us": _timed(lambda: [_escape(packet) for packet in packets], repeat) / count * 1e6,
+            "escape_decode_us": _timed(lambda: [_unescape(chunk) for chunk in escaped_chunks], repeat) / count * 1e6,
+            "escape_overhead": len(escaped) / raw_bytes - 1,
+            "escape_corrupted": _corrupted(parse_and_split_data(unescaped), packets),
+            "cobs_encode_us": _timed(lambda: [cobs_encode(packet) for packet in packets], repeat) / count * 1e6,
+            "cobs_bulk_encode_us": _timed(lambda: cobs_encode_packets(packets), repeat) / count * 1e6,
+            "cobs_decode_us": _timed(decode_cobs, repeat) / count * 1e6,
+            "cobs_overhead": len(encoded) / raw_bytes - 1,
+            "cobs_corrupted": _corrupted(decoded, packets),
+        })
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="COBS serial framing benchmark against the escape_data scheme")
+    parser.add_argument("--sizes", default="32,64,256,1024", help="comma separated packet sizes in bytes")
+    parser.add_argument("--count", type=int, default=2000, help="packets per size")
+    parser.add_argument("--chunk-size", type=int, default=32, help="serial read size used for decoding")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    print(f"{'size':>5} {'scheme':>7} {'encode us':>10} {'bulk us':>8} {'decode us':>10} {'overhead':>9} {'corrupt':>8}")
+    for row in benchmark(sizes, args.count, args.chunk_size):
+        print(f"{row['size']:>5} {'escape':>7} {row['escape_encode_us']:>10.2f} {'-':>8} "
+              f"{row['escape_decode_us']:>10.2f} {row['escape_overhead']:>9.1%} {row['escape_corrupted']:>8}")
+        print(f"{row['size']:>5} {'cobs':>7} {row['cobs_encode_us']:>10.2f} {row['cobs_bulk_encode_us']:>8.2f} "
+              f"{row['cobs_decode_us']:>10.2f} {row['cobs_overhead']:>9.1%} {row['cobs_corrupted']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+from abc import ABC, abstractmethod
+
+###############################################################
+# Hardware Abstraction Layer
+# 브리지 코드가 사용하는 라디오(nRF24L01)/시리얼(아두이노) 인터페이스 정의
+# pyrf24.RF24 와 serial.Serial 은 그대로 이 인터페이스를 만족하고,
+# simulator.py 의 가상 장치도 같은 인터페이스를 구현함
+###############################################################
+
+# pyrf24 가 없는 환경(개발 PC 등)에서도 시뮬레이터를 쓸 수 있도록 상수를 대신 정의
+try:
+    from pyrf24 import (
+        RF24,
+        RF24_DRIVER,
+        RF24_PA_MIN,
+        RF24_PA_LOW,
+        RF24_PA_HIGH,
+        RF24_PA_MAX,
+        RF24_1MBPS,
+        RF24_2MBPS,
+        RF24_250KBPS,
+    )
+except ImportError:
+    RF24 = None
+    RF24_DRIVER = 'SPIDEV'
+    RF24_PA_MIN = 0
+    RF24_PA_LOW = 1
+    RF24_PA_HIGH = 2
+    RF24_PA_MAX = 3
+    RF24_1MBPS = 0
+    RF24_2MBPS = 1
+    RF24_250KBPS = 2
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+# 데이터 전송률 상수 -> bit/s
+DATA_RATE_BPS = {
+    RF24_250KBPS: 250_000,
+    RF24_1MBPS: 1_000_000,
+    RF24_2MBPS: 2_000_000,
+}
+
+#########################################################################################
+#
+# 전송 계층 인터페이스
+#
+#########################################################################################
+
+# nRF24L01 라디오 (pyrf24.RF24 의 메서드 이름을 그대로 사용)
+class RadioTransport(ABC):
+    @abstractmethod
+    def begin(self):
+        ...
+
+    @abstractmethod
+    def setPALevel(self, level):
+        ...
+
+    @abstractmethod
+    def setChannel(self, channel):
+        ...
+
+    @abstractmethod
+    def setDataRate(self, data_rate):
+        ...
+
+    @abstractmethod
+    def openReadingPipe(self, pipe, address):
+        ...
+
+    @abstractmethod
+    def openWritingPipe(self, address):
+        ...
+
+    @abstractmethod
+    def startListening(self):
+        ...
+
+    @abstractmethod
+    def stopListening(self):
+        ...
+
+    @abstractmethod
+    def available(self):
+        ...
+
+    @abstractmethod
+    def available_pipe(self):
+        ...
+
+    @abstractmethod
+    def enableDynamicPayloads(self):
+        ...
+
+    @abstractmethod
+    def getDynamicPayloadSize(self):
+        ...
+
+    @abstractmethod
+    def setRetries(self, delay, count):
+        ...
+
+    @abstractmethod
+    def getARC(self):
+        ...
+
+    @abstractmethod
+    def read(self, length):
+        ...
+
+    @abstractmethod
+    def write(self, buf):
+        ...
+
+    # TX FIFO 에 넣고 바로 반환, 앞선 프레임이 MAX_RT 면 False
+    @abstractmethod
+    def writeFast(self, buf):
+        ...
+
+    # TX FIFO 가 빌 때까지 대기 (MAX_RT 면 FIFO 를 비우고 상태 플래그를 지운 뒤 False)
+    @abstractmethod
+    def txStandBy(self, timeout=0):
+        ...
+
+    # 실패한 프레임을 FIFO 에 둔 채 MAX_RT 를 지우고 재전송
+    @abstractmethod
+    def reUseTX(self):
+        ...
+
+    # TX FIFO 만 비움, STATUS 의 MAX_RT 는 그대로 남음 (남아 있는 동안 칩이 송신하지 않음)
+    @abstractmethod
+    def flush_tx(self):
+        ...
+
+    # STATUS 의 (TX_DS, MAX_RT, RX_DR) 를 읽고 지움
+    @abstractmethod
+    def whatHappened(self):
+        ...
+
+    @abstractmethod
+    def powerDown(self):
+        ...
+
+# 아두이노 시리얼 포트 (pyserial 의 Serial 과 같은 이름을 사용)
+class SerialTransport(ABC):
+    @property
+    @abstractmethod
+    def is_open(self):
+        ...
+
+    @property
+    @abstractmethod
+    def in_waiting(self):
+        ...
+
+    @abstractmethod
+    def read(self, size=1):
+        ...
+
+    @abstractmethod
+    def write(self, data):
+        ...
+
+    @abstractmethod
+    def close(self):
+        ...
+
+if RF24 is not None:
+    RadioTransport.register(RF24)
+if serial is not None:
+    SerialTransport.register(serial.Serial)
+
+#########################################################################################
+#
+# 장치 생성
+#
+#########################################################################################
+
+# 실제 nRF24L01 라디오 생성
+def create_radio(ce_pin, csn_pin):
+    if RF24 is None:
+        raise RuntimeError("pyrf24 is not installed; use simulator.VirtualRF24 instead")
+    return RF24(ce_pin, csn_pin)
+
+# 실제 아두이노 시리얼 포트 열기
+def open_serial(port, baudrate, **kwargs):
+    if serial is None:
+        raise RuntimeError("pyserial is not installed")
+    return serial.Serial(port=port, baudrate=baudrate, **kwargs)
@@ -0,0 +1,302 @@
+import socket
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ccsds import SEQ_FIRST, SEQ_GAP, SEQ_RESTART, SEQUENCE_RESULT_NAMES
+from eventlog import get_logger
+
+###############################################################
+# 브리지 상태 측정값 (counter / gauge / histogram)
+# 송수신 스레드는 각자 자기 스레드 전용 dict 에만 더하므로 잠금이 없고,
+# 수집(scrape) 시점에만 모든 스레드의 값을 합쳐서 Prometheus 텍스트 형식으로 내보냄
+#  - HTTP : GET /metrics (Prometheus scrape)
+#  - UDP  : 아무 데이터그램이나 보내면 같은 텍스트로 응답
+###############################################################
+
+log = get_logger("metrics")
+
+# 지연 시간 히스토그램 기본 구간 (초)
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+# 스레드별 값 저장소: 각 스레드는 자기 dict 만 수정
+class _ThreadShards:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()  # 새 스레드 등록할 때만 사용
+
+    def get(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = {}
+            with self._lock:
+                self._shards.append(values)
+            self._local.values = values
+            return values
+
+    # 모든 스레드의 dict 복사본 (dict.copy 는 GIL 아래에서 한 번에 끝남)
+    def snapshot(self):
+        with self._lock:
+            shards = list(self._shards)
+        return [shard.copy() for shard in shards]
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._shards = registry._shards
+        self._id = len(registry._metrics)
+
+    def _format_labels(self, values, extra=()):
+        pairs = [f'{key}="{_label_value(value)}"' for key, value in zip(self.labels, values)]
+        pairs += [f'{key}="{value}"' for key, value in extra]
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+# APID 등 정수 라벨은 수집할 때만 문자열로 변환
+def _label_value(value):
+    return f"{value:#05x}" if isinstance(value, int) else str(value)
+
+class Counter(_Metric):
+    kind = "counter"
+
+    # labels: 라벨 값 tuple (정의한 라벨 순서대로)
+    def inc(self, labels=(), amount=1):
+        values = self._shards.get()
+        key = (self._id, labels)
+        values[key] = values.get(key, 0) + amount
+
+    def _collect(self, shards):
+        totals = {}
+        for values in shards:
+            for (metric_id, labels), value in values.items():
+                if metric_id == self._id:
+                    totals[labels] = totals.get(labels, 0) + value
+        return [f"{self.name}{self._format_labels(labels)} {value}" for labels, value in sorted(totals.items(), key=_sort_key)]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labels, buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    # [구간별 개수..., +Inf 개수, 합계, 개수]
+    def observe(self, value, labels=()):
+        values = self._shards.get()
+        key = (self._id, labels)
+        counts = values.get(key)
+        if counts is None:
+            counts = values[key] = [0] * (len(self.buckets) + 3)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def _collect(self, shards):
+        totals = {}
+        for values in shards:
+            for (metric_id, labels), counts in values.items():
+                if metric_id == self._id:
+                    counts = list(counts)
+                    total = totals.get(labels)
+                    totals[labels] = counts if total is None else [a + b for a, b in zip(total, counts)]
+        lines = []
+        for labels, counts in sorted(totals.items(), key=_sort_key):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(labels)} {counts[-2]}")
+            lines.append(f"{self.name}_count{self._format_labels(labels)} {counts[-1]}")
+        return lines
+
+# 수집 시점에 함수를 호출해서 값을 읽는 gauge (큐 깊이 등)
+# 함수는 숫자 또는 {라벨 값 tuple: 숫자} 를 돌려줌
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, registry, name, help_text, labels):
+        super().__init__(registry, name, help_text, labels)
+        self._sources = []
+
+    def track(self, source):
+        self._sources.append(source)
+
+    def _collect(self, shards):
+        lines = []
+        for source in self._sources:
+            try:
+                value = source()
+            except Exception as e:
+                log.warning("gauge_failed", metric=self.name, error=e)
+                continue
+            if not isinstance(value, dict):
+                value = {(): value}
+            for labels, number in sorted(value.items(), key=_sort_key):
+                lines.append(f"{self.name}{self._format_labels(labels)} {number}")
+        return lines
+
+def _sort_key(item):
+    return tuple(str(v) for v in item[0])
+
+class Registry:
+    def __init__(self):
+        self._shards = _ThreadShards()
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(self, name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(self, name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge(self, name, help_text, labels))
+
+    # Prometheus 텍스트 형식
+    def exposition(self):
+        shards = self._shards.snapshot()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric._collect(shards))
+        return "\n".join(lines) + "\n"
+
+#########################################################################################
+#
+# 브리지 공용 측정값
+# bridge 라벨: ground(G_S_CSP) / satellite(S_G_CSP)
+# direction 라벨: uplink(지상 -> 위성) / downlink(위성 -> 지상)
+#
+#########################################################################################
+
+REGISTRY = Registry()
+
+PACKETS = REGISTRY.counter("csp_packets_total", "CCSDS packets handled by the bridge", ("bridge", "direction", "apid"))
+BYTES = REGISTRY.counter("csp_bytes_total", "CCSDS bytes handled by the bridge", ("bridge", "direction", "apid"))
+DROPPED = REGISTRY.counter("csp_dropped_packets_total", "Packets dropped or filtered", ("bridge", "direction", "reason"))
+FRAMES = REGISTRY.counter("csp_radio_frames_total", "Radio frames sent or received", ("bridge", "direction"))
+WRITE_FAILURES = REGISTRY.counter("csp_radio_write_failures_total", "Radio writes that failed (MAX_RT)", ("bridge",))
+REASSEMBLY_RESETS = REGISTRY.counter("csp_reassembly_resets_total", "Reassembly buffer resets and resyncs", ("bridge", "direction", "reason"))
+DISCARDED_BYTES = REGISTRY.counter("csp_reassembly_discarded_bytes_total", "Bytes skipped while resynchronizing", ("bridge", "direction"))
+QUEUE_DEPTH = REGISTRY.gauge("csp_queue_depth", "Packets waiting in a bridge queue", ("bridge", "queue"))
+QUEUE_BYTES = REGISTRY.gauge("csp_queue_bytes", "Packet bytes waiting in a bridge queue", ("bridge", "queue"))
+QUEUE_HIGH_WATER = REGISTRY.counter("csp_queue_high_water_total", "Times a bounded bridge queue crossed its high-water mark", ("bridge", "queue"))
+STAGE_LATENCY = REGISTRY.histogram("csp_stage_latency_seconds", "Time spent in a bridge stage", ("bridge", "stage"))
+SEQUENCE_ERRORS = REGISTRY.counter("csp_sequence_errors_total", "Sequence count gaps, duplicates, reorders and restarts", ("bridge", "direction", "apid", "kind"))
+LOST_PACKETS = REGISTRY.counter("csp_lost_packets_total", "Packets reported missing by per-APID sequence gaps (late arrivals count as reordered)", ("bridge", "direction", "apid"))
+LOSS_RATIO = REGISTRY.gauge("csp_loss_ratio", "Lost / expected packets per APID since start", ("bridge", "direction", "apid"))
+COMPRESSION_SAVED = REGISTRY.counter("csp_compression_saved_bytes_total", "Bytes removed by packet compression before framing", ("bridge", "direction"))
+LINK_PROFILE = REGISTRY.gauge("csp_link_profile", "Current link adaptation profile index (higher = faster)", ("bridge", "role"))
+LINK_CHANGES = REGISTRY.counter("csp_link_profile_changes_total", "Link adaptation profile changes", ("bridge", "role", "reason"))
+
+# 재조립기의 재동기화 통계를 측정값에 반영 (이전 값과의 차이만 더함)
+class ReassemblerMetrics:
+    def __init__(self, reassembler, bridge, direction):
+        self.reassembler = reassembler
+        self._labels = (bridge, direction)
+        self._resync_labels = (bridge, direction, "resync")
+        self._resyncs = 0
+        self._discarded = 0
+
+    def update(self):
+        reassembler = self.reassembler
+        if reassembler.resyncs != self._resyncs:
+            REASSEMBLY_RESETS.inc(self._resync_labels, reassembler.resyncs - self._resyncs)
+            self._resyncs = reassembler.resyncs
+        if reassembler.discarded_bytes != self._discarded:
+            DISCARDED_BYTES.inc(self._labels, reassembler.discarded_bytes - self._discarded)
+            self._discarded = reassembler.discarded_bytes
+
+sequence_log = get_logger("sequence")
+for _event in ("sequence_gap", "sequence_duplicate", "sequence_reordered", "sequence_restart"):
+    sequence_log.limit(_event, rate=5, burst=20)  # 링크가 나쁠 때 매 패킷 기록하지 않도록
+
+# SequenceTracker 결과를 측정값과 이벤트로 기록하고, APID 별 손실률을 gauge 로 내보냄
+class SequenceMetrics:
+    def __init__(self, tracker, bridge, direction):
+        self.tracker = tracker
+        self.bridge = bridge
+        self.direction = direction
+        LOSS_RATIO.track(self._loss_ratios)
+
+    # 패킷마다 호출, 결과(SEQ_*)를 돌려줌
+    def observe(self, packet):
+        result = self.tracker.observe(packet)
+        if result <= SEQ_FIRST:
+            return result
+        apid = (packet[0] & 0x07) << 8 | packet[1]
+        kind = SEQUENCE_RESULT_NAMES[result]
+        SEQUENCE_ERRORS.inc((self.bridge, self.direction, apid, kind))
+        count = (packet[2] & 0x3F) << 8 | packet[3]
+        if result == SEQ_GAP:
+            lost = self.tracker.last_gap
+            LOST_PACKETS.inc((self.bridge, self.direction, apid), lost)
+            sequence_log.warning("sequence_gap", bridge=self.bridge, direction=self.direction, apid=f"{apid:#05x}",
+                                 count=count, lost=lost, loss_rate=self.tracker.loss_rate(apid))
+        else:
+            log_event = sequence_log.warning if result != SEQ_RESTART else sequence_log.info
+            log_event(f"sequence_{kind}", bridge=self.bridge, direction=self.direction, apid=f"{apid:#05x}", count=count)
+        return result
+
+    def _loss_ratios(self):
+        tracker = self.tracker
+        return {(self.bridge, self.direction, apid): round(tracker.loss_rate(apid), 6) for apid in tracker.apids()}
+
+#########################################################################################
+#
+# 내보내기
+#
+#########################################################################################
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.exposition().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# HTTP /metrics 서버 (백그라운드 스레드)
+def serve_http(port, host="127.0.0.1", registry=REGISTRY):
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log.info("metrics_http", addr=f"{host}:{port}")
+    return server
+
+# UDP 통계 포트: 요청 데이터그램에 측정값 텍스트로 응답 (백그라운드 스레드)
+def serve_udp(port, host="127.0.0.1", registry=REGISTRY):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, port))
+
+    def run():
+        while True:
+            _, addr = sock.recvfrom(64)
+            body = registry.exposition().encode()
+            try:
+                sock.sendto(body, addr)
+            except OSError as e:
+                log.warning("metrics_udp_failed", error=e, size=len(body))
+
+    threading.Thread(target=run, daemon=True).start()
+    log.info("metrics_udp", addr=f"{host}:{port}")
+    return sock
@@ -0,0 +1,60 @@
+import os
+import signal
+import multiprocessing
+from multiprocessing.connection import wait
+from eventlog import get_logger, shutdown_logging
+
+###############################################################
+# 프로세스 모드
+# 브리지 단계(라디오/시리얼 수신, 송신, UDP)를 각각의 프로세스로 실행해서
+# 한 프로세스의 GIL 을 나눠 쓰지 않게 함 (수신 루프가 바쁘게 돌아도 송신 단계가 밀리지 않음)
+#  - fork 로 시작하므로 부모에서 연 라디오/시리얼 포트와 ring.SharedRing 을 자식이 그대로 물려받음
+#    각 단계는 자기 몫의 장치와 링의 한쪽 끝만 사용해야 함
+#  - 단계마다 코어를 정해 두면 그 코어에서만 실행 (sched_setaffinity)
+#  - 한 단계라도 끝나면 나머지 단계를 끝내고 돌아옴
+###############################################################
+
+log = get_logger("multiproc")
+
+_context = multiprocessing.get_context("fork")
+
+# 이 프로세스를 core 번 코어에서만 실행, 없는 코어면 기록만 하고 그대로 둠
+def pin_to_core(core):
+    available = os.sched_getaffinity(0)
+    if core not in available:
+        log.warning("core_unavailable", core=core, available=",".join(map(str, sorted(available))))
+        return False
+    os.sched_setaffinity(0, {core})
+    return True
+
+def _run_stage(name, target, core):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C 는 부모가 받아서 단계를 끝냄
+    if core is not None:
+        pin_to_core(core)
+    log.info("stage_started", stage=name, pid=os.getpid(), core=core)
+    try:
+        target()
+    finally:
+        shutdown_logging()  # 자식은 atexit 없이 끝나므로 남은 로그를 여기서 출력
+
+# stages: [(이름, 인자 없는 함수)], cores: {이름: 코어 번호}
+# 모든 단계를 시작하고, 어느 하나라도 끝나면 나머지를 종료한 뒤 RuntimeError (단계는 끝나지 않고 계속 도는 함수)
+def run_stages(stages, cores=None):
+    cores = cores or {}
+    processes = []
+    try:
+        for name, target in stages:
+            process = _context.Process(target=_run_stage, args=(name, target, cores.get(name)), name=name, daemon=True)
+            process.start()
+            processes.append(process)
+        ended = wait([process.sentinel for process in processes])
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+    stopped = [process for process in processes if process.sentinel in ended]
+    for process in stopped:
+        log.error("stage_exited", stage=process.name, exitcode=process.exitcode)
+    raise RuntimeError(f"bridge stage {stopped[0].name} exited with code {stopped[0].exitcode}")
@@ -0,0 +1,820 @@
+import time
+import threading
+from collections import deque, namedtuple
+from ccsds import split_data
+from hal import DATA_RATE_BPS, RF24_PA_LOW, RF24_PA_MAX, RF24_250KBPS, RF24_1MBPS, RF24_2MBPS
+
+###############################################################
+# nRF24L01 링크 계층
+# CCSDS 패킷을 32바이트 프레임으로 나눠 라디오로 보내는 송신 방식 모음
+###############################################################
+
+TX_FIFO_DEPTH = 3  # nRF24L01 하드웨어 TX FIFO 깊이
+
+#########################################################################################
+#
+# 파이프라인 송신
+# write() 처럼 프레임마다 ACK 를 기다리지 않고 writeFast() 로 TX FIFO 를 계속 채움
+# FIFO 에 빈 자리가 났다는 것은 가장 오래된 프레임이 ACK 를 받았다는 뜻이므로
+# 그 시점에 프레임(=패킷) 완료를 판정
+#
+#########################################################################################
+
+class PipelinedTransmitter:
+    def __init__(self, radio, on_complete=None, standby_timeout=0, fifo_depth=TX_FIFO_DEPTH, chunk_size=32, on_frame=None):
+        self.radio = radio
+        self.on_complete = on_complete  # on_complete(packet_id, ok)
+        self.on_frame = on_frame  # on_frame(ok, arc): 프레임마다 결과와 재전송 횟수 (LinkTuner.record)
+        self.standby_timeout = standby_timeout  # flush() 에서 MAX_RT 후 재시도할 시간 (ms)
+        self.fifo_depth = fifo_depth
+        self.chunk_size = chunk_size
+
+        # 하드웨어 FIFO 에 있는 프레임: (packet_id, 패킷의 마지막 프레임인지)
+        self._in_flight = deque()
+        self._failed = set()
+        self._next_packet_id = 0
+
+        self.frames_sent = 0
+        self.packets_completed = 0
+        self.packets_failed = 0
+
+    # 패킷을 프레임으로 나눠 FIFO 에 넣음, 패킷 번호를 돌려줌
+    # 완료 여부는 on_complete 로 나중에 알려줌
+    def send(self, packet):
+        packet_id = self._next_packet_id
+        self._next_packet_id += 1
+
+        chunks = split_data(packet, self.chunk_size)
+        last = len(chunks) - 1
+        for index, chunk in enumerate(chunks):
+            if not self.radio.writeFast(bytes(chunk)):
+                # 앞선 프레임이 MAX_RT: FIFO 에 남은 프레임은 모두 실패 처리
+                started = self._abort_in_flight(packet_id)
+                if started or not self.radio.writeFast(bytes(chunk)):
+                    # 이 패킷의 앞부분이 이미 버려졌거나 다시 보내도 실패
+                    self._abort_in_flight(packet_id)
+                    self._frame_done(False)
+                    self._finish(packet_id, False)
+                    return packet_id
+            self.frames_sent += 1
+            self._in_flight.append((packet_id, index == last))
+            while len(self._in_flight) > self.fifo_depth:
+                self._confirm(*self._in_flight.popleft())
+                self._frame_done(True)
+        return packet_id
+
+    # FIFO 가 빌 때까지 기다리고 남은 프레임의 결과를 확정 (보낼 데이터가 없을 때 호출)
+    def flush(self):
+        if not self._in_flight:
+            return True
+        if self.standby_timeout:
+            ok = self.radio.txStandBy(self.standby_timeout)
+        else:
+            ok = self.radio.txStandBy()
+        while self._in_flight:
+            packet_id, is_last = self._in_flight.popleft()
+            if ok:
+                self._confirm(packet_id, is_last)
+            else:
+                self._finish(packet_id, False)
+            self._frame_done(ok)
+        return ok
+
+    # ARC 레지스터는 마지막으로 끝난 프레임의 값이므로 FIFO 안의 프레임들은 근사값
+    def _frame_done(self, ok):
+        if self.on_frame is not None:
+            self.on_frame(ok, self.radio.getARC())
+
+    def _confirm(self, packet_id, is_last):
+        if is_last and packet_id not in self._failed:
+            self._finish(packet_id, True)
+
+    # FIFO 를 비우고 그 안의 패킷들을 실패 처리, 현재 패킷의 프레임이 있었는지 돌려줌
+    # flush_tx 는 MAX_RT 를 지우지 않으므로 whatHappened() 로 지워야 칩이 다시 송신함
+    def _abort_in_flight(self, current_packet_id):
+        self.radio.flush_tx()
+        self.radio.whatHappened()
+        started = False
+        while self._in_flight:
+            packet_id, _ = self._in_flight.popleft()
+            self._frame_done(False)
+            if packet_id == current_packet_id:
+                started = True
+            else:
+                self._finish(packet_id, False)
+        return started
+
+    def _finish(self, packet_id, ok):
+        if packet_id in self._failed:
+            return
+        if ok:
+            self.packets_completed += 1
+        else:
+            self._failed.add(packet_id)
+            self.packets_failed += 1
+            # 실패 표시는 남은 프레임이 정리될 때까지만 필요
+            if len(self._failed) > 1024:
+                self._failed = {p for p in self._failed if p > packet_id - 1024}
+        if self.on_complete is not None:
+            self.on_complete(packet_id, ok)
+
+#########################################################################################
+#
+# Selective-repeat ARQ
+# 프레임 첫 바이트에 7비트 순번을 붙여서(데이터 31바이트) 보내고,
+# 수신 측은 순서가 어긋나거나 빠진 프레임을 버퍼링한 뒤 빠진 순번만 NACK
+# 제어 프레임은 반대 방향 링크로 전달 (첫 바이트 최상위 비트 = 1)
+#  - 데이터 프레임 : [0 | seq(7)] [data 1~31]
+#  - 제어 프레임   : [0x80] [다음에 기다리는 seq] [수신 비트맵 8바이트]
+# 프레임 길이를 알아야 하므로 양쪽 라디오 모두 dynamic payload 를 켜야 함
+#
+#########################################################################################
+
+ARQ_CONTROL = 0x80
+ARQ_SEQ_MODULO = 128
+ARQ_MAX_WINDOW = ARQ_SEQ_MODULO // 2  # selective repeat 의 최대 윈도우
+ARQ_CHUNK_SIZE = 31
+ARQ_BITMAP_SIZE = ARQ_MAX_WINDOW // 8
+
+# 제어 프레임인지 확인
+def is_arq_control(frame):
+    return bool(frame) and frame[0] & ARQ_CONTROL != 0
+
+class ArqSender:
+    def __init__(self, send_frame, window=32, timeout=0.2):
+        if not 1 <= window <= ARQ_MAX_WINDOW:
+            raise ValueError(f"window must be between 1 and {ARQ_MAX_WINDOW}")
+        self.send_frame = send_frame  # send_frame(bytes) -> bool (라디오 write)
+        self.window = window
+        self.timeout = timeout  # 피드백이 없을 때 재전송까지의 시간 (초)
+        self.nack_holdoff = timeout / 4  # 같은 프레임을 NACK 으로 너무 자주 재전송하지 않도록
+
+        self._lock = threading.Lock()
+        self._base = 0  # 아직 확인받지 못한 가장 오래된 순번 (절대값)
+        self._next = 0  # 다음에 붙일 순번 (절대값)
+        self._frames = {}  # 순번 -> [프레임, 마지막 송신 시각, 재전송 필요 여부]
+        self._backlog = deque()  # 윈도우가 가득 차서 대기 중인 데이터
+        self._control = deque()  # 반대 방향 수신기가 보낼 제어 프레임
+
+        self.frames_sent = 0
+        self.retransmissions = 0
+
+    # 보낼 데이터가 남아 있는지 (윈도우 안의 미확인 프레임 포함)
+    @property
+    def idle(self):
+        with self._lock:
+            return not self._frames and not self._backlog and not self._control
+
+    # CCSDS 패킷을 31바이트 조각으로 나눠 대기열에 넣고 전송
+    def send(self, packet):
+        with self._lock:
+            for chunk in split_data(packet, ARQ_CHUNK_SIZE):
+                self._backlog.append(bytes(chunk))
+        self.pump()
+
+    # 같은 라디오로 나가는 제어 프레임 (ArqReceiver 의 피드백)
+    def queue_control(self, frame):
+        with self._lock:
+            self._control.append(frame)
+
+    # 제어 프레임 -> 재전송 대상 -> 새 프레임 순서로 송신, 송신 스레드에서 주기적으로 호출
+    def pump(self):
+        now = time.monotonic()
+        with self._lock:
+            control = list(self._control)
+            self._control.clear()
+            # 피드백이 끊기면 가장 오래된 프레임만 다시 보내서 수신 측의 피드백을 유도
+            if self._base in self._frames:
+                entry = self._frames[self._base]
+                if not entry[2] and now - entry[1] >= self.timeout:
+                    entry[2] = True
+                    self.retransmissions += 1
+            while self._backlog and self._next - self._base < self.window:
+                seq = self._next
+                self._frames[seq] = [bytes([seq % ARQ_SEQ_MODULO]) + self._backlog.popleft(), 0.0, True]
+                self._next += 1
+            pending = [(seq, entry) for seq, entry in sorted(self._frames.items()) if entry[2]]
+
+        for frame in control:
+            self.send_frame(frame)
+        for seq, entry in pending:
+            ok = self.send_frame(entry[0])
+            with self._lock:
+                entry[1] = time.monotonic()
+                # 송신 실패(MAX_RT)면 다음 pump 에서 다시 보냄
+                entry[2] = not ok and seq in self._frames
+            self.frames_sent += 1
+
+    # 수신 측 피드백 처리: 누적 ACK 로 윈도우를 밀고, 비트맵의 빈 곳은 재전송 표시
+    def on_feedback(self, frame):
+        if len(frame) < 2 + ARQ_BITMAP_SIZE:
+            return
+        expected = frame[1] % ARQ_SEQ_MODULO
+        bitmap = int.from_bytes(frame[2:2 + ARQ_BITMAP_SIZE], "big")
+        now = time.monotonic()
+        with self._lock:
+            acked_to = self._base + (expected - self._base) % ARQ_SEQ_MODULO
+            if acked_to > self._next:
+                return  # 오래된 피드백
+            for seq in range(self._base, acked_to):
+                self._frames.pop(seq, None)
+            self._base = acked_to
+
+            highest = -1
+            for offset in range(ARQ_MAX_WINDOW):
+                if bitmap >> offset & 1:
+                    self._frames.pop(acked_to + 1 + offset, None)
+                    highest = offset
+            # 수신 확인된 프레임보다 앞에 있는 빈 곳 = 손실 (acked_to 자신 포함)
+            for seq in range(acked_to, acked_to + 1 + highest + 1):
+                entry = self._frames.get(seq)
+                if entry is not None and not entry[2] and now - entry[1] >= self.nack_holdoff:
+                    entry[2] = True
+                    self.retransmissions += 1
+
+class ArqReceiver:
+    def __init__(self, deliver, send_control, window=32, ack_every=8):
+        if not 1 <= window <= ARQ_MAX_WINDOW:
+            raise ValueError(f"window must be between 1 and {ARQ_MAX_WINDOW}")
+        self.deliver = deliver  # deliver(bytes): 순서대로 복원된 데이터
+        self.send_control = send_control  # send_control(bytes): 피드백을 반대 방향으로 보냄
+        self.window = window
+        self.ack_every = ack_every
+
+        self._expected = 0
+        self._buffer = {}  # 순서가 앞선 프레임 (seq -> data)
+        self._since_ack = 0
+
+        self.frames_received = 0
+        self.duplicates = 0
+        self.reordered = 0
+
+    # 데이터 프레임 수신
+    def on_frame(self, frame):
+        seq = frame[0] & 0x7F
+        offset = (seq - self._expected) % ARQ_SEQ_MODULO
+        self.frames_received += 1
+
+        if offset >= self.window or seq in self._buffer:
+            # 이미 받은 프레임의 재전송: 송신 측이 피드백을 못 받은 것이므로 바로 다시 알림
+            self.duplicates += 1
+            self.send_control(self.feedback())
+            return
+
+        self._buffer[seq] = bytes(frame[1:])
+        if offset:
+            self.reordered += 1
+        while self._expected in self._buffer:
+            self.deliver(self._buffer.pop(self._expected))
+            self._expected = (self._expected + 1) % ARQ_SEQ_MODULO
+
+        self._since_ack += 1
+        # 빈 곳이 생겼거나 일정 개수마다 피드백
+        if self._buffer or self._since_ack >= self.ack_every:
+            self.send_control(self.feedback())
+
+    # [0x80][다음에 기다리는 seq][expected+1 부터의 수신 비트맵]
+    def feedback(self):
+        self._since_ack = 0
+        bitmap = 0
+        for seq in self._buffer:
+            offset = (seq - self._expected) % ARQ_SEQ_MODULO - 1
+            if 0 <= offset < ARQ_MAX_WINDOW:
+                bitmap |= 1 << offset
+        return bytes([ARQ_CONTROL, self._expected]) + bitmap.to_bytes(ARQ_BITMAP_SIZE, "big")
+
+#########################################################################################
+#
+# 다중 라디오 스트라이핑
+# 서로 다른 채널에 둔 라디오 여러 대에 프레임을 번갈아 넣어서 처리량을 라디오 수만큼 늘림
+# 프레임 첫 바이트에 8비트 순번을 붙이고(데이터 31바이트), 수신 측은 모든 라디오에서 받은
+# 프레임을 순번대로 정렬해서 원래 바이트 스트림으로 복원
+#  - 데이터 프레임 : [seq(8)] [data 1~31]
+# 라디오 하나 안에서는 순서가 유지되므로 어긋남은 라디오 간 지연 차이 정도
+# 송신 측은 MAX_RT 난 라디오의 프레임을 다른 라디오로 다시 보내고, 계속 실패하는 라디오는 잠시 뺌
+# 수신 측은 끝내 오지 않는 순번을 reorder_timeout 후 건너뜀 (이후는 재조립기의 재동기화가 처리)
+# 프레임 길이를 알아야 하므로 모든 라디오에서 dynamic payload 를 켜야 함
+#
+#########################################################################################
+
+STRIPE_SEQ_MODULO = 256
+STRIPE_CHUNK_SIZE = 31
+
+class StripedTransmitter:
+    # radios: 송신 설정(채널, dynamic payload)을 마친 라디오 목록
+    # max_failures 번 연속 실패한 라디오는 retry_after 초 동안 쓰지 않음 (최소 한 대는 유지)
+    def __init__(self, radios, max_failures=3, retry_after=5.0):
+        if not radios:
+            raise ValueError("at least one radio is required")
+        self.radios = list(radios)
+        self.max_failures = max_failures
+        self.retry_after = retry_after
+
+        self._active = list(self.radios)
+        self._disabled = {}  # 라디오 번호 -> 다시 쓰기 시작할 시각
+        self._failures = [0] * len(self.radios)
+        # 라디오별로 FIFO 에 들어가 있을 수 있는 프레임 (MAX_RT 시 다른 라디오로 재전송)
+        self._in_flight = [deque(maxlen=TX_FIFO_DEPTH) for _ in self.radios]
+        self._lane = 0
+        self._seq = 0
+
+        self.frames_sent = 0
+        self.frames_rerouted = 0
+        self.frames_dropped = 0
+        self.lanes_disabled = 0
+
+    # 지금 쓰고 있는 라디오 수
+    @property
+    def lanes(self):
+        return len(self._active)
+
+    # 패킷을 31바이트 조각으로 나눠 라디오에 번갈아 넣음, 버린 프레임이 있으면 False
+    def send(self, packet):
+        self._restore_lanes()
+        ok = True
+        for chunk in split_data(packet, STRIPE_CHUNK_SIZE):
+            frame = bytes([self._seq]) + bytes(chunk)
+            self._seq = (self._seq + 1) % STRIPE_SEQ_MODULO
+            ok = self._write(deque([frame])) and ok
+        return ok
+
+    # 모든 라디오의 FIFO 가 빌 때까지 기다림 (보낼 데이터가 없을 때 호출)
+    def flush(self):
+        ok = True
+        for _ in range(len(self.radios)):
+            retry = deque()
+            for radio in list(self._active):
+                lane = self.radios.index(radio)
+                if not self._in_flight[lane]:
+                    continue
+                if radio.txStandBy():
+                    self._in_flight[lane].clear()
+                    self._failures[lane] = 0
+                else:
+                    retry.extend(self._lane_failed(lane))
+            if not retry:
+                return ok
+            ok = self._write(retry) and ok
+        return ok
+
+    # pending 의 프레임을 차례로 넣음, 실패한 라디오의 프레임은 다음 라디오로 다시 보냄
+    def _write(self, pending):
+        attempts = 0
+        while pending:
+            if attempts > 2 * len(self.radios):
+                self.frames_dropped += len(pending)
+                return False
+            radio = self._active[self._lane % len(self._active)]
+            lane = self.radios.index(radio)
+            self._lane += 1
+            frame = pending[0]
+            if radio.writeFast(frame):
+                pending.popleft()
+                self._in_flight[lane].append(frame)
+                self.frames_sent += 1
+                continue
+            # 앞선 프레임이 MAX_RT: 그 라디오의 FIFO 를 비우고 들어 있던 프레임을 먼저 다시 보냄
+            attempts += 1
+            rerouted = self._lane_failed(lane)
+            self.frames_rerouted += len(rerouted)
+            pending.extendleft(reversed(rerouted))
+        return True
+
+    # 실패한 라디오의 FIFO 를 비우고 재전송할 프레임을 돌려줌
+    # MAX_RT 도 지워야 그 라디오가 다시 송신함 (flush_tx 만으로는 계속 실패)
+    def _lane_failed(self, lane):
+        radio = self.radios[lane]
+        radio.flush_tx()
+        radio.whatHappened()
+        frames = list(self._in_flight[lane])
+        self._in_flight[lane].clear()
+        self._failures[lane] += 1
+        if self._failures[lane] >= self.max_failures and len(self._active) > 1:
+            self._active.remove(radio)
+            self._disabled[lane] = time.monotonic() + self.retry_after
+            self.lanes_disabled += 1
+        return frames
+
+    def _restore_lanes(self):
+        if not self._disabled:
+            return
+        now = time.monotonic()
+        for lane, until in list(self._disabled.items()):
+            if now >= until:
+                del self._disabled[lane]
+                self._failures[lane] = 0
+                self._active.append(self.radios[lane])
+
+class StripeReceiver:
+    # deliver(bytes): 순서대로 복원된 데이터
+    # window: 이보다 앞선 순번이 오면 빠진 프레임은 포기
+    # reorder_timeout: 빠진 순번을 기다리는 최대 시간 (초), poll() 에서 확인
+    def __init__(self, deliver, window=64, reorder_timeout=0.05):
+        if not 1 <= window <= STRIPE_SEQ_MODULO // 2:
+            raise ValueError(f"window must be between 1 and {STRIPE_SEQ_MODULO // 2}")
+        self.deliver = deliver
+        self.window = window
+        self.reorder_timeout = reorder_timeout
+
+        self._expected = None  # 첫 프레임의 순번부터 시작
+        self._buffer = {}  # 순서가 앞선 프레임 (seq -> data)
+        self._gap_since = None  # 빠진 순번을 기다리기 시작한 시각
+        self._syncing = False  # 첫 프레임 뒤 시작 순번을 정하는 중
+
+        self.frames_received = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.skipped = 0  # 끝내 오지 않아 건너뛴 프레임 수
+
+    def on_frame(self, frame):
+        seq = frame[0]
+        self.frames_received += 1
+        if self._expected is None:
+            # 첫 프레임이 다른 라디오의 앞 순번보다 먼저 올 수 있으므로 reorder_timeout 동안은 모아서 시작점을 정함
+            self._expected = seq
+            self._syncing = True
+            self._gap_since = time.monotonic()
+        offset = (seq - self._expected) % STRIPE_SEQ_MODULO
+        if self._syncing and STRIPE_SEQ_MODULO - offset <= self.window:
+            self._expected = seq
+            offset = 0
+        if offset >= STRIPE_SEQ_MODULO // 2 or seq in self._buffer:
+            # 이미 전달한 프레임 (다른 라디오로 재전송된 것 등)
+            self.duplicates += 1
+            return
+        if offset >= self.window:
+            self._skip((seq - self.window + 1) % STRIPE_SEQ_MODULO)
+        if offset:
+            self.reordered += 1
+        self._buffer[seq] = bytes(frame[1:])
+        if not self._syncing:
+            self._drain()
+
+    # 빠진 순번을 reorder_timeout 이상 기다렸으면 다음 받은 프레임까지 건너뜀
+    def poll(self):
+        if self._gap_since is None or time.monotonic() - self._gap_since < self.reorder_timeout:
+            return
+        if self._syncing:
+            self._syncing = False
+            self._drain()
+            return
+        nearest = min(self._buffer, key=lambda seq: (seq - self._expected) % STRIPE_SEQ_MODULO)
+        self._skip(nearest)
+        self._drain()
+
+    # target 순번 앞까지 받은 것은 전달하고 나머지는 건너뜀
+    def _skip(self, target):
+        while self._expected != target:
+            data = self._buffer.pop(self._expected, None)
+            if data is None:
+                self.skipped += 1
+            else:
+                self.deliver(data)
+            self._expected = (self._expected + 1) % STRIPE_SEQ_MODULO
+        self._gap_since = None
+        self._syncing = False
+
+    # 이어지는 프레임을 전달, 빠진 순번 대기 시간은 그 순번을 기다리기 시작한 때부터 잼
+    def _drain(self):
+        advanced = False
+        while self._expected in self._buffer:
+            self.deliver(self._buffer.pop(self._expected))
+            self._expected = (self._expected + 1) % STRIPE_SEQ_MODULO
+            advanced = True
+        if not self._buffer:
+            self._gap_since = None
+        elif advanced or self._gap_since is None:
+            self._gap_since = time.monotonic()
+
+#########################################################################################
+#
+# 링크 적응 (link adaptation)
+# 송신 측이 프레임별 write 성공 여부와 재전송 횟수(ARC)를 window 개씩 모아서
+# 링크 설정 단계(LINK_PROFILES, 앞쪽일수록 튼튼하고 뒤쪽일수록 빠름)를 올리거나 내림
+#  - 내림 : 실패율이나 평균 ARC 가 기준을 넘으면 바로 한 단계
+#  - 올림 : 충분히 좋은 구간이 up_windows 번 이어지고 마지막 변경 후 hold 초가 지나면 한 단계
+#           올린 뒤 첫 구간의 실효 처리량이 이전 단계보다 probe_margin 이상 낮으면 되돌리고, 그 단계는 한동안 다시 올리지 않음
+#           (처리량이 비슷하면 유지하므로 링크가 깨끗할 때는 출력을 낮춘 단계도 사용)
+# 양쪽 전송률이 같아야 통신이 되므로 변경은 제어 파이프로 2단계 handshake
+#  1. 현재 설정으로 PROPOSE 송신 -> ACK 를 받았으면 수신 측은 새 설정으로 바뀐 상태
+#  2. 송신 측도 바꾸고 새 설정으로 CONFIRM 송신
+#     CONFIRM 이 confirm_timeout 안에 안 되면 송신 측은 이전 설정으로, 수신 측도 시간이 지나면 이전 설정으로
+# 오래 쉬었다가 양쪽 설정이 어긋나면(수신 측 rendezvous) 둘 다 시작 단계로 돌아가서 다시 맞춤
+#  - 제어 프레임 : ['L'] [종류 1=PROPOSE 2=CONFIRM] [단계 번호] [epoch]
+#  - 제어 파이프 : 데이터 주소의 첫 바이트만 'C' 로 바꾼 주소 (수신 측 pipe 2)
+#
+#########################################################################################
+
+LinkProfile = namedtuple("LinkProfile", ("name", "data_rate", "pa_level", "retry_delay", "retry_count"))
+
+LINK_PROFILES = (
+    LinkProfile("robust", RF24_250KBPS, RF24_PA_MAX, 5, 15),
+    LinkProfile("strong", RF24_1MBPS, RF24_PA_MAX, 3, 15),
+    LinkProfile("default", RF24_1MBPS, RF24_PA_LOW, 5, 15),  # 기존 고정 설정
+    LinkProfile("fast", RF24_2MBPS, RF24_PA_MAX, 2, 15),
+)
+LINK_DEFAULT_PROFILE = 2
+
+LINK_CONTROL_PIPE = 2
+LINK_CONTROL_MARKER = 0x4C  # 'L'
+LINK_PROPOSE = 1
+LINK_CONFIRM = 2
+
+_FRAME_BITS = 8 + 5 * 8 + 9 + 32 * 8 + 16  # 프리앰블 + 주소 + PCF + 32바이트 + CRC
+_ACK_BITS = 8 + 5 * 8 + 9 + 16
+_TX_SETTLE = 130e-6
+
+# 데이터 주소에 대응하는 제어 파이프 주소
+def link_control_address(address):
+    return b"C" + bytes(address[1:])
+
+def _control_frame(kind, level, epoch):
+    return bytes([LINK_CONTROL_MARKER, kind, level, epoch])
+
+# 프레임 하나를 보내는 데 걸리는 평균 시간으로 계산한 실효 처리량 (바이트/초)
+def _goodput(profile, success, mean_arc):
+    bps = DATA_RATE_BPS[profile.data_rate]
+    attempt = _TX_SETTLE + _FRAME_BITS / bps
+    retry = (profile.retry_delay + 1) * 250e-6 + _FRAME_BITS / bps
+    ack = _TX_SETTLE + _ACK_BITS / bps
+    return 32 * success / (attempt + ack + mean_arc * retry)
+
+def apply_link_profile(radio, profile, transmitter=True):
+    radio.setDataRate(profile.data_rate)
+    radio.setPALevel(profile.pa_level)
+    if transmitter:
+        radio.setRetries(profile.retry_delay, profile.retry_count)
+
+class LinkTuner:
+    # radio: 송신 라디오, data_address: 평소 openWritingPipe 에 쓰는 주소
+    # on_change(이전 단계, 새 단계, 이유) 를 주면 단계가 바뀔 때마다 호출
+    def __init__(self, radio, data_address, profiles=LINK_PROFILES, start=LINK_DEFAULT_PROFILE, window=64, up_windows=3,
+                 hold=2.0, fail_down=0.02, arc_down=2.0, fail_up=0.005, arc_up=0.5, probe_margin=0.05, confirm_timeout=0.2,
+                 rendezvous_timeout=5.0, on_change=None):
+        self.radio = radio
+        self.data_address = bytes(data_address)
+        self.control_address = link_control_address(data_address)
+        self.profiles = tuple(profiles)
+        self.start = start
+        self.window = window
+        self.up_windows = up_windows
+        self.hold = hold
+        self.fail_down = fail_down
+        self.arc_down = arc_down
+        self.fail_up = fail_up
+        self.arc_up = arc_up
+        self.probe_margin = probe_margin
+        self.confirm_timeout = confirm_timeout
+        self.rendezvous_timeout = rendezvous_timeout  # LinkFollower 와 같은 값이어야 함
+        self.on_change = on_change
+
+        self.level = start
+        self._epoch = 0
+        self._changed_at = time.monotonic()
+        self._last_success = self._changed_at
+        self._consecutive_failures = 0
+        self._target = None  # 다음 poll 에서 바꿀 단계
+        self._good_windows = 0
+        self._probe_from = None  # 올리기 전 단계의 (번호, 처리량)
+        self._blocked = [0.0] * len(self.profiles)  # 단계별 다시 올릴 수 있는 시각
+        self._backoff = [hold] * len(self.profiles)
+        self._reset_window()
+
+        self.switches = 0
+        self.failed_handshakes = 0
+        self.last_goodput = 0.0
+
+    def _reset_window(self):
+        self._frames = 0
+        self._failures = 0
+        self._arc_sum = 0
+
+    # 현재 설정
+    @property
+    def profile(self):
+        return self.profiles[self.level]
+
+    # 프레임 하나의 결과 (ok: write 성공 여부, arc: getARC())
+    def record(self, ok, arc):
+        now = time.monotonic()
+        self._frames += 1
+        self._arc_sum += arc
+        if ok:
+            self._consecutive_failures = 0
+            self._last_success = now
+        else:
+            self._failures += 1
+            self._consecutive_failures += 1
+            # 오래 쉬는 동안 수신 측이 시작 단계로 돌아갔으면 바로 따라감
+            if self.level != self.start and self._consecutive_failures >= 3 and now - self._last_success > self.rendezvous_timeout:
+                self._set_level(self.start, "rendezvous")
+                return
+        if self._frames >= self.window:
+            self._evaluate(now)
+
+    def _evaluate(self, now):
+        fail = self._failures / self._frames
+        arc = self._arc_sum / self._frames
+        goodput = self.last_goodput = _goodput(self.profile, 1 - fail, arc)
+        self._reset_window()
+
+        if self._probe_from is not None:
+            previous, previous_goodput = self._probe_from
+            self._probe_from = None
+            if goodput < previous_goodput * (1 - self.probe_margin):
+                # 올려 봤더니 더 느림: 되돌리고 이 단계는 점점 오래 막음
+                self._blocked[self.level] = now + self._backoff[self.level]
+                self._backoff[self.level] = min(self._backoff[self.level] * 2, 300.0)
+                self._target = previous
+                return
+
+        if fail > self.fail_down or arc > self.arc_down:
+            self._good_windows = 0
+            if self.level > 0:
+                self._target = self.level - 1
+            return
+        if fail <= self.fail_up and arc <= self.arc_up:
+            self._good_windows += 1
+            up = self.level + 1
+            if (up < len(self.profiles) and self._good_windows >= self.up_windows
+                    and now - self._changed_at >= self.hold and now >= self._blocked[up]):
+                self._probe_from = (self.level, goodput)
+                self._target = up
+        else:
+            self._good_windows = 0
+
+    # 바꿀 단계가 정해졌으면 handshake 후 변경 (송신 FIFO 가 빈 상태에서 호출, flush 를 주면 먼저 호출)
+    # 단계가 바뀌었으면 True
+    def poll(self, flush=None):
+        target = self._target
+        if target is None:
+            return False
+        self._target = None
+        if flush is not None:
+            flush()
+        return self.switch(target)
+
+    # handshake 로 target 단계로 변경
+    def switch(self, target, reason="tuning"):
+        radio = self.radio
+        previous = self.level
+        self._epoch = (self._epoch + 1) & 0xFF
+        radio.openWritingPipe(self.control_address)
+        try:
+            if not radio.write(_control_frame(LINK_PROPOSE, target, self._epoch)):
+                self.failed_handshakes += 1
+                self._probe_from = None
+                return False
+            apply_link_profile(radio, self.profiles[target])
+            deadline = time.monotonic() + self.confirm_timeout
+            while not radio.write(_control_frame(LINK_CONFIRM, target, self._epoch)):
+                if time.monotonic() >= deadline:
+                    apply_link_profile(radio, self.profiles[previous])
+                    self.failed_handshakes += 1
+                    self._probe_from = None
+                    return False
+        finally:
+            radio.openWritingPipe(self.data_address)
+        self._set_level(target, reason, apply=False)
+        return True
+
+    def _set_level(self, level, reason, apply=True):
+        previous = self.level
+        if apply:
+            apply_link_profile(self.radio, self.profiles[level])
+        self.level = level
+        self._changed_at = time.monotonic()
+        self._good_windows = 0
+        self._target = None
+        self._reset_window()
+        if reason != "tuning":
+            self._probe_from = None
+        self.switches += 1
+        if self.on_change is not None:
+            self.on_change(previous, level, reason)
+
+class LinkFollower:
+    # radio: 수신 라디오, data_address: pipe 1 주소 (제어 파이프는 pipe 2 에 추가로 엶)
+    def __init__(self, radio, data_address, profiles=LINK_PROFILES, start=LINK_DEFAULT_PROFILE, confirm_timeout=0.5,
+                 rendezvous_timeout=5.0, on_change=None):
+        self.radio = radio
+        self.profiles = tuple(profiles)
+        self.start = start
+        self.confirm_timeout = confirm_timeout
+        self.rendezvous_timeout = rendezvous_timeout
+        self.on_change = on_change
+        radio.openReadingPipe(LINK_CONTROL_PIPE, link_control_address(data_address))
+
+        self.level = start
+        self._pending = None  # (단계, epoch, 이전 단계, 기한)
+        self.last_rx = time.monotonic()
+        self.switches = 0
+
+    # 데이터 프레임을 받을 때마다 호출
+    def on_frame(self):
+        self.last_rx = time.monotonic()
+
+    # 제어 파이프로 받은 프레임
+    def on_control(self, frame):
+        self.last_rx = now = time.monotonic()
+        if len(frame) < 4 or frame[0] != LINK_CONTROL_MARKER or frame[2] >= len(self.profiles):
+            return
+        kind, level, epoch = frame[1], frame[2], frame[3]
+        if kind == LINK_PROPOSE:
+            if self._pending is not None and self._pending[1] == epoch:
+                return  # 같은 PROPOSE 의 재전송
+            previous = self._pending[2] if self._pending is not None else self.level
+            self._pending = (level, epoch, previous, now + self.confirm_timeout)
+            self._apply(level, "propose")
+        elif kind == LINK_CONFIRM and self._pending is not None and self._pending[:2] == (level, epoch):
+            self._pending = None
+
+    # 주기적으로 호출: CONFIRM 이 안 오면 되돌리고, 오래 조용하면 시작 단계로
+    def poll(self):
+        now = time.monotonic()
+        if self._pending is not None and now >= self._pending[3]:
+            previous = self._pending[2]
+            self._pending = None
+            self._apply(previous, "unconfirmed")
+        elif self.level != self.start and now - self.last_rx > self.rendezvous_timeout:
+            self._apply(self.start, "rendezvous")
+
+    def _apply(self, level, reason):
+        if level == self.level:
+            return
+        previous = self.level
+        apply_link_profile(self.radio, self.profiles[level], transmitter=False)
+        self.level = level
+        self.switches += 1
+        if self.on_change is not None:
+            self.on_change(previous, level, reason)
+
+#########################################################################################
+#
+# 작은 패킷 모으기 (frame aggregation)
+# 패킷마다 새 프레임을 시작하지 않고 여러 패킷(과 앞 패킷의 꼬리)을 이어 붙여 32바이트 프레임을 꽉 채워 보냄
+# 다 차지 않은 마지막 프레임은 max_delay 초까지 다음 패킷을 기다렸다가 보냄
+# CCSDS 패킷은 헤더의 길이로 스스로 구분되므로 수신 측은 스트림 재조립기로 그대로 분리
+# 부분 프레임은 dynamic payload 로 실제 길이만 보내야 함 (고정 길이면 0x00 패딩이 다음 패킷처럼 보임)
+#
+#########################################################################################
+
+class FrameAggregator:
+    # send_frame(frame): 프레임 하나 송신 (radio.write 또는 PipelinedTransmitter.send)
+    def __init__(self, send_frame, max_delay=0.005, frame_size=32):
+        self.send_frame = send_frame
+        self.max_delay = max_delay
+        self.frame_size = frame_size
+        self._buf = bytearray()
+        self._since = None  # 부분 프레임이 기다리기 시작한 시각
+
+        self.packets = 0
+        self.frames = 0
+        self.partial_frames = 0  # 시간 초과로 다 채우지 못하고 보낸 프레임
+
+    # 대기 중인 바이트 수
+    @property
+    def pending(self):
+        return len(self._buf)
+
+    # 패킷을 이어 붙이고 꽉 찬 프레임을 송신, 보낸 프레임 수를 돌려줌
+    def add(self, packet):
+        buf = self._buf
+        frame_size = self.frame_size
+        self.packets += 1
+        if not buf:
+            self._since = time.monotonic()
+        buf += packet
+        sent = len(buf) // frame_size
+        if sent:
+            end = sent * frame_size
+            for offset in range(0, end, frame_size):
+                self.send_frame(bytes(buf[offset:offset + frame_size]))
+            del buf[:end]
+            self.frames += sent
+            # 남은 꼬리는 지금부터 기다림
+            self._since = time.monotonic() if buf else None
+        return sent
+
+    # 기다린 시간이 max_delay 를 넘었으면 부분 프레임을 송신, 보낸 프레임 수를 돌려줌
+    def poll(self):
+        if self._since is None or time.monotonic() - self._since < self.max_delay:
+            return 0
+        return self.flush()
+
+    # 부분 프레임을 바로 송신
+    def flush(self):
+        if not self._buf:
+            return 0
+        self.send_frame(bytes(self._buf))
+        self._buf.clear()
+        self._since = None
+        self.frames += 1
+        self.partial_frames += 1
+        return 1
+
+    # 부분 프레임을 보내야 할 때까지 남은 시간, 대기 중인 데이터가 없으면 None
+    def timeout(self):
+        if self._since is None:
+            return None
+        return max(self._since + self.max_delay - time.monotonic(), 0.0)
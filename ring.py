@@ -0,0 +1,424 @@
+import os
+import time
+import struct
+import select
+import argparse
+import threading
+import multiprocessing
+from queue import Queue
+from multiprocessing import shared_memory
+
+###############################################################
+# 단일 생산자 / 단일 소비자 (SPSC) 링 버퍼
+# 브리지 단계 사이에서 queue.Queue 대신 사용
+#  - put/get 마다 잠금과 조건 변수를 잡지 않음: 쓰는 위치(head)는 생산자만, 읽는 위치(tail)는 소비자만 바꿈
+#  - 패킷을 객체로 쌓지 않고 연속된 버퍼 하나에 [길이 u32] [데이터] 레코드로 복사 (메모리 사용량 고정)
+#  - put_batch / get_batch 는 레코드 여러 개를 쓰고 읽은 뒤 위치를 한 번만 갱신
+# 비었을 때/가득 찼을 때만 Event 로 잠들고, 상대편은 잠든 쪽이 있을 때만 깨움
+#
+# 버퍼: [헤더 64바이트] [데이터 capacity 바이트]
+#  헤더 (u64 8개): head, tail, 읽는 쪽 대기 중, 쓰는 쪽 대기 중, 쓴 레코드 수, 읽은 레코드 수
+#  head / tail 은 지금까지 쓰고 읽은 바이트 누적값 (데이터 위치는 capacity 로 나눈 나머지)
+#  레코드는 4바이트 단위로 맞추고, 끝까지 남은 자리에 들어가지 않으면 WRAP 표시를 쓰고 처음부터 씀
+# 레코드를 다 쓴 뒤 head 를 갱신하므로 소비자는 완성된 레코드만 봄
+#
+# SharedRing 은 같은 링을 shared_memory 위에 만들어 프로세스 사이에서 사용 (multiproc.py)
+#  - 알림은 eventfd (없으면 pipe) 로 보내므로 상대 프로세스가 select 로 잠들 수 있음
+#  - 한 프로세스 안에서는 GIL 이 저장 순서를 보장하지만, 다른 코어의 프로세스는 라즈베리 파이(ARM)처럼
+#    저장 순서를 바꾸는 CPU 에서 head 갱신을 레코드보다 먼저 볼 수 있으므로
+#    head / tail / 대기 표시를 읽고 쓰는 순간에만 프로세스 간 잠금(fence)을 잡아 메모리 장벽으로 사용
+#    (레코드 복사는 잠금 밖에서 하므로 잠금을 잡는 시간은 정수 하나 쓰는 동안뿐)
+###############################################################
+
+HEADER_SIZE = 64
+RECORD_ALIGN = 4
+RING_CAPACITY = 256 * 1024
+WRAP = 0xFFFFFFFF  # 이 자리부터 버퍼 끝까지 비어 있음
+
+_HEAD, _TAIL, _READER_WAITING, _WRITER_WAITING, _WRITTEN, _READ = range(6)
+_LENGTH = struct.Struct("<I")
+_pack_length = _LENGTH.pack_into
+
+# length 바이트 패킷이 차지하는 레코드 크기
+def record_size(length):
+    return (_LENGTH.size + length + RECORD_ALIGN - 1) & ~(RECORD_ALIGN - 1)
+
+# capacity 바이트 데이터 영역을 가진 링에 필요한 버퍼 크기
+def buffer_size(capacity):
+    return HEADER_SIZE + capacity
+
+class RingBuffer:
+    # capacity: 데이터 영역 바이트 수 (4 의 배수로 내림)
+    # buffer: 헤더와 데이터 영역을 담을 쓰기 가능한 버퍼 (없으면 bytearray 를 새로 만듦)
+    #         이미 쓰던 버퍼를 주면 헤더의 위치를 이어서 사용
+    # readable / writable: set/clear/wait 가 있는 알림 객체 (없으면 threading.Event)
+    # fence: 위치를 읽고 쓸 때 잡을 잠금 (프로세스 사이에서 쓸 때만, 위 설명 참고)
+    def __init__(self, capacity=RING_CAPACITY, buffer=None, readable=None, writable=None, fence=None):
+        if buffer is None:
+            buffer = bytearray(buffer_size(capacity))
+        self._view = memoryview(buffer)
+        self.capacity = (len(self._view) - HEADER_SIZE) & ~(RECORD_ALIGN - 1)
+        if self.capacity < 2 * RECORD_ALIGN + 2 * _LENGTH.size:
+            raise ValueError(f"ring buffer too small: {len(self._view)} bytes")
+        self._index = self._view[:HEADER_SIZE].cast("Q")
+        self._data = self._view[HEADER_SIZE:HEADER_SIZE + self.capacity]
+        self.readable = readable if readable is not None else threading.Event()
+        self.writable = writable if writable is not None else threading.Event()
+        self._fence = fence
+
+        # 자기 쪽 위치는 헤더를 다시 읽지 않도록 따로 보관
+        self._head = self._index[_HEAD]
+        self._tail = self._index[_TAIL]
+        self._tail_seen = self._tail  # 생산자가 마지막으로 읽은 tail (자리가 모자랄 때만 다시 읽음)
+        self._written = self._index[_WRITTEN]
+        self._read = self._index[_READ]
+        self._pending = 0  # 쓰고 아직 공개하지 않은 레코드 수
+
+        self.full = 0  # 자리가 없어서 넣지 못한 패킷 수 (생산자 쪽)
+
+    # 대기 중인 레코드 수 / 바이트 (어느 쪽에서 읽어도 되는 근삿값)
+    def qsize(self):
+        return self._index[_WRITTEN] - self._index[_READ]
+
+    def qbytes(self):
+        return self._index[_HEAD] - self._index[_TAIL]
+
+    def empty(self):
+        return self._index[_HEAD] == self._index[_TAIL]
+
+    # 넣을 수 있는 가장 긴 패킷 (레코드가 데이터 영역의 절반 이하면 비었을 때 언제나 들어감)
+    def max_packet(self):
+        return self.capacity // 2 - _LENGTH.size
+
+    # 버퍼에 대한 memoryview 를 놓음 (shared_memory 를 닫기 전에)
+    def close(self):
+        self._index.release()
+        self._data.release()
+        self._view.release()
+
+    # 위치 읽기 / 쓰기 (fence 가 있으면 잠금 안에서)
+    def _load(self, slot):
+        if self._fence is None:
+            return self._index[slot]
+        with self._fence:
+            return self._index[slot]
+
+    # 위치를 쓰고 상대편이 잠들어 있는지 돌려줌
+    def _store(self, slot, value, waiting_slot):
+        index = self._index
+        if self._fence is None:
+            index[slot] = value
+            return index[waiting_slot]
+        with self._fence:
+            index[slot] = value
+            return index[waiting_slot]
+
+    # 대기 표시를 하고 상대편 위치를 다시 읽음
+    def _mark_waiting(self, waiting_slot, slot):
+        index = self._index
+        if self._fence is None:
+            index[waiting_slot] = 1
+            return index[slot]
+        with self._fence:
+            index[waiting_slot] = 1
+            return index[slot]
+
+    #################################################################################
+    # 생산자
+    #################################################################################
+
+    # 패킷 하나를 넣음, 자리가 없으면 False
+    # publish=False 면 복사만 하고 소비자에게는 publish() 를 부를 때 한꺼번에 보임
+    # (재사용 버퍼의 memoryview 처럼 모아 둘 수 없는 패킷을 묶음으로 넣을 때)
+    def put(self, packet, publish=True):
+        if not self._write(packet):
+            self.full += 1
+            return False
+        self._pending += 1
+        if publish:
+            self.publish()
+        return True
+
+    # 앞에서부터 들어가는 만큼 넣고 넣은 패킷 수를 돌려줌 (head 는 마지막에 한 번만 갱신)
+    def put_batch(self, packets):
+        count = 0
+        for packet in packets:
+            if not self._write(packet):
+                self.full += 1
+                break
+            count += 1
+        self._pending += count
+        self.publish()
+        return count
+
+    # 넣어 둔 레코드를 소비자에게 보이고, 소비자가 잠들어 있으면 깨움
+    def publish(self):
+        if not self._pending:
+            return
+        self._written += self._pending
+        self._pending = 0
+        self._index[_WRITTEN] = self._written
+        if self._store(_HEAD, self._head, _READER_WAITING):
+            self.readable.set()
+
+    # size 바이트 패킷이 들어갈 자리가 생길 때까지 최대 timeout 초 대기
+    def wait_writable(self, size, timeout=None):
+        if self._space_for(size):
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.writable.clear()
+        self._tail_seen = self._mark_waiting(_WRITER_WAITING, _TAIL)
+        try:
+            while not self._space_for(size):
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                self.writable.wait(remaining)
+                self.writable.clear()
+            return True
+        finally:
+            self._index[_WRITER_WAITING] = 0
+
+    # 레코드를 쓰되 head 는 아직 공개하지 않음
+    def _write(self, packet):
+        size = len(packet)
+        need = (size + 7) & ~3  # record_size(size)
+        capacity = self.capacity
+        if need > capacity >> 1:
+            raise ValueError(f"packet of {size} bytes is too large for a {capacity} byte ring")
+        head = self._head
+        position = head % capacity
+        skip = capacity - position if position + need > capacity else 0
+        if head + skip + need - self._tail_seen > capacity:
+            self._tail_seen = self._load(_TAIL)
+            if head + skip + need - self._tail_seen > capacity:
+                return False
+        data = self._data
+        if skip:
+            _pack_length(data, position, WRAP)
+            position = 0
+        _pack_length(data, position, size)
+        data[position + 4:position + 4 + size] = packet
+        self._head = head + skip + need
+        return True
+
+    def _space_for(self, size):
+        need = record_size(size)
+        position = self._head % self.capacity
+        skip = self.capacity - position if position + need > self.capacity else 0
+        if self._head + skip + need - self._tail_seen <= self.capacity:
+            return True
+        self._tail_seen = self._load(_TAIL)
+        return self._head + skip + need - self._tail_seen <= self.capacity
+
+    #################################################################################
+    # 소비자
+    #################################################################################
+
+    # 다음 패킷 (bytes), 비었으면 None
+    def get(self):
+        packets = self.get_batch(1)
+        return packets[0] if packets else None
+
+    # 최대 max_records 개 패킷을 꺼냄 (tail 은 마지막에 한 번만 갱신)
+    def get_batch(self, max_records=None):
+        tail = self._tail
+        head = self._load(_HEAD)
+        if tail == head:
+            return []
+        data = self._data
+        capacity = self.capacity
+        unpack = _LENGTH.unpack_from
+        limit = max_records if max_records is not None else -1
+        packets = []
+        while tail != head:
+            position = tail % capacity
+            (size,) = unpack(data, position)
+            if size == WRAP:
+                tail += capacity - position
+                continue
+            packets.append(bytes(data[position + 4:position + 4 + size]))
+            tail += (size + 7) & ~3  # record_size(size)
+            if len(packets) == limit:
+                break
+        self._tail = tail
+        self._read += len(packets)
+        self._index[_READ] = self._read
+        if self._store(_TAIL, tail, _WRITER_WAITING):
+            self.writable.set()
+        return packets
+
+    # 읽을 패킷이 생길 때까지 최대 timeout 초 대기, 읽을 패킷이 있으면 True
+    def wait(self, timeout=None):
+        if self._index[_HEAD] != self._tail:
+            return True
+        # 대기 표시 뒤에 다시 확인하므로 그 사이에 들어온 패킷은 생산자가 깨워 줌
+        self.readable.clear()
+        try:
+            if self._mark_waiting(_READER_WAITING, _HEAD) != self._tail:
+                return True
+            self.readable.wait(timeout)
+            return self._index[_HEAD] != self._tail
+        finally:
+            self._index[_READER_WAITING] = 0
+
+    # 패킷이 올 때까지 기다렸다가 꺼냄 (timeout 이 지나면 빈 목록)
+    def get_wait(self, max_records=None, timeout=None):
+        packets = self.get_batch(max_records)
+        if packets or not self.wait(timeout):
+            return packets
+        return self.get_batch(max_records)
+
+# 링에서 패킷을 batch 개씩 꺼내 handler 로 넘김 (비었으면 잠들어 기다림)
+def drain_ring(ring, handler, batch=32):
+    while True:
+        for packet in ring.get_wait(batch):
+            handler(packet)
+
+#########################################################################################
+#
+# 프로세스 사이의 링
+#
+#########################################################################################
+
+# 다른 프로세스를 깨우는 알림 (threading.Event 와 같은 set/clear/wait)
+# eventfd 가 있으면 eventfd, 없으면 pipe 를 사용
+class FdNotifier:
+    def __init__(self):
+        if hasattr(os, "eventfd"):
+            self._read_fd = self._write_fd = os.eventfd(0, os.EFD_NONBLOCK)
+        else:
+            self._read_fd, self._write_fd = os.pipe()
+            os.set_blocking(self._read_fd, False)
+            os.set_blocking(self._write_fd, False)
+
+    def fileno(self):
+        return self._read_fd
+
+    def set(self):
+        try:
+            if self._read_fd == self._write_fd:
+                os.eventfd_write(self._write_fd, 1)
+            else:
+                os.write(self._write_fd, b"\x01")
+        except BlockingIOError:
+            pass  # 이미 깨울 신호가 쌓여 있음
+
+    def clear(self):
+        try:
+            while os.read(self._read_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def wait(self, timeout=None):
+        readable, _, _ = select.select((self._read_fd,), (), (), timeout)
+        return bool(readable)
+
+    def close(self):
+        os.close(self._read_fd)
+        if self._write_fd != self._read_fd:
+            os.close(self._write_fd)
+
+# shared_memory 위의 링 버퍼
+# fork 하기 전에 만들면 생산자/소비자 프로세스가 같은 객체(.ring)를 물려받아 사용
+# (한쪽 프로세스는 넣기만, 다른 쪽은 꺼내기만 해야 함)
+class SharedRing:
+    def __init__(self, capacity=RING_CAPACITY):
+        self._memory = shared_memory.SharedMemory(create=True, size=buffer_size(capacity))
+        self._memory.buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        self._notifiers = (FdNotifier(), FdNotifier())
+        self.ring = RingBuffer(capacity, self._memory.buf, *self._notifiers, fence=multiprocessing.Lock())
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    # 만든 프로세스에서 마지막에 한 번 호출 (공유 메모리 삭제)
+    def close(self):
+        self.ring.close()
+        for notifier in self._notifiers:
+            notifier.close()
+        self._memory.close()
+        self._memory.unlink()
+
+#########################################################################################
+#
+# Queue 와 비교하는 측정
+#
+#########################################################################################
+
+def _sample_packets(size, count):
+    return [bytes([i & 0xFF]) * size for i in range(count)]
+
+# 생산자 스레드가 count 개를 넣고 소비자 스레드가 다 꺼낼 때까지 걸린 시간
+def _run(produce, consume, count):
+    consumer = threading.Thread(target=consume, args=(count,))
+    started = time.perf_counter()
+    consumer.start()
+    produce()
+    consumer.join()
+    return time.perf_counter() - started
+
+def _queue_case(packets, batch):
+    queue = Queue()
+
+    def produce():
+        for packet in packets:
+            queue.put(packet)
+
+    def consume(count):
+        for _ in range(count):
+            queue.get()
+
+    return produce, consume
+
+def _ring_case(packets, batch, capacity):
+    ring = RingBuffer(capacity)
+
+    def produce():
+        for start in range(0, len(packets), batch):
+            pending = packets[start:start + batch]
+            while pending:
+                written = ring.put_batch(pending) if batch > 1 else int(ring.put(pending[0]))
+                pending = pending[written:]
+                if pending:
+                    ring.wait_writable(len(pending[0]))
+
+    def consume(count):
+        while count:
+            count -= len(ring.get_wait(batch))
+
+    return produce, consume
+
+def benchmark(sizes=(32, 64, 128, 256, 512, 1024), count=50000, batch=32, capacity=RING_CAPACITY, repeat=3):
+    results = []
+    for size in sizes:
+        packets = _sample_packets(size, count)
+        cases = (("queue", lambda: _queue_case(packets, 1)),
+                 ("ring", lambda: _ring_case(packets, 1, capacity)),
+                 (f"ring x{batch}", lambda: _ring_case(packets, batch, capacity)))
+        for name, case in cases:
+            elapsed = min(_run(*case(), count) for _ in range(repeat))
+            results.append({"size": size, "scheme": name, "packets_per_s": count / elapsed, "mb_per_s": count * size / elapsed / 1e6})
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="SPSC ring buffer benchmark against queue.Queue (one producer and one consumer thread)")
+    parser.add_argument("--sizes", default="32,64,128,256,512,1024", help="comma separated packet sizes in bytes")
+    parser.add_argument("--count", type=int, default=50000, help="packets per size")
+    parser.add_argument("--batch", type=int, default=32, help="records per put_batch / get_batch")
+    parser.add_argument("--capacity", type=int, default=RING_CAPACITY, help="ring data area in bytes")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    print(f"{'size':>5} {'scheme':>9} {'packets/s':>11} {'MB/s':>8}")
+    for row in benchmark(sizes, args.count, args.batch, args.capacity):
+        print(f"{row['size']:>5} {row['scheme']:>9} {row['packets_per_s']:>11.0f} {row['mb_per_s']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import os
+import json
+import threading
+from array import array
+from ccsds import APID_COUNT
+from eventlog import get_logger
+
+###############################################################
+# APID 라우팅 테이블
+# 패킷마다 APID 로 2048 칸 조회표를 한 번 찾아서 처리 방법을 결정
+#  - forward : 기본 목적지로 전달
+#  - drop    : 버림 (예: TBL, EVS)
+#  - port    : 지정한 UDP 포트로 전달
+#  - channel : 지정한 라디오 채널로 송신
+# 규칙 파일(JSON)을 고치면 실행 중에도 다시 읽어서 반영 (hot-reload)
+###############################################################
+
+ROUTE_FORWARD = 0
+ROUTE_DROP = 1
+ROUTE_PORT = 2
+ROUTE_CHANNEL = 3
+
+log = get_logger("routing")
+
+_ACTION_NAMES = {
+    "forward": ROUTE_FORWARD,
+    "drop": ROUTE_DROP,
+    "port": ROUTE_PORT,
+    "channel": ROUTE_CHANNEL,
+}
+
+# 패킷 첫 두 바이트에서 APID 추출
+def packet_apid(packet):
+    return (packet[0] & 0x07) << 8 | packet[1]
+
+# 규칙 하나를 (action, 인자) 로 변환
+# "forward" / "drop" / {"port": 1240} / {"channel": 90}
+def _parse_rule(rule):
+    if isinstance(rule, str):
+        if rule not in ("forward", "drop"):
+            raise ValueError(f"unknown route action: {rule!r}")
+        return _ACTION_NAMES[rule], 0
+    if isinstance(rule, dict) and len(rule) == 1:
+        (name, value), = rule.items()
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f"invalid route rule: {rule!r}")
+        if name == "port" and 0 < value <= 0xFFFF:
+            return ROUTE_PORT, value
+        if name == "channel" and 0 <= value <= 125:
+            return ROUTE_CHANNEL, value
+    raise ValueError(f"invalid route rule: {rule!r}")
+
+class RoutingTable:
+    # rules: {APID: 규칙}, APID 는 정수 또는 "0x081" 같은 문자열
+    def __init__(self, rules=None, default="forward"):
+        self.path = None
+        self._mtime = None
+        self._watcher = None
+        self.load(rules or {}, default)
+
+    # 규칙 파일에서 생성
+    @classmethod
+    def from_file(cls, path):
+        table = cls()
+        table.load_file(path)
+        return table
+
+    # 규칙 파일을 읽어서 이후 reload 대상으로 지정
+    def load_file(self, path):
+        self.path = path
+        self.reload()
+
+    # 새 조회표를 만든 뒤 한 번에 교체 (송수신 스레드는 잠금 없이 계속 조회)
+    def load(self, rules, default="forward"):
+        default_action, default_arg = _parse_rule(default)
+        actions = bytearray([default_action]) * APID_COUNT
+        args = array("H", [default_arg]) * APID_COUNT
+        for apid, rule in rules.items():
+            if isinstance(apid, str):
+                apid = int(apid, 0)
+            if not 0 <= apid < APID_COUNT:
+                raise ValueError(f"APID out of range: {apid}")
+            actions[apid], args[apid] = _parse_rule(rule)
+        self._table = (actions, args)
+
+    # 규칙 파일 다시 읽기: {"default": "forward", "apids": {"0x001": "drop", ...}}
+    def reload(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path) as f:
+            config = json.load(f)
+        self.load(config.get("apids", {}), config.get("default", "forward"))
+        self._mtime = mtime
+
+    # 파일이 바뀌었으면 다시 읽음, 잘못된 파일이면 기존 규칙 유지
+    def reload_if_changed(self):
+        mtime = None
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return False
+            self.reload()
+        except (OSError, ValueError) as e:
+            log.error("routing_reload_failed", path=self.path, error=e)
+            self._mtime = mtime  # 같은 잘못된 파일을 반복해서 읽지 않음
+            return False
+        log.info("routing_reloaded", path=self.path)
+        return True
+
+    # 백그라운드에서 주기적으로 파일 변경 확인
+    def watch(self, interval=1.0):
+        if self.path is None or self._watcher is not None:
+            return
+        def run():
+            while not stop.wait(interval):
+                self.reload_if_changed()
+        stop = threading.Event()
+        self._watcher = stop
+        threading.Thread(target=run, daemon=True).start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.set()
+            self._watcher = None
+
+    # 패킷 처리 방법: (action, 인자)
+    def route(self, packet):
+        actions, args = self._table
+        apid = (packet[0] & 0x07) << 8 | packet[1]
+        return actions[apid], args[apid]
+
+    # 버릴 패킷인지 (목적지 정보가 필요 없는 경로용)
+    def is_dropped(self, packet):
+        return self._table[0][(packet[0] & 0x07) << 8 | packet[1]] == ROUTE_DROP
@@ -0,0 +1,359 @@
+import time
+import threading
+from collections import deque
+from ccsds import APID_COUNT
+
+###############################################################
+# 상향 링크 우선순위 스케줄러
+# UDP 수신과 무선 송신(send_to_arduino / radio_tx.write) 사이에서
+# APID 별 등급(class)으로 나눠 대기시키고, 등급마다 토큰 버킷으로 점유 시간을 제한
+#  - strict   : 우선순위 숫자가 작은 등급을 항상 먼저
+#  - weighted : 가중치에 비례해서 바이트 단위로 나눠 보냄 (deficit round robin)
+# max_packets / max_bytes 로 대기열 전체를 제한하면 넘칠 때 overflow 정책을 적용
+#  - block       : 자리가 날 때까지 put 이 대기 (timeout 이 지나면 새 패킷을 버림)
+#  - drop_oldest : 가장 오래 기다린 패킷부터 버림
+#  - drop_newest : 새 패킷을 버림
+#  - drop_lowest : 우선순위가 가장 낮은 등급의 오래된 패킷부터 버림 (새 패킷보다 높은 등급은 건드리지 않음)
+# 사용률(패킷 수 / 바이트 중 큰 쪽)이 high_water 를 넘으면 경고, low_water 아래로 내려오면 해제
+###############################################################
+
+FRAME_SIZE = 32  # 무선 프레임 크기, 토큰은 실제로 차지하는 프레임 바이트로 계산
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest", "drop_lowest")
+
+# 패킷이 차지하는 무선 프레임 바이트 수
+def airtime_bytes(packet):
+    return -(-len(packet) // FRAME_SIZE) * FRAME_SIZE
+
+class TokenBucket:
+    # rate: 초당 바이트, burst: 최대 누적 바이트
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    # 토큰이 충분하면 차감하고 0, 모자라면 기다려야 할 시간(초)
+    # burst 보다 큰 패킷은 버킷이 가득 찼을 때 보내고 빚(음수 토큰)으로 처리
+    def take(self, size, now):
+        self._refill(now)
+        if self.tokens >= min(size, self.burst):
+            self.tokens -= size
+            return 0.0
+        return (min(size, self.burst) - self.tokens) / self.rate
+
+# 트래픽 등급
+class TrafficClass:
+    def __init__(self, name, priority=0, weight=1, rate=None, burst=None):
+        self.name = name
+        self.priority = priority  # strict 정책에서 작을수록 먼저
+        self.weight = weight  # weighted 정책에서 나눠 받는 비율
+        self.bucket = TokenBucket(rate, burst) if rate is not None else None
+
+        self.queue = deque()  # (패킷, 넣은 시각)
+        self.queued_bytes = 0
+        self.sent_packets = 0
+        self.sent_bytes = 0
+        self.dropped_packets = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.deficit = 0  # weighted 정책에서 이번 차례에 보낼 수 있는 바이트
+
+    # 등급별 상태 (대기 패킷/바이트, 대기 시간)
+    def stats(self):
+        return {
+            "depth": len(self.queue),
+            "queued_bytes": self.queued_bytes,
+            "sent_packets": self.sent_packets,
+            "sent_bytes": self.sent_bytes,
+            "dropped_packets": self.dropped_packets,
+            "avg_wait": self.total_wait / self.sent_packets if self.sent_packets else 0.0,
+            "max_wait": self.max_wait,
+            "oldest_wait": time.monotonic() - self.queue[0][1] if self.queue else 0.0,
+        }
+
+class PriorityScheduler:
+    # classes: TrafficClass 목록, apid_classes: {APID: 등급 이름}
+    # 매핑이 없는 APID 는 default 등급(없으면 첫 번째 등급)으로 감
+    # observe_wait(초, 등급 이름) 을 주면 패킷을 꺼낼 때마다 대기 시간을 알려줌
+    # max_packets / max_bytes: 대기열 전체 한도 (None 이면 제한 없음), 넘치면 overflow 정책 적용
+    # on_drop(패킷, 등급 이름, 이유) 는 한도 때문에 버린 패킷마다, on_alarm(경고 중인지, 패킷 수, 바이트) 는 경고 상태가 바뀔 때 호출
+    # (두 함수 모두 잠금을 잡은 채로 호출하므로 스케줄러를 다시 부르면 안 됨)
+    def __init__(self, classes=None, apid_classes=None, policy="strict", default=None, cost=airtime_bytes, quantum=256, observe_wait=None,
+                 max_packets=None, max_bytes=None, overflow="block", high_water=0.8, low_water=0.5, on_drop=None, on_alarm=None):
+        if policy not in ("strict", "weighted"):
+            raise ValueError(f"unknown scheduling policy: {policy!r}")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy: {overflow!r}")
+        if not 0 < low_water <= high_water <= 1:
+            raise ValueError(f"water marks must satisfy 0 < low_water <= high_water <= 1 (got {low_water}, {high_water})")
+        if not classes:
+            classes = [TrafficClass("default")]
+        self.classes = list(classes)
+        self.policy = policy
+        self.cost = cost
+        self.quantum = quantum  # weighted 정책에서 가중치 1 당 한 차례에 받는 바이트
+        self.observe_wait = observe_wait
+        self.max_packets = max_packets
+        self.max_bytes = max_bytes
+        self.overflow = overflow
+        self.high_water = high_water
+        self.low_water = low_water
+        self.on_drop = on_drop
+        self.on_alarm = on_alarm
+        self._bounded = max_packets is not None or max_bytes is not None
+
+        index = {c.name: i for i, c in enumerate(self.classes)}
+        default_index = index[default] if default is not None else 0
+        # APID -> 등급 번호 (2048 칸 조회표)
+        self._apid_table = bytearray([default_index]) * APID_COUNT
+        for apid, name in (apid_classes or {}).items():
+            if isinstance(apid, str):
+                apid = int(apid, 0)
+            self._apid_table[apid] = index[name]
+
+        # strict 정책에서 확인할 순서
+        self._order = sorted(self.classes, key=lambda c: c.priority)
+        self._turn = 0  # weighted 정책에서 차례인 등급
+        self._turn_started = False  # 차례인 등급이 이번 차례 몫을 받았는지
+        self._count = 0
+        self._bytes = 0
+        lock = threading.RLock()
+        self._cond = threading.Condition(lock)  # 꺼낼 패킷을 기다림
+        self._space = threading.Condition(lock)  # block 정책에서 자리를 기다림
+
+        self.alarm = False  # 사용률 경고 중인지
+        self.alarms = 0
+        self.peak_packets = 0
+        self.peak_bytes = 0
+        self.blocked = 0  # block 정책에서 put 이 기다린 횟수
+        self.dropped = {}  # 이유 -> 버린 패킷 수
+
+    # 패킷의 APID 로 등급을 정해서 대기열에 넣음
+    # 한도 때문에 넣지 못하면 False (block 정책은 timeout 초까지 기다림, 0 이면 기다리지 않음)
+    def put(self, packet, timeout=None):
+        traffic_class = self.classes[self._apid_table[(packet[0] & 0x07) << 8 | packet[1]]]
+        size = len(packet)
+        with self._cond:
+            if self._bounded and not self._make_room(packet, traffic_class, timeout):
+                return False
+            traffic_class.queue.append((packet, time.monotonic()))
+            traffic_class.queued_bytes += size
+            self._count += 1
+            self._bytes += size
+            self._cond.notify()
+            if self._bounded:
+                if self._count > self.peak_packets:
+                    self.peak_packets = self._count
+                if self._bytes > self.peak_bytes:
+                    self.peak_bytes = self._bytes
+                if not self.alarm and self._usage() >= self.high_water:
+                    self._set_alarm(True)
+        return True
+
+    def qsize(self):
+        return self._count
+
+    # 대기 중인 패킷의 바이트 합
+    def qbytes(self):
+        return self._bytes
+
+    def empty(self):
+        return self._count == 0
+
+    # 다음에 보낼 패킷, timeout 안에 보낼 수 있는 패킷이 없으면 None
+    def get(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                packet, wait = self._select(now)
+                if packet is not None:
+                    return packet
+                # 대기열이 비었으면 put 까지, 토큰이 모자라면 채워질 때까지 대기
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    # 기다리지 않고 확인: (패킷, None) 또는 (None, 토큰을 기다릴 시간 또는 None)
+    # 이벤트 루프처럼 직접 대기해야 하는 곳에서 사용
+    def poll(self):
+        with self._cond:
+            return self._select(time.monotonic())
+
+    # 보낼 패킷을 고름: (패킷, None) 또는 (None, 토큰을 기다릴 시간 또는 None)
+    def _select(self, now):
+        if self._count == 0:
+            return None, None
+        if self.policy == "weighted":
+            return self._select_weighted(now)
+        shortest = None
+        for traffic_class in self._order:
+            if not traffic_class.queue:
+                continue
+            wait = self._take_tokens(traffic_class, now)
+            if wait:
+                shortest = wait if shortest is None else min(shortest, wait)
+                continue
+            return self._pop(traffic_class, now), None
+        return None, shortest
+
+    # deficit round robin: 차례가 온 등급은 quantum * weight 바이트를 받고, 그만큼 보낸 뒤 다음 등급으로
+    def _select_weighted(self, now):
+        shortest = None
+        while True:
+            eligible = False  # 이번 한 바퀴에서 토큰 제한 없이 대기 중인 등급이 있었는지
+            for _ in range(len(self.classes)):
+                traffic_class = self.classes[self._turn]
+                if traffic_class.queue:
+                    if not self._turn_started:
+                        traffic_class.deficit += self.quantum * traffic_class.weight
+                        self._turn_started = True
+                    size = self.cost(traffic_class.queue[0][0])
+                    wait = self._take_tokens(traffic_class, now) if traffic_class.deficit >= size else None
+                    if wait == 0.0:
+                        traffic_class.deficit -= size
+                        return self._pop(traffic_class, now), None
+                    if wait is None:
+                        eligible = True
+                    else:
+                        shortest = wait if shortest is None else min(shortest, wait)
+                else:
+                    traffic_class.deficit = 0
+                self._turn = (self._turn + 1) % len(self.classes)
+                self._turn_started = False
+            if not eligible:
+                return None, shortest
+
+    # 토큰 버킷이 허락하면 0, 아니면 기다려야 할 시간
+    def _take_tokens(self, traffic_class, now):
+        if traffic_class.bucket is None:
+            return 0.0
+        return traffic_class.bucket.take(self.cost(traffic_class.queue[0][0]), now)
+
+    def _pop(self, traffic_class, now):
+        packet, queued_at = traffic_class.queue.popleft()
+        waited = now - queued_at
+        traffic_class.queued_bytes -= len(packet)
+        traffic_class.sent_packets += 1
+        traffic_class.sent_bytes += len(packet)
+        traffic_class.total_wait += waited
+        if waited > traffic_class.max_wait:
+            traffic_class.max_wait = waited
+        if self.observe_wait is not None:
+            self.observe_wait(waited, traffic_class.name)
+        self._count -= 1
+        self._bytes -= len(packet)
+        if self._bounded:
+            self._space.notify()
+            if self.alarm and self._usage() <= self.low_water:
+                self._set_alarm(False)
+        return packet
+
+    # 한도 대비 사용률 (패킷 수와 바이트 중 큰 쪽)
+    def _usage(self):
+        usage = self._count / self.max_packets if self.max_packets else 0.0
+        if self.max_bytes:
+            usage = max(usage, self._bytes / self.max_bytes)
+        return usage
+
+    def _fits(self, size):
+        return ((self.max_packets is None or self._count < self.max_packets) and
+                (self.max_bytes is None or self._bytes + size <= self.max_bytes))
+
+    # 새 패킷이 들어갈 자리를 만듦, 넣지 못하면 버린 것으로 기록하고 False
+    def _make_room(self, packet, traffic_class, timeout):
+        size = len(packet)
+        if self.max_bytes is not None and size > self.max_bytes:
+            self._dropped(packet, traffic_class, "too_large")
+            return False
+        if self.overflow == "block":
+            if self._fits(size):
+                return True
+            self.blocked += 1
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._fits(size):
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._dropped(packet, traffic_class, "full")
+                        return False
+                self._space.wait(remaining)
+            return True
+        while not self._fits(size):
+            victim = self._victim(traffic_class)
+            if victim is None:
+                self._dropped(packet, traffic_class, "full")
+                return False
+            evicted, _ = victim.queue.popleft()
+            victim.queued_bytes -= len(evicted)
+            self._count -= 1
+            self._bytes -= len(evicted)
+            self._dropped(evicted, victim, "evicted")
+        return True
+
+    # 새 패킷 대신 버릴 패킷이 있는 등급 (없으면 None: 새 패킷을 버림)
+    def _victim(self, incoming):
+        if self.overflow == "drop_newest":
+            return None
+        victim = None
+        for traffic_class in self.classes:
+            if not traffic_class.queue:
+                continue
+            if self.overflow == "drop_lowest":
+                if traffic_class.priority < incoming.priority:
+                    continue
+                if victim is not None and traffic_class.priority < victim.priority:
+                    continue
+                if victim is not None and traffic_class.priority > victim.priority:
+                    victim = traffic_class
+                    continue
+            # 같은 조건이면 가장 오래 기다린 패킷이 있는 등급
+            if victim is None or traffic_class.queue[0][1] < victim.queue[0][1]:
+                victim = traffic_class
+        return victim
+
+    def _dropped(self, packet, traffic_class, reason):
+        traffic_class.dropped_packets += 1
+        self.dropped[reason] = self.dropped.get(reason, 0) + 1
+        if self.on_drop is not None:
+            self.on_drop(packet, traffic_class.name, reason)
+
+    def _set_alarm(self, active):
+        self.alarm = active
+        if active:
+            self.alarms += 1
+        if self.on_alarm is not None:
+            self.on_alarm(active, self._count, self._bytes)
+
+    # 한도 사용 상태
+    def usage(self):
+        with self._cond:
+            return {
+                "packets": self._count,
+                "bytes": self._bytes,
+                "max_packets": self.max_packets,
+                "max_bytes": self.max_bytes,
+                "peak_packets": self.peak_packets,
+                "peak_bytes": self.peak_bytes,
+                "alarm": self.alarm,
+                "alarms": self.alarms,
+                "blocked": self.blocked,
+                "dropped": dict(self.dropped),
+            }
+
+    # 등급 이름 -> 대기 패킷 수 (잠금 없이 읽음, 측정값 수집용)
+    def depths(self):
+        return {c.name: len(c.queue) for c in self.classes}
+
+    # 등급 이름 -> 상태
+    def stats(self):
+        with self._cond:
+            return {c.name: c.stats() for c in self.classes}
@@ -0,0 +1,259 @@
+import io
+import os
+import time
+import select
+from eventlog import get_logger
+
+###############################################################
+# 시리얼 일괄 입출력
+# in_waiting 을 계속 확인하며 조금씩 read() 하던 방식 대신
+#  - 읽기: 첫 바이트는 select 로 잠들어 기다리고, 바이트가 들어오면 inter_byte_timeout 만큼 더 쌓은 뒤
+#          미리 할당한 bytearray 에 readinto (새 bytes 를 만들지 않음)
+#          inter_byte_timeout 안에 다음 바이트가 오면 max_delay 까지 같은 묶음으로 이어서 읽음
+#  - 쓰기: 대기 중인 패킷을 max_batch 바이트까지 이어 붙여 write 한 번으로 보냄
+#          credits 를 주면 아두이노가 알려준 한도까지만 쓰고, 나머지는 한도가 늘 때까지 호스트에서 기다림
+# pyserial 의 Serial (fileno 가 있는 포트) 은 파일 디스크립터로 직접 읽고 쓰고,
+# 그 밖의 SerialTransport 는 read/write 를 그대로 사용
+###############################################################
+
+log = get_logger("serial_io")
+log.limit("credit_stall", rate=1, burst=5)
+
+BAUD_RATE = 230400
+READ_BUFFER_SIZE = 4096
+READ_TIMEOUT = 0.1  # 첫 바이트를 기다리는 최대 시간 (호출한 쪽이 주기적으로 돌아올 수 있게)
+WRITE_BATCH = 512  # 한 번에 쓸 최대 바이트 수 (상향 스케줄러 우선순위가 이보다 오래 밀리지 않도록)
+
+# 흐름 제어 메시지 (Command_Send.ino 의 FLOW_CONTROL)
+# [0xFE] [받은 바이트 누적 수 u16] [보내도 되는 바이트 누적 한도 u16]  (big endian, 65536 에서 한 바퀴)
+# 아두이노의 다른 출력은 UTF-8 문자열이라 0xFE 가 나오지 않으므로 표시 바이트만 찾으면 됨
+CREDIT_MARKER = 0xFE
+CREDIT_MESSAGE_SIZE = 5
+CREDIT_WAIT = 1.0  # 한도 메시지를 기다리는 최대 시간 (아두이노가 주기적으로 다시 보냄)
+
+# baudrate 에서 바이트 n 개가 들어오는 시간
+def byte_time(baudrate, n=1):
+    return n * 10 / baudrate  # start + 8 data + stop
+
+def _fileno(ser):
+    try:
+        return ser.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        return None
+
+class SerialReader:
+    # inter_byte_timeout: 이 시간 동안 새 바이트가 없으면 묶음을 끝냄 (기본: 16 바이트 시간)
+    # max_delay: 첫 바이트 뒤로 묶음을 모으는 최대 시간 (패킷이 이만큼 늦어질 수 있음)
+    def __init__(self, ser, buffer_size=READ_BUFFER_SIZE, timeout=READ_TIMEOUT, inter_byte_timeout=None,
+                 max_delay=0.005, baudrate=BAUD_RATE):
+        self.ser = ser
+        self.timeout = timeout
+        self.inter_byte_timeout = inter_byte_timeout if inter_byte_timeout is not None else byte_time(baudrate, 16)
+        self.max_delay = max_delay
+        self._buf = bytearray(buffer_size)
+        self._view = memoryview(self._buf)
+        self._fd = _fileno(ser)
+        if self._fd is not None:
+            os.set_blocking(self._fd, False)
+            self._file = io.FileIO(self._fd, "rb", closefd=False)
+
+        self.reads = 0  # read 호출 수
+        self.waits = 0  # select/sleep 호출 수
+        self.bytes = 0
+
+    # 한 묶음을 읽어 memoryview 로 돌려줌 (timeout 안에 아무것도 없으면 빈 view)
+    # 돌려준 view 는 다음 read 호출 전까지만 유효함
+    def read(self):
+        if self._fd is None:
+            return self._read_transport()
+        view = self._view
+        count = 0
+        wait = self.timeout
+        deadline = None
+        while count < len(view):
+            self.waits += 1
+            readable, _, _ = select.select((self._fd,), (), (), wait)
+            if not readable:
+                break
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + self.max_delay
+            # 바이트가 들어오기 시작했으면 조금 더 쌓이도록 기다렸다가 한 번에 읽음
+            wait = min(self.inter_byte_timeout, deadline - now)
+            if wait > 0:
+                self.waits += 1
+                time.sleep(wait)
+            count += self._readinto(count)
+            wait = min(self.inter_byte_timeout, deadline - time.monotonic())
+            if wait <= 0:
+                break
+        self.bytes += count
+        return view[:count]
+
+    def _readinto(self, offset):
+        self.reads += 1
+        try:
+            read = self._file.readinto(self._view[offset:])
+        except BlockingIOError:
+            return 0
+        return read or 0
+
+    # 파일 디스크립터가 없는 포트: timeout 을 두고 read 한 결과를 버퍼에 복사
+    def _read_transport(self):
+        self.reads += 1
+        data = self.ser.read(max(1, min(self.ser.in_waiting, len(self._buf))))
+        self._view[:len(data)] = data
+        self.bytes += len(data)
+        return self._view[:len(data)]
+
+# 송신용 아두이노가 보내는 흐름 제어 한도를 읽고, 지금 보내도 되는 바이트 수를 계산
+# 아두이노는 (받은 수, 한도) 를 누적값으로 보내므로 메시지가 늦거나 중복되어도 한도를 넘지 않음
+# 처음 받은 메시지(또는 아두이노 재시작)로 보낸 수를 받은 수에 맞춤
+class CreditTracker:
+    def __init__(self, ser, read_size=256):
+        self.ser = ser
+        self._fd = _fileno(ser)
+        if self._fd is not None:
+            os.set_blocking(self._fd, False)
+        self._read_size = read_size
+        self._message = bytearray()  # 아직 다 받지 못한 메시지
+        self.sent = None  # 보낸 바이트 누적 수 (동기화 전에는 None)
+        self.limit = 0
+
+        self.messages = 0
+        self.resyncs = 0
+        self.stalls = 0  # 한도가 없어서 기다린 횟수
+
+    # 지금 보내도 되는 바이트 수
+    def available(self):
+        if self.sent is None:
+            return 0
+        credit = (self.limit - self.sent) & 0xFFFF
+        return 0 if credit >= 0x8000 else credit
+
+    # n 바이트를 보냈음
+    def consume(self, n):
+        self.sent = (self.sent + n) & 0xFFFF
+
+    # 보낼 수 있는 바이트가 생길 때까지 최대 timeout 초 대기하고 보낼 수 있는 바이트 수를 돌려줌
+    def wait(self, timeout=CREDIT_WAIT):
+        self._read()
+        credit = self.available()
+        if credit:
+            return credit
+        self.stalls += 1
+        deadline = time.monotonic() + timeout
+        while not credit:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if self._fd is not None:
+                select.select((self._fd,), (), (), remaining)
+            else:
+                time.sleep(min(remaining, 0.001))
+            self._read()
+            credit = self.available()
+        return credit
+
+    # 포트에서 읽을 수 있는 만큼 읽어서 처리
+    def _read(self):
+        try:
+            data = os.read(self._fd, self._read_size) if self._fd is not None else self.ser.read(self.ser.in_waiting)
+        except BlockingIOError:
+            return
+        self.feed(data)
+
+    # 받은 출력에서 한도 메시지만 골라 처리 (이벤트 루프처럼 포트를 직접 읽는 쪽은 읽은 데이터를 넘김)
+    def feed(self, data):
+        message = self._message
+        for value in data:
+            if message or value == CREDIT_MARKER:
+                message.append(value)
+                if len(message) == CREDIT_MESSAGE_SIZE:
+                    self._update(message[1] << 8 | message[2], message[3] << 8 | message[4])
+                    message.clear()
+
+    def _update(self, received, limit):
+        self.messages += 1
+        # 받은 수보다 많이 보냈다고 되어 있는데 그만큼 한도를 준 적이 없으면 아두이노가 재시작한 것
+        if self.sent is None or (self.sent - received) & 0xFFFF > (limit - received) & 0xFFFF:
+            if self.sent is not None:
+                self.resyncs += 1
+            self.sent = received
+        self.limit = limit
+
+class SerialWriter:
+    # max_batch: 한 번에 쓸 최대 바이트 수
+    # credits: CreditTracker 를 주면 아두이노가 허락한 만큼만 씀
+    def __init__(self, ser, max_batch=WRITE_BATCH, timeout=None, credits=None):
+        self.ser = ser
+        self.max_batch = max_batch
+        self.timeout = timeout  # 쓸 공간을 기다리는 최대 시간 (None 이면 계속)
+        self.credits = credits
+        self._buf = bytearray()
+        self._fd = _fileno(ser)
+        if self._fd is not None:
+            os.set_blocking(self._fd, False)
+
+        self.writes = 0  # write 호출 수
+        self.waits = 0
+        self.batches = 0
+        self.packets = 0
+        self.bytes = 0
+
+    # 묶음에 보낼 바이트 수
+    @property
+    def pending(self):
+        return len(self._buf)
+
+    # 패킷을 묶음에 추가, 묶음이 max_batch 이상이 되면 True (flush 할 때)
+    def add(self, packet):
+        self._buf += packet
+        self.packets += 1
+        return len(self._buf) >= self.max_batch
+
+    # 묶음을 한 번에 씀 (흐름 제어 중이면 한도가 허락하는 만큼씩 나눠서)
+    def flush(self):
+        if not self._buf:
+            return
+        view = memoryview(self._buf)
+        try:
+            while view:
+                size = len(view)
+                if self.credits is not None:
+                    size = min(size, self.credits.wait())
+                    if not size:
+                        # 한도 메시지가 올 때까지 계속 대기 (그동안 패킷은 호스트 큐에 쌓임)
+                        log.warning("credit_stall", pending=len(view), synced=self.credits.sent is not None)
+                        continue
+                if self._fd is None:
+                    self.writes += 1
+                    self.ser.write(view[:size])
+                else:
+                    self._write_fd(view[:size])
+                if self.credits is not None:
+                    self.credits.consume(size)
+                view = view[size:]
+        finally:
+            view.release()
+        self.batches += 1
+        self.bytes += len(self._buf)
+        self._buf.clear()
+
+    # 출력 버퍼가 가득 차면 쓸 수 있을 때까지 select 로 대기
+    def _write_fd(self, view):
+        try:
+            while view:
+                self.writes += 1
+                try:
+                    written = os.write(self._fd, view)
+                except BlockingIOError:
+                    written = 0
+                view = view[written:]
+                if view:
+                    self.waits += 1
+                    _, writable, _ = select.select((), (self._fd,), (), self.timeout)
+                    if not writable:
+                        raise TimeoutError(f"serial write timed out with {len(view)} bytes left")
+        finally:
+            view.release()
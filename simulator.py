@@ -0,0 +1,720 @@
+import os
+import tty
+import time
+import random
+import select
+import threading
+from collections import deque
+from ccsds import HEADER_SIZE, packet_total_length
+from hal import (RadioTransport, DATA_RATE_BPS, RF24_PA_MIN, RF24_PA_LOW, RF24_PA_HIGH, RF24_PA_MAX,
+                 RF24_250KBPS, RF24_1MBPS, RF24_2MBPS)
+from radio_link import LINK_CONTROL_PIPE, LinkFollower
+from framing import CobsDecoder, cobs_encode
+from serial_io import CREDIT_MARKER
+
+###############################################################
+# 하드웨어 시뮬레이터
+# 실제 보드 없이 브리지를 실행/부하 시험하기 위한 가상 장치
+#  - RadioMedium : 가상 라디오들이 공유하는 무선 구간 (손실, 지연, ACK 실패)
+#  - VirtualRF24 : pyrf24.RF24 와 같은 메서드를 가진 가상 nRF24L01
+#  - VirtualArduino : pty 로 노출되는 가상 아두이노 (Command_Send / data_receive 스케치)
+###############################################################
+
+MAX_PAYLOAD_SIZE = 32
+TX_FIFO_SIZE = 3
+ADDRESS_WIDTH = 5
+TX_SETTLE_TIME = 130e-6  # standby -> TX/RX 전환 시간
+ARDUINO_SERIAL_BUFFER = 64  # 아두이노 HardwareSerial 수신 링버퍼 크기
+
+# link_model 을 켰을 때 송신 측 설정별 손실 배율 (손실 확률 p -> 1 - (1 - p) ** 배율)
+# 전송률이 낮을수록 수신 감도가 좋고, 출력이 높을수록 신호가 강함
+LINK_RATE_FACTOR = {RF24_250KBPS: 0.5, RF24_1MBPS: 1.0, RF24_2MBPS: 1.6}
+LINK_PA_FACTOR = {RF24_PA_MIN: 1.5, RF24_PA_LOW: 1.0, RF24_PA_HIGH: 0.75, RF24_PA_MAX: 0.6}
+
+#########################################################################################
+#
+# 가상 무선 구간
+#
+#########################################################################################
+
+# [(시작 초, 손실 확률), ...] 를 시간에 따라 바뀌는 손실 함수로 변환 (loss_profile 용)
+def step_loss_profile(steps):
+    steps = sorted(steps)
+
+    def loss_at(elapsed):
+        loss = steps[0][1]
+        for start, value in steps:
+            if elapsed < start:
+                break
+            loss = value
+        return loss
+
+    return loss_at
+
+class RadioMedium:
+    # loss_profile(경과 초) 를 주면 loss 대신 시간에 따라 바뀌는 손실 확률을 사용
+    # link_model=True 면 송신 측 전송률/출력에 따라 손실 확률이 달라짐 (LINK_RATE_FACTOR, LINK_PA_FACTOR)
+    def __init__(self, loss=0.0, ack_loss=0.0, latency=0.0, realtime=True, seed=None, loss_profile=None, link_model=False):
+        self.loss = loss  # 프레임 손실 확률 (재전송 시도마다 적용)
+        self.ack_loss = ack_loss  # 수신은 됐지만 ACK 가 손실될 확률
+        self.latency = latency  # 수신 측에서 읽을 수 있을 때까지의 추가 지연 (초)
+        self.realtime = realtime  # False 면 전파 시간을 기다리지 않고 최대 속도로 동작
+        self.loss_profile = loss_profile
+        self.link_model = link_model
+        self._started = time.monotonic()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._radios = []
+        self.transmissions = 0  # 재전송을 포함한 송신 시도 수
+
+    # sender 가 한 번 보낼 때의 손실 확률
+    def loss_for(self, sender):
+        loss = self.loss if self.loss_profile is None else self.loss_profile(time.monotonic() - self._started)
+        if self.link_model and 0 < loss < 1:
+            factor = LINK_RATE_FACTOR[sender.data_rate] * LINK_PA_FACTOR[sender.pa_level]
+            loss = 1 - (1 - loss) ** factor
+        return loss
+
+    def attach(self, radio):
+        with self._lock:
+            if radio not in self._radios:
+                self._radios.append(radio)
+
+    def detach(self, radio):
+        with self._lock:
+            if radio in self._radios:
+                self._radios.remove(radio)
+
+    # 프리앰블 + 주소 + PCF(9비트) + 페이로드 + CRC(2바이트) 전송 시간
+    def airtime(self, payload_length, data_rate):
+        bits = 8 + ADDRESS_WIDTH * 8 + 9 + payload_length * 8 + 16
+        return bits / DATA_RATE_BPS[data_rate]
+
+    def wait(self, seconds):
+        if self.realtime and seconds > 0:
+            time.sleep(seconds)
+
+    # 한 번의 송신 시도, ACK 를 받았는지 돌려줌
+    def transmit(self, sender, frame, seq):
+        with self._lock:
+            self.transmissions += 1
+            if self._rng.random() < self.loss_for(sender):
+                return False
+            ready_at = time.monotonic() + self.latency
+            acked = False
+            for radio in self._radios:
+                if radio is sender or not radio.listening:
+                    continue
+                if radio.channel != sender.channel or radio.data_rate != sender.data_rate:
+                    continue
+                if radio._receive(sender, frame, seq, ready_at):
+                    acked = True
+            if acked and self._rng.random() < self.ack_loss:
+                return False
+            return acked
+
+DEFAULT_MEDIUM = RadioMedium()
+
+#########################################################################################
+#
+# 가상 nRF24L01
+#
+#########################################################################################
+
+class VirtualRF24(RadioTransport):
+    def __init__(self, ce_pin=None, csn_pin=None, medium=None, fifo_size=3, present=True):
+        self.ce_pin = ce_pin
+        self.csn_pin = csn_pin
+        self.medium = medium if medium is not None else DEFAULT_MEDIUM
+        self.present = present  # False 면 begin() 이 실패 (배선 불량 등)
+        self.rx_event = None  # 프레임 수신 시 set() 할 threading.Event (선택)
+
+        self.channel = 76
+        self.data_rate = RF24_1MBPS
+        self.pa_level = RF24_PA_MAX
+        self.listening = False
+        self._payload_size = MAX_PAYLOAD_SIZE
+        self._dynamic_payloads = False
+        self._auto_ack = True
+        self._retry_delay = 5
+        self._retry_count = 15
+        self._powered = False
+        self._pipes = {}
+        self._tx_address = None
+        self._tx_seq = 0
+        self._arc = 0
+        self._tx_fifo = deque()
+        self._tx_cond = threading.Condition()
+        self._tx_thread = None
+        self._max_rt = False
+        self._tx_ds = False
+
+        self._lock = threading.Lock()
+        self._fifo_size = fifo_size
+        self._rx_fifo = deque()
+        self._last_rx = {}
+
+    def begin(self):
+        if not self.present:
+            return False
+        self._powered = True
+        self.medium.attach(self)
+        return True
+
+    def isChipConnected(self):
+        return self.present
+
+    def powerUp(self):
+        self._powered = True
+
+    def powerDown(self):
+        self._powered = False
+        self.listening = False
+
+    # 설정
+    def setPALevel(self, level, lna_enable=True):
+        self.pa_level = level
+
+    def getPALevel(self):
+        return self.pa_level
+
+    def setChannel(self, channel):
+        self.channel = channel
+
+    def getChannel(self):
+        return self.channel
+
+    def setDataRate(self, data_rate):
+        if data_rate not in DATA_RATE_BPS:
+            return False
+        self.data_rate = data_rate
+        return True
+
+    def getDataRate(self):
+        return self.data_rate
+
+    @property
+    def payloadSize(self):
+        return self._payload_size
+
+    @payloadSize.setter
+    def payloadSize(self, size):
+        self._payload_size = max(1, min(MAX_PAYLOAD_SIZE, size))
+
+    def setPayloadSize(self, size):
+        self.payloadSize = size
+
+    def getPayloadSize(self):
+        return self._payload_size
+
+    def enableDynamicPayloads(self):
+        self._dynamic_payloads = True
+
+    def disableDynamicPayloads(self):
+        self._dynamic_payloads = False
+
+    def setAutoAck(self, enable):
+        self._auto_ack = enable
+
+    def setRetries(self, delay, count):
+        self._retry_delay = delay & 0x0F
+        self._retry_count = count & 0x0F
+
+    def getARC(self):
+        return self._arc
+
+    # 파이프
+    def openReadingPipe(self, pipe, address):
+        self._pipes[pipe] = bytes(address)
+
+    def closeReadingPipe(self, pipe):
+        self._pipes.pop(pipe, None)
+
+    def openWritingPipe(self, address):
+        self._tx_address = bytes(address)
+
+    def startListening(self):
+        self.listening = True
+
+    def stopListening(self):
+        self.listening = False
+
+    # 수신
+    def available(self):
+        with self._lock:
+            return bool(self._rx_fifo) and self._rx_fifo[0][0] <= time.monotonic()
+
+    def available_pipe(self):
+        with self._lock:
+            if self._rx_fifo and self._rx_fifo[0][0] <= time.monotonic():
+                return True, self._rx_fifo[0][1]
+            return False, None
+
+    def getDynamicPayloadSize(self):
+        if not self._dynamic_payloads:
+            return self._payload_size
+        with self._lock:
+            return len(self._rx_fifo[0][2]) if self._rx_fifo else 0
+
+    def read(self, length=None):
+        with self._lock:
+            if not self._rx_fifo:
+                return bytearray()
+            frame = self._rx_fifo.popleft()[2]
+        if length is None:
+            length = len(frame)
+        return bytearray(frame[:length])
+
+    def flush_rx(self):
+        with self._lock:
+            self._rx_fifo.clear()
+
+    # RadioMedium 이 호출, 수락(ACK)하면 True
+    # 실제 칩처럼 같은 프레임의 재전송은 FIFO 에 다시 넣지 않고 ACK 만 보냄
+    def _receive(self, sender, frame, seq, ready_at):
+        pipe = None
+        for number, address in self._pipes.items():
+            if address == sender._tx_address:
+                pipe = number
+                break
+        if pipe is None:
+            return False
+        with self._lock:
+            if self._last_rx.get(id(sender)) == seq:
+                return True
+            # RX FIFO 가 가득 차면 ACK 없이 버림 (아직 지연 중인 프레임은 제외)
+            if len(self._rx_fifo) >= self._fifo_size:
+                now = time.monotonic()
+                if sum(1 for item in self._rx_fifo if item[0] <= now) >= self._fifo_size:
+                    return False
+            self._last_rx[id(sender)] = seq
+            self._rx_fifo.append((ready_at, pipe, bytes(frame)))
+        if self.rx_event is not None:
+            self.rx_event.set()
+        return True
+
+    def _make_frame(self, buf):
+        if self._dynamic_payloads:
+            return bytes(buf[:MAX_PAYLOAD_SIZE])
+        return bytes(buf[:self._payload_size]).ljust(self._payload_size, b'\x00')
+
+    # 한 프레임을 ACK 를 받을 때까지 setRetries 설정만큼 재전송
+    # settle 은 standby 에서 TX 로 전환하는 시간 (TX FIFO 를 연속으로 비울 때는 생략)
+    def _transmit(self, frame, seq, multicast, settle):
+        medium = self.medium
+        airtime = settle + medium.airtime(len(frame), self.data_rate)
+        if multicast or not self._auto_ack:
+            medium.wait(airtime)
+            medium.transmit(self, frame, seq)
+            self._arc = 0
+            return True
+
+        retry_wait = (self._retry_delay + 1) * 250e-6
+        for attempt in range(self._retry_count + 1):
+            medium.wait(airtime)
+            if medium.transmit(self, frame, seq):
+                medium.wait(TX_SETTLE_TIME + medium.airtime(0, self.data_rate))
+                self._arc = attempt
+                return True
+            medium.wait(retry_wait)
+            airtime = medium.airtime(len(frame), self.data_rate)
+        self._arc = self._retry_count
+        return False
+
+    # 송신 (프레임마다 ACK 를 기다리는 stop-and-wait)
+    def write(self, buf, multicast=False):
+        if self.listening or not self._powered or self._tx_address is None:
+            return False
+        self._tx_seq += 1
+        return self._transmit(self._make_frame(buf), self._tx_seq, multicast, TX_SETTLE_TIME)
+
+    # 3단 TX FIFO 에 넣고 바로 반환 (FIFO 가 가득 차면 빈 자리가 날 때까지 대기)
+    # 앞선 프레임이 최대 재전송(MAX_RT)에 도달했으면 False
+    def writeFast(self, buf, multicast=False):
+        if self.listening or not self._powered or self._tx_address is None:
+            return False
+        frame = self._make_frame(buf)
+        with self._tx_cond:
+            while len(self._tx_fifo) >= TX_FIFO_SIZE and not self._max_rt:
+                self._tx_cond.wait()
+            if self._max_rt:
+                return False
+            self._tx_seq += 1
+            self._tx_fifo.append((frame, self._tx_seq, multicast))
+            if self._tx_thread is None:
+                self._tx_thread = threading.Thread(target=self._tx_worker, daemon=True)
+                self._tx_thread.start()
+            self._tx_cond.notify_all()
+        return True
+
+    # TX FIFO 가 빌 때까지 대기
+    # MAX_RT 가 나면 timeout(ms) 동안 같은 프레임을 재전송하고, 그래도 실패하면 FIFO 를 비우고 False
+    def txStandBy(self, timeout=0, start_tx=True):
+        deadline = time.monotonic() + timeout / 1000 if timeout else None
+        with self._tx_cond:
+            while True:
+                while self._tx_fifo and not self._max_rt:
+                    self._tx_cond.wait()
+                if not self._max_rt:
+                    return True
+                if deadline is not None and time.monotonic() < deadline:
+                    self._max_rt = False
+                    self._tx_cond.notify_all()
+                    continue
+                self._tx_fifo.clear()
+                self._max_rt = False
+                self._tx_cond.notify_all()
+                return False
+
+    def reUseTX(self):
+        with self._tx_cond:
+            self._max_rt = False
+            self._tx_cond.notify_all()
+
+    # 실제 칩처럼 FIFO 만 비움, MAX_RT 는 whatHappened() 로 지워야 다시 송신함
+    def flush_tx(self):
+        with self._tx_cond:
+            self._tx_fifo.clear()
+            self._tx_cond.notify_all()
+
+    # (TX_DS, MAX_RT, RX_DR) 를 돌려주고 지움
+    def whatHappened(self):
+        with self._tx_cond:
+            tx_ds, tx_df = self._tx_ds, self._max_rt
+            self._tx_ds = self._max_rt = False
+            self._tx_cond.notify_all()
+        return tx_ds, tx_df, self.available()
+
+    # 하드웨어 송신부: FIFO 맨 앞 프레임을 ACK 를 받을 때까지 보내고 제거
+    def _tx_worker(self):
+        settle = TX_SETTLE_TIME
+        while True:
+            with self._tx_cond:
+                while not self._tx_fifo or self._max_rt:
+                    self._tx_cond.wait()
+                item = self._tx_fifo[0]
+            frame, seq, multicast = item
+            ok = self._transmit(frame, seq, multicast, settle)
+            with self._tx_cond:
+                if ok:
+                    self._tx_ds = True
+                    if self._tx_fifo and self._tx_fifo[0] is item:
+                        self._tx_fifo.popleft()
+                else:
+                    self._max_rt = True
+                settle = 0 if self._tx_fifo and not self._max_rt else TX_SETTLE_TIME
+                self._tx_cond.notify_all()
+
+#########################################################################################
+#
+# 가상 아두이노
+# pty 의 slave 쪽(port)을 pyserial 로 열면 실제 /dev/ttyACM* 처럼 사용 가능
+#
+#########################################################################################
+
+# 아두이노 쪽 Serial 객체 (available/read/write/println)
+class ArduinoSerial:
+    def __init__(self, fd, baudrate, buffer_size, realtime):
+        self._fd = fd
+        self._byte_time = 10 / baudrate  # start + 8 data + stop
+        self.buffer_size = buffer_size
+        self._realtime = realtime
+        self._rx = bytearray()
+        self._lock = threading.Lock()
+        self.overruns = 0  # 수신 링버퍼가 가득 차서 버려진 바이트 수
+
+    def available(self):
+        with self._lock:
+            return len(self._rx)
+
+    # 수신 링버퍼 전체를 읽음
+    def read(self):
+        with self._lock:
+            data = bytes(self._rx)
+            self._rx.clear()
+            return data
+
+    # 실제 UART 처럼 보드레이트 속도로 호스트에 전송, 호스트가 읽지 않아 버퍼가 차면 버림
+    def write(self, data):
+        try:
+            os.write(self._fd, data)
+        except (BlockingIOError, OSError):
+            pass
+        if self._realtime:
+            time.sleep(len(data) * self._byte_time)
+
+    def println(self, text):
+        self.write(text.encode() + b'\r\n')
+
+    # UART 스레드: 호스트가 쓴 바이트를 보드레이트 속도로 링버퍼에 옮김
+    def _pump(self, stop_event, wake_event):
+        while not stop_event.is_set():
+            readable, _, _ = select.select([self._fd], [], [], 0.05)
+            if not readable:
+                continue
+            with self._lock:
+                space = self.buffer_size - len(self._rx)
+            size = 16 if self._realtime else space
+            if size <= 0:
+                time.sleep(self._byte_time)
+                continue
+            try:
+                data = os.read(self._fd, size)
+            except (BlockingIOError, OSError):
+                continue
+            with self._lock:
+                space = self.buffer_size - len(self._rx)
+                self._rx += data[:space]
+                self.overruns += max(0, len(data) - space)
+            wake_event.set()
+            if self._realtime:
+                time.sleep(len(data) * self._byte_time)
+
+class VirtualArduino:
+    CE_PIN = 7
+    CSN_PIN = 8
+
+    def __init__(self, medium=None, baudrate=230400, serial_buffer_size=ARDUINO_SERIAL_BUFFER, realtime=True,
+                 radio_fifo_size=3):
+        self._master_fd, self._slave_fd = os.openpty()
+        tty.setraw(self._slave_fd)
+        os.set_blocking(self._master_fd, False)
+        self.port = os.ttyname(self._slave_fd)
+        self.baudrate = baudrate
+
+        self.Serial = ArduinoSerial(self._master_fd, baudrate, serial_buffer_size, realtime)
+        self.radio = VirtualRF24(self.CE_PIN, self.CSN_PIN, medium, fifo_size=radio_fifo_size)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.radio.rx_event = self._wake
+        self._threads = []
+
+    def start(self):
+        self.setup()
+        self._threads = [
+            threading.Thread(target=self.Serial._pump, args=(self._stop, self._wake), daemon=True),
+            threading.Thread(target=self._run, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+        self.radio.powerDown()
+        os.close(self._master_fd)
+        os.close(self._slave_fd)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # loop() 가 할 일이 없으면 시리얼/라디오 이벤트가 올 때까지 대기
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            if not self.loop():
+                self._wake.wait(self.idle_timeout())
+
+    # 할 일이 없을 때 최대 대기 시간 (시간 제한이 있는 스케치는 더 짧게)
+    def idle_timeout(self):
+        return 0.01
+
+    def setup(self):
+        raise NotImplementedError
+
+    def loop(self):
+        raise NotImplementedError
+
+# Command_Send.ino: 시리얼로 받은 CCSDS 패킷을 32바이트씩 라디오로 송신 (채널 0, "2Node")
+# aggregation_delay > 0 이면 AGGREGATION_DELAY_MS 처럼 패킷을 이어 붙여 프레임을 채움 (초 단위)
+# serial_cobs 는 SERIAL_FRAMING_COBS (시리얼 입력이 COBS 프레임)
+# flow_control 은 FLOW_CONTROL (받은 수와 보내도 되는 한도를 호스트에 알림)
+class CommandSendSketch(VirtualArduino):
+    BUFFER_SIZE = 1024
+    CREDIT_STEP = 16
+    CREDIT_INTERVAL = 0.1
+
+    def __init__(self, *args, aggregation_delay=0.0, serial_cobs=False, flow_control=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.aggregation_delay = aggregation_delay
+        self.serial_cobs = serial_cobs
+        self.flow_control = flow_control
+
+    def setup(self):
+        self.Serial.println("시리얼 데이터 수신 준비 완료...")
+        if not self.radio.begin():
+            self.Serial.println("라디오가 응답하지 않습니다")
+            raise RuntimeError("virtual radio is not responding")
+        self.radio.setPALevel(RF24_PA_LOW)
+        self.radio.setPayloadSize(MAX_PAYLOAD_SIZE)
+        self.radio.enableDynamicPayloads()
+        self.radio.openWritingPipe(b"2Node")
+        self.radio.setChannel(0)
+        self.radio.stopListening()
+        self.radio.setDataRate(RF24_1MBPS)
+
+        self.buffer = bytearray(self.BUFFER_SIZE)
+        self.buffer_index = 0
+        self.decoder = CobsDecoder(max_frame=self.BUFFER_SIZE)
+        self.frame = bytearray()
+        self.frame_started = 0.0
+        self.received_total = 0
+        self.credit_limit = 0
+        self.last_credit = 0.0
+
+    def send_credits(self):
+        self.Serial.write(bytes((CREDIT_MARKER, self.received_total >> 8, self.received_total & 0xFF,
+                                 self.credit_limit >> 8, self.credit_limit & 0xFF)))
+        self.last_credit = time.monotonic()
+
+    # 받은 수 + min(빈 공간, 수신 링버퍼) 까지 한도를 늘림 (한도는 줄이지 않음)
+    def update_credits(self):
+        space = self.BUFFER_SIZE - (self.decoder.pending if self.serial_cobs else self.buffer_index)
+        limit = (self.received_total + min(space, self.Serial.buffer_size)) & 0xFFFF
+        increase = (limit - self.credit_limit) & 0xFFFF
+        if increase < 0x8000 and increase >= self.CREDIT_STEP:
+            self.credit_limit = limit
+            self.send_credits()
+            return True
+        if time.monotonic() - self.last_credit >= self.CREDIT_INTERVAL:
+            self.send_credits()
+        return False
+
+    def send_frame(self):
+        self.radio.write(self.frame)
+        if not self.flow_control:
+            self.Serial.println("라디오로 데이터 전송 완료")
+        self.frame.clear()
+
+    # 패킷을 프레임에 이어 붙이고 꽉 찬 프레임은 바로 송신
+    def queue_packet(self, packet):
+        offset = 0
+        while offset < len(packet):
+            if not self.frame:
+                self.frame_started = time.monotonic()
+            take = MAX_PAYLOAD_SIZE - len(self.frame)
+            self.frame += packet[offset:offset + take]
+            offset += take
+            if len(self.frame) == MAX_PAYLOAD_SIZE:
+                self.send_frame()
+        if self.aggregation_delay <= 0 and self.frame:
+            self.send_frame()
+
+    def idle_timeout(self):
+        if self.frame:
+            return max(self.frame_started + self.aggregation_delay - time.monotonic(), 0.0005)
+        return 0.01
+
+    def loop(self):
+        worked = self._receive()
+        if self.flow_control and self.update_credits():
+            worked = True
+        return worked
+
+    def _receive(self):
+        # 시리얼 데이터 수신 (버퍼가 가득 차면 버림)
+        data = self.Serial.read()
+        self.received_total = (self.received_total + len(data)) & 0xFFFF
+        if self.serial_cobs:
+            # 구분자(0x00)까지 받으면 복원해서 송신
+            for packet in self.decoder.feed(data):
+                if packet:
+                    self.queue_packet(packet)
+            return self._flush_partial() or bool(data)
+        if data:
+            space = self.BUFFER_SIZE - self.buffer_index
+            data = data[:space]
+            self.buffer[self.buffer_index:self.buffer_index + len(data)] = data
+            self.buffer_index += len(data)
+
+        # 패킷 처리
+        worked = bool(data)
+        while self.buffer_index >= HEADER_SIZE:
+            packet_length = packet_total_length(self.buffer)
+            if self.buffer_index < packet_length:
+                break
+            self.queue_packet(self.buffer[:packet_length])
+
+            # 남은 데이터를 버퍼 앞으로 이동
+            remaining = self.buffer_index - packet_length
+            self.buffer[:remaining] = self.buffer[packet_length:self.buffer_index]
+            self.buffer_index = remaining
+            worked = True
+
+        return self._flush_partial() or worked
+
+    # 다 차지 않은 프레임이 기다린 시간을 넘으면 송신
+    def _flush_partial(self):
+        if self.frame and time.monotonic() - self.frame_started >= self.aggregation_delay:
+            self.send_frame()
+            return True
+        return False
+
+# data_receive.ino: 라디오로 받은 32바이트 조각을 재조립해서 시리얼로 출력 (채널 100, "1Node")
+# serial_cobs 는 SERIAL_FRAMING_COBS (패킷마다 COBS 프레임으로 출력)
+class DataReceiveSketch(VirtualArduino):
+    BUFFER_SIZE = 1024
+
+    def __init__(self, *args, serial_cobs=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.serial_cobs = serial_cobs
+
+    def setup(self):
+        if not self.radio.begin():
+            self.Serial.println("라디오가 응답하지 않습니다")
+            raise RuntimeError("virtual radio is not responding")
+        self.radio.setPALevel(RF24_PA_LOW)
+        self.radio.setPayloadSize(MAX_PAYLOAD_SIZE)
+        self.radio.enableDynamicPayloads()
+        self.radio.openReadingPipe(1, b"1Node")
+        self.radio.setChannel(100)
+        self.radio.startListening()
+        self.radio.setDataRate(RF24_1MBPS)
+        # 송신 측 LinkTuner 의 제어 프레임을 pipe 2 로 받아서 같은 설정으로 맞춤
+        self.link = LinkFollower(self.radio, b"1Node")
+
+        self.data = bytearray(self.BUFFER_SIZE)
+        self.data_index = 0
+        self.total_length = 0
+        self.header_parsed = False
+        if self.serial_cobs:
+            self.Serial.write(b"\x00")
+
+    def loop(self):
+        has_payload, pipe = self.radio.available_pipe()
+        if not has_payload:
+            self.link.poll()
+            return False
+        payload = self.radio.read(self.radio.getDynamicPayloadSize())
+        if pipe == LINK_CONTROL_PIPE:
+            self.link.on_control(payload)
+            return True
+        self.link.on_frame()
+
+        # 수신한 데이터를 전체 데이터 버퍼에 복사
+        size = min(len(payload), self.BUFFER_SIZE - self.data_index)
+        self.data[self.data_index:self.data_index + size] = payload[:size]
+        self.data_index += size
+
+        # 완성된 패킷을 모두 시리얼로 출력 (한 프레임에 여러 패킷과 다음 패킷의 앞부분이 있을 수 있음)
+        while True:
+            if not self.header_parsed and self.data_index >= HEADER_SIZE:
+                self.total_length = packet_total_length(self.data)
+                self.header_parsed = True
+            if not self.header_parsed or self.data_index < self.total_length:
+                break
+            packet = bytes(self.data[:self.total_length])
+            self.Serial.write(cobs_encode(packet) if self.serial_cobs else packet)
+
+            # 남은 데이터(다음 패킷)를 버퍼 앞으로 이동
+            remaining = self.data_index - self.total_length
+            self.data[:remaining] = self.data[self.total_length:self.data_index]
+            self.data_index = remaining
+            self.header_parsed = False
+        return True